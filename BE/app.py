@@ -1291,7 +1291,7 @@ if __name__ == '__main__':
     print(f"📊 Loaded {len(banking_assistant.customers)} customers")
     print(f"🤖 Ollama endpoint: {OLLAMA_ENDPOINT}")
     print(f"🧠 Model: {MODEL_NAME}")
-    customers = load_customer_data()
+    customers = banking_assistant.customers
     admin_users = [c['username'] for c in customers if c['account_type'] == 'admin']
     customer_users = [c['username'] for c in customers if c['account_type'] != 'admin']
     print(f"👥 Available admin users: {', '.join(admin_users[:3])}{'...' if len(admin_users) > 3 else ''}")
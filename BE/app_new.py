@@ -11,12 +11,20 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config.app_config import AppConfig
 from models.banking_assistant import BankingAssistant
+from models.banking_repository import BankingRepository
 from routes.auth_routes import init_auth_routes
 from routes.chat_routes import init_chat_routes
 from routes.customer_routes import init_customer_routes
 from routes.admin_routes import init_admin_routes
 from routes.page_routes import init_page_routes
 from routes.utility_routes import init_utility_routes
+from utils.auth_utils import init_sessions, init_passwords, init_rate_limiter, init_reset_tokens
+from utils.rate_limiter import create_rate_limiter
+from utils.reset_token_store import ResetTokenStore
+from utils.password_service import PasswordService
+from utils.session_store import create_session_store
+from utils.file_watcher import init_customer_reload
+from utils.json_provider import init_json_provider
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +40,9 @@ def create_app():
     # Configure Flask app
     app.secret_key = config.get_secret_key()
     
+    # jsonify() encodes with orjson when it is installed
+    init_json_provider(app, config.get_json_encoder())
+    
     # Configure session
     session_config = config.get_session_config()
     for key, value in session_config.items():
@@ -48,6 +59,7 @@ def create_app():
     # Set up file paths
     csv_file_path = os.path.join(os.path.dirname(__file__), "..", "data", "banking_customers.csv")
     frontend_path = os.path.join(os.path.dirname(__file__), "..", "FE")
+    data_path = os.path.join(os.path.dirname(__file__), "..", "data")
     
     # Debug: Print the CSV file path to help with troubleshooting
     print(f"CSV file path: {csv_file_path}")
@@ -58,12 +70,34 @@ def create_app():
     # Initialize banking assistant
     banking_assistant = BankingAssistant(csv_file_path)
     
+    # Edits to the customer CSV made outside the app are picked up without a restart
+    init_customer_reload(app, banking_assistant, config.get_customer_reload_interval())
+    
+    # Normalized tables are loaded lazily on first use
+    repository = BankingRepository(data_path)
+    
+    # Sessions live server-side; cookies carry a signed opaque id
+    store_config = config.get_session_store_config()
+    session_store = create_session_store(store_config['backend'], store_config['sqlite_path'])
+    init_sessions(app, banking_assistant, session_store, store_config['sweep_interval'])
+    
+    # Password hashing runs on a process pool so logins don't stall request threads
+    init_passwords(app, banking_assistant, PasswordService(**config.get_password_config()),
+                   config.get_rehash_on_login())
+    
+    # Credential endpoints are throttled per address and per username
+    init_rate_limiter(app, create_rate_limiter(**config.get_rate_limit_config()))
+    
+    # Reset tokens are logged to password_resets.csv, never to the customer file
+    reset_tokens = ResetTokenStore(os.path.join(data_path, "password_resets.csv"))
+    init_reset_tokens(app, reset_tokens, store_config['sweep_interval'])
+    
     # Initialize routes
-    init_auth_routes(app, csv_file_path)
+    init_auth_routes(app, banking_assistant)
     init_chat_routes(app, config.get_ollama_endpoint(), config.get_ollama_model())
-    init_customer_routes(app, banking_assistant)
-    init_admin_routes(app, csv_file_path)
-    init_page_routes(app, frontend_path)
+    init_customer_routes(app, banking_assistant, repository)
+    init_admin_routes(app, banking_assistant, repository)
+    init_page_routes(app, frontend_path, config.get_static_reload_interval())
     init_utility_routes(app, banking_assistant)
     
     return app, banking_assistant, config
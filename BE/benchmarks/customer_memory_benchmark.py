@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Customer record memory benchmark
+Measures how much resident memory the in-memory customer list adds when each
+row is a plain dict (the old DictReader load) and when it is a slotted Customer
+"""
+
+import os
+import gc
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.snapshot_benchmark import DEFAULT_CSV_PATH, write_synthetic_csv
+from models.customer import Customer, coerce_customer_row
+from models.customer_snapshot import load_customers
+
+
+def resident_bytes() -> int:
+    """Current resident set size of this process (Linux)"""
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def load(path: str, make):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [make(row) for row in csv.DictReader(file)]
+
+
+def measure(loader) -> dict:
+    """Load in a forked child so each variant starts from the same baseline and frees everything after"""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_end)
+            gc.collect()
+            before = resident_bytes()
+            started = time.perf_counter()
+            customers = loader()
+            seconds = time.perf_counter() - started
+            gc.collect()
+            grown = resident_bytes() - before
+            result = {"rows": len(customers), "resident_bytes": grown,
+                      "bytes_per_row": round(grown / max(len(customers), 1)), "load_s": round(seconds, 3)}
+            with os.fdopen(write_end, 'w') as pipe:
+                json.dump(result, pipe)
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        result = json.loads(pipe.read())
+    os.waitpid(pid, 0)
+    return result
+
+
+def main():
+    """Load the same synthetic CSV as dicts, as Customers and through the snapshot, and compare what stays resident"""
+    parser = argparse.ArgumentParser(description="Compare dict and slotted Customer record memory")
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH, help="customer CSV to take template rows from")
+    parser.add_argument("--rows", type=int, default=1000000, help="synthetic customers to generate")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "customers.csv")
+        write_synthetic_csv(args.csv, path, args.rows)
+        dicts = measure(lambda: load(path, coerce_customer_row))
+        records = measure(lambda: load(path, Customer.from_row))
+        # The first snapshot load compiles it; the second is the warm start path
+        measure(lambda: load_customers(path)[0])
+        snapshot = measure(lambda: load_customers(path)[0])
+
+    print(json.dumps({
+        "rows": args.rows,
+        "dict": dicts,
+        "customer": records,
+        "customer_from_snapshot": snapshot,
+        "saved_bytes": dicts["resident_bytes"] - records["resident_bytes"],
+        "ratio": round(records["resident_bytes"] / dicts["resident_bytes"], 3)
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Session header benchmark
+Logs in through the real app and measures the cookie bytes a browser sends
+back on every request, plus the latency of the auth decorators
+"""
+
+import os
+import sys
+import json
+import timeit
+import logging
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+from app_new import create_app
+from utils.auth_utils import login_required, admin_required
+
+
+def cookie_header(response) -> str:
+    """Build the Cookie request header a browser would send after this response"""
+    pairs = []
+    for header in response.headers.getlist('Set-Cookie'):
+        pair = header.split(';', 1)[0]
+        if pair.split('=', 1)[1]:
+            pairs.append(pair)
+    return '; '.join(pairs)
+
+
+def main():
+    """Measure session overhead for a customer and an admin login"""
+    parser = argparse.ArgumentParser(description="Benchmark session header size and auth decorator latency")
+    parser.add_argument("--customer", nargs=2, default=("johnsmith", "p"), metavar=("USERNAME", "PASSWORD"))
+    parser.add_argument("--admin", nargs=2, default=("admin", "admin123"), metavar=("USERNAME", "PASSWORD"))
+    parser.add_argument("--iterations", type=int, default=5000, help="decorated calls per measurement")
+    args = parser.parse_args()
+
+    app, _, _ = create_app()
+    # Cookies are sent explicitly so each login is measured on its own
+    client = app.test_client(use_cookies=False)
+    results = {}
+
+    for role, (username, password), decorator in (('customer', args.customer, login_required),
+                                                  ('admin', args.admin, admin_required)):
+        response = client.post('/api/auth/login', json={'username': username, 'password': password})
+        if response.status_code != 200:
+            print(f"Login failed for {username}: {response.status_code}", file=sys.stderr)
+            return 1
+        header = cookie_header(response)
+        view = decorator(lambda: 'ok')
+
+        # Every authenticated response may rewrite cookies; count what comes back
+        followup = client.get('/api/customer/current', headers={'Cookie': header})
+
+        with app.test_request_context('/', headers={'Cookie': header}):
+            seconds = min(timeit.repeat(view, number=args.iterations, repeat=3))
+        results[role] = {
+            "login_set_cookie_bytes": sum(len(h) for h in response.headers.getlist('Set-Cookie')),
+            "request_cookie_header_bytes": len(header),
+            "response_set_cookie_bytes": sum(len(h) for h in followup.headers.getlist('Set-Cookie')),
+            "decorator_us": round(seconds / args.iterations * 1e6, 2)
+        }
+        client.post('/api/auth/logout', headers={'Cookie': header})
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
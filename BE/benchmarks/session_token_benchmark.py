@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Session cookie benchmark
+Compares the legacy str()/eval() session cookie with signed session ids
+resolved through the server-side session store
+"""
+
+import os
+import sys
+import csv
+import json
+import timeit
+import argparse
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.session_tokens import SessionTokenSigner, SESSION_MAX_AGE
+from utils.session_store import MemorySessionStore
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "banking_customers.csv")
+
+
+def legacy_cookie(customer: dict) -> str:
+    """Cookie value as the old create_multi_session_cookie wrote it"""
+    return str({
+        'user_id': customer['username'],
+        'user_role': 'customer',
+        'user_name': f"{customer['first_name']} {customer['last_name']}",
+        'customer_data': customer,
+        '_created': datetime.now().timestamp()
+    })
+
+
+def main():
+    """Time both cookie formats on one customer row"""
+    parser = argparse.ArgumentParser(description="Benchmark session cookie formats")
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH, help="customer CSV to take a sample row from")
+    parser.add_argument("--iterations", type=int, default=20000, help="parses per measurement")
+    args = parser.parse_args()
+
+    with open(args.csv, 'r', encoding='utf-8') as file:
+        customer = next(csv.DictReader(file))
+    customers = {customer['username']: customer}
+
+    signer = SessionTokenSigner('benchmark-secret')
+    store = MemorySessionStore()
+    old_value = legacy_cookie(customer)
+    session_id = store.create({'user_id': customer['username'], 'user_role': 'customer'}, SESSION_MAX_AGE)
+    new_value = signer.sign(session_id)
+
+    def parse_legacy():
+        return eval(old_value)
+
+    def parse_token():
+        stored = store.get(signer.verify(new_value))
+        return {**stored, 'customer_data': customers.get(stored['user_id'])}
+
+    results = {}
+    for name, value, parse in (('legacy_eval', old_value, parse_legacy), ('signed_token', new_value, parse_token)):
+        seconds = min(timeit.repeat(parse, number=args.iterations, repeat=5))
+        results[name] = {
+            "cookie_bytes": len(value),
+            # The legacy format was written to two cookies per response
+            "set_cookie_bytes": len(value) * (2 if name == 'legacy_eval' else 1),
+            "parse_us": round(seconds / args.iterations * 1e6, 2)
+        }
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
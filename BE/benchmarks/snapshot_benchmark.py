@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Customer snapshot benchmark
+Compares a DictReader parse of the customer CSV with a cold snapshot compile
+and a warm memory-mapped snapshot load, on a synthetic copy of the data
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+from models.customer import coerce_customer_row
+from models.customer_query import CustomerQueryIndex
+from models.customer_snapshot import load_customers, snapshot_path_for
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "banking_customers.csv")
+
+
+def write_synthetic_csv(source: str, target: str, rows: int):
+    """Repeat the source rows with unique ids and usernames until there are enough"""
+    with open(source, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        fieldnames = reader.fieldnames
+        templates = list(reader)
+    with open(target, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for i in range(rows):
+            row = dict(templates[i % len(templates)])
+            row['customer_id'] = f"CUST{i:07d}"
+            row['username'] = f"{row['username']}{i}"
+            row['email'] = f"{i}.{row['email']}"
+            writer.writerow(row)
+
+
+def parse_csv(path: str):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [coerce_customer_row(row) for row in csv.DictReader(file)]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    """Time each load path, plus the query index build with and without prebuilt sort orders"""
+    parser = argparse.ArgumentParser(description="Benchmark CSV parsing against the binary customer snapshot")
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH, help="customer CSV to take template rows from")
+    parser.add_argument("--rows", type=int, default=200000, help="synthetic customers to generate")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "customers.csv")
+        write_synthetic_csv(args.csv, path, args.rows)
+
+        customers, csv_seconds = timed(lambda: parse_csv(path))
+        _, sort_seconds = timed(lambda: CustomerQueryIndex().build(customers))
+        _, compile_seconds = timed(lambda: load_customers(path))
+        (snapshot_rows, orders), load_seconds = timed(lambda: load_customers(path))
+        _, presorted_seconds = timed(lambda: CustomerQueryIndex().build(snapshot_rows, orders))
+        assert list(snapshot_rows) == customers
+
+        print(json.dumps({
+            "rows": args.rows,
+            "csv_bytes": os.path.getsize(path),
+            "snapshot_bytes": os.path.getsize(snapshot_path_for(path)),
+            "csv_parse_s": round(csv_seconds, 3),
+            "snapshot_compile_s": round(compile_seconds, 3),
+            "snapshot_load_s": round(load_seconds, 3),
+            "query_index_sorted_s": round(sort_seconds, 3),
+            "query_index_presorted_s": round(presorted_seconds, 3)
+        }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import os
 import json
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -43,7 +43,34 @@ class AppConfig:
                 "secure": False,
                 "httponly": True,
                 "samesite": "Lax",
-                "lifetime_hours": 24
+                "lifetime_hours": 24,
+                "store": "memory",
+                "sqlite_path": None,
+                "sweep_interval_seconds": 60
+            },
+            "auth": {
+                "password_scheme": None,
+                "hash_workers": None,
+                "max_pending_hashes": None,
+                "accept_stored_hash_as_password": True,
+                "rehash_on_login": False
+            },
+            "data": {
+                "reload_interval_seconds": 2.0
+            },
+            "static": {
+                "reload_interval_seconds": 2.0
+            },
+            "json": {
+                "encoder": None
+            },
+            "rate_limit": {
+                "store": "memory",
+                "sqlite_path": None,
+                "burst": 20,
+                "refill_per_second": 1.0,
+                "max_failures": 5,
+                "failure_window_seconds": 300
             },
             "cors": {
                 "origins": [
@@ -101,6 +128,50 @@ class AppConfig:
             'PERMANENT_SESSION_LIFETIME': self.get('session.lifetime_hours', 24)
         }
     
+    def get_session_store_config(self) -> Dict[str, Any]:
+        """Get server-side session store configuration"""
+        return {
+            'backend': os.environ.get('SESSION_STORE', self.get('session.store', 'memory')),
+            'sqlite_path': os.environ.get('SESSION_SQLITE_PATH', self.get('session.sqlite_path')),
+            'sweep_interval': self.get('session.sweep_interval_seconds', 60)
+        }
+    
+    def get_password_config(self) -> Dict[str, Any]:
+        """Get password hashing configuration (None picks the default)"""
+        return {
+            'scheme': self.get('auth.password_scheme'),
+            'workers': self.get('auth.hash_workers'),
+            'max_pending': self.get('auth.max_pending_hashes'),
+            'accept_stored_hash': self.get('auth.accept_stored_hash_as_password', True)
+        }
+    
+    def get_rate_limit_config(self) -> Dict[str, Any]:
+        """Get login rate limiter configuration"""
+        return {
+            'backend': os.environ.get('RATE_LIMIT_STORE', self.get('rate_limit.store', 'memory')),
+            'sqlite_path': os.environ.get('RATE_LIMIT_SQLITE_PATH', self.get('rate_limit.sqlite_path')),
+            'burst': self.get('rate_limit.burst', 20),
+            'refill_per_second': self.get('rate_limit.refill_per_second', 1.0),
+            'max_failures': self.get('rate_limit.max_failures', 5),
+            'failure_window': self.get('rate_limit.failure_window_seconds', 300)
+        }
+    
+    def get_rehash_on_login(self) -> bool:
+        """Get whether logins upgrade legacy and weaker hashes in the customer CSV (off for the bundled demo data)"""
+        return self.get('auth.rehash_on_login', False)
+    
+    def get_customer_reload_interval(self) -> float:
+        """Get how often the customer CSV is checked for outside changes (0 disables)"""
+        return self.get('data.reload_interval_seconds', 2.0)
+    
+    def get_static_reload_interval(self) -> float:
+        """Get how often the frontend files are checked for changes (0 disables)"""
+        return self.get('static.reload_interval_seconds', 2.0)
+    
+    def get_json_encoder(self) -> Optional[str]:
+        """Get the JSON encoder for responses (None picks orjson if installed, else json)"""
+        return self.get('json.encoder')
+    
     def get_cors_config(self) -> Dict[str, Any]:
         """Get CORS configuration"""
         return {
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Bulk customer import CLI
+Validates a customer CSV and appends it to the customer store in batched commits
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.app_config import AppConfig
+from models.banking_assistant import BankingAssistant
+from models.customer_import import CustomerImporter, DEFAULT_BATCH_SIZE
+from utils.password_service import PasswordService
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "banking_customers.csv")
+
+
+def main():
+    """Run a bulk import from the command line"""
+    parser = argparse.ArgumentParser(description="Bulk import customers from a CSV file")
+    parser.add_argument("source", help="CSV file with customer rows to import")
+    parser.add_argument("--store", default=DEFAULT_CSV_PATH, help="customer CSV to import into")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per committed batch")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, do not write anything")
+    args = parser.parse_args()
+
+    banking_assistant = BankingAssistant(args.store)
+    password_service = PasswordService(**AppConfig().get_password_config())
+    importer = CustomerImporter(banking_assistant, password_service, batch_size=args.batch_size)
+    try:
+        with open(args.source, 'r', encoding='utf-8-sig', newline='') as stream:
+            report = importer.import_csv(stream, dry_run=args.dry_run)
+    finally:
+        password_service.shutdown()
+
+    print(json.dumps(report, indent=2))
+    return 0 if report['success'] and not report['failed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,156 +1,470 @@
 import csv
 import os
+import stat
 import random
 import logging
-from typing import Dict, List
+import tempfile
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Iterator, Sequence, Tuple, Union
 from datetime import datetime
 
+from models.search_index import CustomerSearchIndex
+from models.suggest_index import CustomerSuggestIndex
+from models.customer_query import CustomerQueryIndex, project
+from models.customer_aggregates import CustomerAggregates
+from models.customer import Customer
+from models.customer_dataset import CustomerDataset
+from models.persistent import ChunkedList, ShardedDict
+from models.customer_snapshot import load_customers, SnapshotCustomers, SnapshotError
+from models.loan_portfolio import LoanPortfolio, DEFAULT_PROJECTION_MONTHS
+from models.loan_math import loan_summary
+
+# Advisory locks on the customer CSV between worker processes; unavailable on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# Distinct (months, group_by) projections kept for the current data version
+MAX_CACHED_PROJECTIONS = 32
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """(inode, size, mtime_ns) of a file, None if it is missing; any rewrite or append changes it"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
 class BankingAssistant:
     def __init__(self, csv_file_path: str):
         self.csv_file_path = csv_file_path
-        self.customers = self._load_customer_data()
+        # The CSV as last loaded or written by this process, to tell outside changes from our own
+        self._source_signature = file_signature(csv_file_path)
+        # Serialises writes between this process's threads; _file_lock() also covers other worker processes
+        self._write_lock = threading.Lock()
+        self._lock_path = f"{csv_file_path}.lock"
+        # The published dataset; replaced as a whole, never written in place
+        self._data = CustomerDataset.build(*self._load_customer_data())
+        # Called after each write that reaches the CSV, so other worker processes can reload
+        self.on_write: Optional[Callable[[], None]] = None
+        # Loan portfolio arrays and projections, rebuilt lazily when data_version moves on
+        self._loan_portfolio: Optional[LoanPortfolio] = None
+        self._portfolio_version = 0
+        self._projections: Dict[tuple, Dict] = {}
+        self._portfolio_lock = threading.Lock()
         self.conversation_history = []
         
-    def _load_customer_data(self) -> List[Dict]:
-        """Load customer data from CSV file"""
-        customers = []
+    @property
+    def data(self) -> CustomerDataset:
+        """The current dataset; take it once per operation to read a single consistent version"""
+        return self._data
+    
+    # Shortcuts into the current dataset, for callers that read a single structure
+    @property
+    def customers(self) -> Union[ChunkedList, SnapshotCustomers]:
+        return self._data.customers
+    
+    @property
+    def customer_ids(self) -> ShardedDict:
+        return self._data.customer_ids
+    
+    @property
+    def usernames(self) -> ShardedDict:
+        return self._data.usernames
+    
+    @property
+    def search_index(self) -> CustomerSearchIndex:
+        return self._data.search_index
+    
+    @property
+    def suggest_index(self) -> CustomerSuggestIndex:
+        return self._data.suggest_index
+    
+    @property
+    def query_index(self) -> CustomerQueryIndex:
+        return self._data.query_index
+    
+    @property
+    def aggregates(self) -> CustomerAggregates:
+        return self._data.aggregates
+    
+    @property
+    def data_version(self) -> int:
+        """Bumped on every write so derived results can be cached per data version"""
+        return self._data.version
+    
+    def _publish(self, data: CustomerDataset):
+        """Swap in the next dataset; a single reference assignment, so readers see the old or the new one whole"""
+        self._data = data
+    
+    def refresh(self) -> bool:
+        """Pick up changes another process made to the customer CSV, re-indexing only the rows that changed.
+
+        Returns whether a change was found. A file that cannot be read keeps the current data.
+        """
+        seen = self._source_signature
+        signature = file_signature(self.csv_file_path)
+        if signature is None or signature == seen:
+            return False
         try:
-            with open(self.csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    # Convert numeric fields
-                    row['balance'] = float(row['balance'])
-                    row['credit_score'] = int(row['credit_score'])
-                    row['loan_amounts'] = float(row['loan_amounts'])
-                    row['monthly_payments'] = float(row['monthly_payments'])
-                    customers.append(row)
-            logger.info(f"Loaded {len(customers)} customers from CSV")
-            return customers
+            customers, sort_orders = self._read_customer_file()
+        except Exception as e:
+            logger.error(f"Keeping the loaded customers, the changed CSV could not be read: {e}")
+            with self._write_lock:
+                if self._source_signature == seen:
+                    # Don't retry the same broken file on every check; the next change is picked up
+                    self._source_signature = signature
+            return False
+        
+        with self._write_lock:
+            if self._source_signature != seen:
+                # This process wrote the file meanwhile, so what was read may already be stale; retry next time
+                return False
+            data = self._data
+            current = data.customers
+            if len(customers) >= len(current) and all(
+                    new['customer_id'] == old['customer_id'] for new, old in zip(customers, current)):
+                # Rows kept their positions, so doc ids stay valid: re-index only what changed
+                changed = {doc_id: customers[doc_id] for doc_id in range(len(current))
+                           if customers[doc_id] != current[doc_id]}
+                added = customers[len(current):]
+                self._publish(data.derive(changed, added))
+                logger.info(f"Reloaded customer CSV: {len(changed)} changed, {len(added)} added")
+            else:
+                # Rows were removed or reordered, so doc ids move: index from scratch
+                self._publish(CustomerDataset.build(customers, sort_orders, data.version + 1))
+                logger.info(f"Reloaded customer CSV: rebuilt indexes for {len(customers)} customers")
+            self._source_signature = signature
+        return True
+    
+    def _notify_write(self):
+        if self.on_write is not None:
+            self.on_write()
+    
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Hold the customer CSV's lock file: exclusive around a write, shared around a read.
+
+        The lock is taken per open file, so it orders the threads of this process
+        as well as every forked worker. A read goes ahead unlocked if the lock file
+        cannot be created, e.g. in a read-only data directory.
+        """
+        if fcntl is None:
+            yield
+            return
+        try:
+            lock_file = open(self._lock_path, 'a')
+        except OSError:
+            if not shared:
+                raise
+            yield
+            return
+        with lock_file:
+            # Closing the file releases the lock
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+    
+    def _load_customer_data(self) -> Tuple[Sequence[Customer], Optional[Dict[str, List[int]]]]:
+        """Load customer data, or an empty list (logged) if the CSV is missing or unreadable"""
+        try:
+            return self._read_customer_file()
         except FileNotFoundError:
             logger.error(f"CSV file {self.csv_file_path} not found")
-            return []
+            return [], None
         except Exception as e:
             logger.error(f"Error loading customer data: {e}")
-            return []
+            return [], None
+    
+    def _read_customer_file(self) -> Tuple[Sequence[Customer], Optional[Dict[str, List[int]]]]:
+        """Read customers through the binary snapshot, recompiling it when the CSV has changed.
+
+        Also returns the snapshot's prebuilt sort orders, or None after a plain CSV parse.
+        """
+        # Shared, so no other worker's append or rewrite is read half done
+        with self._file_lock(shared=True):
+            try:
+                customers, sort_orders = load_customers(self.csv_file_path)
+                logger.info(f"Loaded {len(customers)} customers")
+                return customers, sort_orders
+            except SnapshotError as e:
+                logger.warning(f"Customer snapshot unavailable ({e}), parsing the CSV")
+            
+            customers = []
+            with open(self.csv_file_path, 'r', encoding='utf-8') as file:
+                reader = csv.DictReader(file)
+                for row in reader:
+                    # Convert numeric fields and intern the categorical ones
+                    customers.append(Customer.from_row(row))
+        logger.info(f"Loaded {len(customers)} customers from CSV")
+        return customers, None
         
     def get_customer_stats(self) -> Dict:
         """Get comprehensive customer statistics"""
-        if not self.customers:
+        data = self._data
+        if not data.customers:
             return {"error": "No customer data available"}
-            
-        total_customers = len(self.customers)
-        customers_with_loans = len([c for c in self.customers if c['has_loans'] == 'yes'])
-        customers_without_loans = total_customers - customers_with_loans
-        
-        # Loan type distribution
-        loan_types = {}
-        for customer in self.customers:
-            if customer['has_loans'] == 'yes' and customer['loan_types'] != 'none':
-                loan_type = customer['loan_types']
-                loan_types[loan_type] = loan_types.get(loan_type, 0) + 1
-        
-        # Account type distribution
-        account_types = {}
-        for customer in self.customers:
-            account_type = customer['account_type']
-            account_types[account_type] = account_types.get(account_type, 0) + 1
         
-        # Risk level distribution
-        risk_levels = {}
-        for customer in self.customers:
-            risk_level = customer['risk_level']
-            risk_levels[risk_level] = risk_levels.get(risk_level, 0) + 1
-        
-        # Calculate averages
-        avg_credit_score = round(sum(c['credit_score'] for c in self.customers) / total_customers)
-        avg_balance = round(sum(c['balance'] for c in self.customers) / total_customers, 2)
-        avg_loan_amount = round(sum(c['loan_amounts'] for c in self.customers if c['has_loans'] == 'yes') / customers_with_loans, 2) if customers_with_loans > 0 else 0
+        aggregates = data.aggregates
+        total_customers = aggregates.total
+        customers_with_loans = aggregates.with_loans
         
         return {
             "total_customers": total_customers,
             "customers_with_loans": customers_with_loans,
-            "customers_without_loans": customers_without_loans,
+            "customers_without_loans": total_customers - customers_with_loans,
             "loan_percentage": round(customers_with_loans / total_customers * 100, 1),
-            "loan_types": loan_types,
-            "account_types": account_types,
-            "risk_levels": risk_levels,
-            "average_credit_score": avg_credit_score,
-            "average_balance": avg_balance,
-            "average_loan_amount": avg_loan_amount
+            "loan_types": dict(aggregates.loan_types),
+            "account_types": dict(aggregates.account_types),
+            "risk_levels": dict(aggregates.risk_levels),
+            "average_credit_score": round(aggregates.credit_score_sum / total_customers),
+            "average_balance": round(aggregates.balance_sum / total_customers, 2),
+            "average_loan_amount": round(aggregates.loan_amount_sum / customers_with_loans, 2) if customers_with_loans > 0 else 0
         }
     
-    def get_random_customer(self) -> Dict:
+    def get_admin_stats(self) -> Dict:
+        """Get admin dashboard statistics from the running aggregates and sort indexes"""
+        data = self._data
+        aggregates = data.aggregates
+        total_customers = aggregates.total
+        credit_scores = data.query_index.sorted_keys['credit_score']
+        balances = data.query_index.sorted_keys['balance']
+        
+        return {
+            "total_customers": total_customers,
+            "active_accounts": aggregates.account_statuses.get('active', 0),
+            "frozen_accounts": aggregates.account_statuses.get('frozen', 0),
+            "account_types": dict(aggregates.account_types),
+            "risk_levels": dict(aggregates.risk_levels),
+            "loan_stats": {
+                "customers_with_loans": aggregates.with_loans,
+                "total_loan_amount": aggregates.loan_amount_sum,
+                "total_monthly_payments": aggregates.monthly_payment_sum,
+                "loan_types": dict(aggregates.loan_types)
+            },
+            "credit_score_stats": {
+                "average": round(aggregates.credit_score_sum / total_customers, 2) if total_customers else 0,
+                "min": credit_scores[0][0] if credit_scores else 0,
+                "max": credit_scores[-1][0] if credit_scores else 0
+            },
+            "balance_stats": {
+                "total_balance": aggregates.balance_sum,
+                "average_balance": aggregates.balance_sum / total_customers if total_customers else 0,
+                "min_balance": balances[0][0] if balances else 0,
+                "max_balance": balances[-1][0] if balances else 0
+            }
+        }
+    
+    def get_loan_projection(self, months: int = DEFAULT_PROJECTION_MONTHS,
+                            group_by: tuple = ('loan_type', 'risk_level')) -> Dict:
+        """Project aggregate loan cash flows, cached until the customer data changes"""
+        key = (months, tuple(group_by))
+        with self._portfolio_lock:
+            data = self._data
+            version = data.version
+            if self._loan_portfolio is None or self._portfolio_version != version:
+                self._loan_portfolio = LoanPortfolio()
+                self._loan_portfolio.build(data.customers)
+                self._portfolio_version = version
+                self._projections = {}
+            
+            projection = self._projections.get(key)
+            if projection is None:
+                projection = self._loan_portfolio.project(months, group_by)
+                projection['data_version'] = version
+                if len(self._projections) >= MAX_CACHED_PROJECTIONS:
+                    self._projections.pop(next(iter(self._projections)))
+                self._projections[key] = projection
+            return projection
+    
+    def get_random_customer(self) -> Union[Customer, Dict]:
         """Get a random customer profile"""
-        if not self.customers:
+        customers = self.customers
+        if not customers:
             return {"error": "No customer data available"}
-        return random.choice(self.customers)
+        return random.choice(customers)
+    
+    def search_customers(self, query: str, page: int = 1, page_size: int = 10) -> Dict:
+        """Search customers by various criteria, ranked by relevance"""
+        page = max(page, 1)
+        data = self._data
+        total, hits = data.search_index.search(query, offset=(page - 1) * page_size, limit=page_size)
+        return {
+            "results": [data.customers[doc_id] for doc_id, _ in hits],
+            "scores": [score for _, score in hits],
+            "total": total,
+            "page": page,
+            "page_size": page_size
+        }
+    
+    def suggest_customers(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Get typeahead suggestions for customers matching a prefix"""
+        suggestions = []
+        data = self._data
+        for doc_id, field in data.suggest_index.suggest(prefix, limit):
+            customer = data.customers[doc_id]
+            suggestions.append({
+                "customer_id": customer['customer_id'],
+                "username": customer['username'],
+                "name": f"{customer['first_name']} {customer['last_name']}",
+                "email": customer['email'],
+                "matched_field": field
+            })
+        return suggestions
     
-    def search_customers(self, query: str) -> List[Dict]:
-        """Search customers by various criteria"""
-        if not self.customers:
+    def list_customers(self, filters: Dict[str, str], sort: str = 'customer_id', descending: bool = False,
+                       cursor: Optional[str] = None, limit: int = 50, fields: Optional[List[str]] = None,
+                       query: str = '') -> Dict:
+        """Get one cursor-paginated page of customers, filtered and sorted through secondary indexes"""
+        return self._list_page(self._data, filters, sort, descending, cursor, limit, fields, query)
+    
+    def _list_page(self, data: CustomerDataset, filters: Dict[str, str], sort: str, descending: bool,
+                   cursor: Optional[str], limit: int, fields: Optional[List[str]], query: str) -> Dict:
+        candidates = data.search_index.match(query) if query else None
+        page = data.query_index.query(filters, sort, descending, cursor, limit, candidates)
+        return {
+            "customers": [project(data.customers[doc_id], fields) for doc_id in page['doc_ids']],
+            "total": page['total'],
+            "next_cursor": page['next_cursor']
+        }
+    
+    def iter_customers(self, filters: Dict[str, str], sort: str = 'customer_id', descending: bool = False,
+                       fields: Optional[List[str]] = None, query: str = '', batch_size: int = 1000) -> Iterator[Dict]:
+        """Yield every matching customer in sort order, all from one data version.
+
+        The search match, filter and sort run once; the sorted doc ids are then walked batch_size at a time.
+        """
+        data = self._data
+        candidates = data.search_index.match(query) if query else None
+        doc_ids = data.query_index.iter_doc_ids(filters, sort, descending, candidates)
+        while True:
+            batch = list(islice(doc_ids, batch_size))
+            if not batch:
+                break
+            customers = data.customers
+            yield from (project(customers[doc_id], fields) for doc_id in batch)
+    
+    def public_fields(self) -> List[str]:
+        """Get the customer columns that may be exposed outside the server"""
+        customers = self.customers
+        if not customers:
             return []
-            
-        query = query.lower()
-        results = []
-        
-        for customer in self.customers:
-            # Search in name, email, account type, loan type, common issues
-            searchable_fields = [
-                customer['first_name'].lower(),
-                customer['last_name'].lower(),
-                customer['email'].lower(),
-                customer['account_type'].lower(),
-                customer['loan_types'].lower(),
-                customer['common_issues'].lower(),
-                customer['risk_level'].lower()
-            ]
-            
-            if any(query in field for field in searchable_fields):
-                results.append(customer)
-                
-        return results[:10]  # Limit to 10 results
+        return list(project(customers[0]).keys())
+    
+    def add_customers(self, customers: List[Dict], persist_rows: Optional[List[Dict]] = None,
+                      fieldnames: Optional[List[str]] = None):
+        """Add a batch of customers, optionally appending their raw rows to the CSV in one write first"""
+        customers = [c if isinstance(c, Customer) else Customer.from_row(c) for c in customers]
+        with self._write_lock:
+            if persist_rows:
+                with self._file_lock():
+                    self._append_rows(persist_rows, fieldnames or list(persist_rows[0].keys()))
+            self._publish(self._data.derive(added=customers))
+        if persist_rows:
+            self._notify_write()
     
-    def get_customers_by_loan_type(self, loan_type: str) -> List[Dict]:
+    def update_password_hashes(self, hashes: Dict[str, str], expected: Optional[Dict[str, str]] = None) -> int:
+        """Replace password hashes by username, in the CSV (atomically) and in memory.
+
+        A user listed in expected is only updated while the CSV still holds that
+        hash for them (compare-and-set); stale entries are skipped. Credentials
+        are not indexed or aggregated, so data_version is left alone.
+        """
+        with self._write_lock, self._file_lock():
+            before = file_signature(self.csv_file_path)
+            with open(self.csv_file_path, 'r', newline='', encoding='utf-8') as file:
+                reader = csv.DictReader(file)
+                fieldnames = reader.fieldnames
+                rows = list(reader)
+
+            updated = {}
+            for row in rows:
+                username = row['username']
+                new_hash = hashes.get(username)
+                if new_hash is None:
+                    continue
+                if expected and username in expected and row['password_hash'] != expected[username]:
+                    logger.info(f"Skipped a stale password hash update for {username}")
+                    continue
+                row['password_hash'] = new_hash
+                updated[username] = new_hash
+            if not updated:
+                return 0
+
+            self._replace_file(rows, fieldnames)
+            self._wrote_file(before)
+
+            data = self._data
+            changed = {}
+            for username, new_hash in updated.items():
+                doc_id = data.usernames.get(username)
+                if doc_id is not None:
+                    changed[doc_id] = data.customers[doc_id].replace({'password_hash': new_hash})
+            self._publish(data.derive(changed=changed))
+            self._notify_write()
+            logger.info(f"Updated password hashes for {len(updated)} customers")
+            return len(updated)
+
+    def _replace_file(self, rows: List[Dict], fieldnames: List[str]):
+        """Write the whole customer CSV to a temp file in the same directory and rename it over the CSV"""
+        directory = os.path.dirname(os.path.abspath(self.csv_file_path))
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.customers-', suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+                file.flush()
+                # mkstemp creates the file private; keep the CSV's own permissions
+                os.fchmod(file.fileno(), stat.S_IMODE(os.stat(self.csv_file_path).st_mode))
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.csv_file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def _append_rows(self, rows: List[Dict], fieldnames: List[str]):
+        """Append raw rows to the customer CSV and flush them to disk; the caller holds _file_lock()"""
+        before = file_signature(self.csv_file_path)
+        with open(self.csv_file_path, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+        self._wrote_file(before)
+    
+    def _wrote_file(self, before: Optional[Tuple[int, int, int]]):
+        """Remember the CSV as this process just wrote it, unless it had outside changes refresh() has not loaded yet"""
+        if before == self._source_signature:
+            self._source_signature = file_signature(self.csv_file_path)
+    
+    def get_customers_by_loan_type(self, loan_type: str) -> List[Customer]:
         """Get customers by loan type"""
-        if not self.customers:
-            return []
-            
         return [c for c in self.customers if c['loan_types'] == loan_type]
     
-    def get_customers_by_risk_level(self, risk_level: str) -> List[Dict]:
+    def get_customers_by_risk_level(self, risk_level: str) -> List[Customer]:
         """Get customers by risk level"""
-        if not self.customers:
-            return []
-            
         return [c for c in self.customers if c['risk_level'] == risk_level]
     
     def calculate_loan_payment(self, principal: float, rate: float, years: int) -> Dict:
-        """Calculate loan payment using simple interest formula"""
-        monthly_rate = rate / 12 / 100
-        num_payments = years * 12
-        
-        if monthly_rate == 0:
-            monthly_payment = principal / num_payments
-        else:
-            monthly_payment = principal * (monthly_rate * (1 + monthly_rate) ** num_payments) / ((1 + monthly_rate) ** num_payments - 1)
-        
-        total_payment = monthly_payment * num_payments
-        total_interest = total_payment - principal
-        
-        return {
-            "principal": principal,
-            "annual_rate": rate,
-            "years": years,
-            "monthly_payment": round(monthly_payment, 2),
-            "total_payment": round(total_payment, 2),
-            "total_interest": round(total_interest, 2)
-        }
+        """Calculate loan payment using the shared annuity kernel"""
+        return loan_summary(principal, rate, years)
     
-    def get_customer_by_username(self, username: str) -> Dict:
+    def get_customer_by_username(self, username: str) -> Optional[Customer]:
         """Get customer data by username"""
-        for customer in self.customers:
-            if customer['username'] == username:
-                return customer
-        return None 
\ No newline at end of file
+        data = self._data
+        doc_id = data.usernames.get(username)
+        return data.customers[doc_id] if doc_id is not None else None
+    
+    def get_customer_by_id(self, customer_id: str) -> Optional[Customer]:
+        """Get customer data by customer ID"""
+        data = self._data
+        doc_id = data.customer_ids.get(customer_id)
+        return data.customers[doc_id] if doc_id is not None else None 
\ No newline at end of file
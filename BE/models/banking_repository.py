@@ -0,0 +1,212 @@
+import csv
+import os
+import logging
+import threading
+from functools import cached_property
+from typing import Callable, Dict, Iterable, List, Optional
+
+from models.transaction_index import TransactionIndex
+from models.transaction_rollups import TransactionRollups
+
+logger = logging.getLogger(__name__)
+
+# Normalized tables under data/: name -> (file name, numeric column converters)
+TABLES: Dict[str, tuple] = {
+    'profiles': ('customer_profiles.csv', {}),
+    'accounts': ('accounts.csv', {
+        'balance': float,
+        'credit_score': int,
+        'interest_rate': float,
+        'monthly_income': float,
+        'monthly_expenses': float
+    }),
+    'loans': ('loans.csv', {'loan_amount': float, 'monthly_payment': float}),
+    'transactions': ('transactions.csv', {'amount': float}),
+    'support_issues': ('support_issues.csv', {}),
+    'password_resets': ('password_resets.csv', {})
+}
+
+# Surrogate keys the SQL schema generates with AUTO_INCREMENT but the CSV exports omit
+SURROGATE_KEYS = {
+    'loans': 'loan_id',
+    'support_issues': 'issue_id',
+    'password_resets': 'reset_id'
+}
+
+# Relations a CustomerRecord can materialize
+CUSTOMER_RELATIONS = ('profile', 'account', 'loans', 'transactions', 'support_issues')
+
+
+class Table:
+    """One normalized CSV table, loaded on first use and hash-indexed by customer_id"""
+
+    def __init__(self, name: str, file_path: str, converters: Dict[str, Callable], surrogate_key: Optional[str] = None):
+        self.name = name
+        self.file_path = file_path
+        self.converters = converters
+        self.surrogate_key = surrogate_key
+        self._rows: Optional[List[Dict]] = None
+        self._by_customer: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self) -> List[Dict]:
+        """All rows of the table, loading it if needed"""
+        if self._rows is None:
+            self._load()
+        return self._rows
+
+    def for_customer(self, customer_id: str) -> List[Dict]:
+        """Get every row belonging to a customer"""
+        rows = self.rows
+        return [rows[i] for i in self._by_customer.get(customer_id, ())]
+
+    def first_for_customer(self, customer_id: str) -> Optional[Dict]:
+        """Get the first row belonging to a customer (for one-to-one tables)"""
+        rows = self.rows
+        positions = self._by_customer.get(customer_id)
+        return rows[positions[0]] if positions else None
+
+    def customer_ids(self) -> Iterable[str]:
+        """Get the distinct customer ids present in the table"""
+        if self._rows is None:
+            self._load()
+        return self._by_customer.keys()
+
+    def _load(self):
+        """Read the CSV and build the customer_id index"""
+        with self._lock:
+            if self._rows is not None:
+                return
+            rows = []
+            by_customer: Dict[str, List[int]] = {}
+            try:
+                with open(self.file_path, 'r', encoding='utf-8') as file:
+                    reader = csv.DictReader(file)
+                    for position, row in enumerate(reader):
+                        for column, convert in self.converters.items():
+                            if row.get(column, '').strip():
+                                row[column] = convert(row[column])
+                        if self.surrogate_key:
+                            row[self.surrogate_key] = position + 1
+                        rows.append(row)
+                        by_customer.setdefault(row['customer_id'], []).append(position)
+                logger.info(f"Loaded {len(rows)} rows from {self.name} table")
+            except FileNotFoundError:
+                logger.error(f"Table file {self.file_path} not found")
+            except Exception as e:
+                logger.error(f"Error loading {self.name} table: {e}")
+                rows, by_customer = [], {}
+            self._by_customer = by_customer
+            self._rows = rows
+
+
+class CustomerRecord:
+    """Lazy join of one customer's rows across the normalized tables"""
+
+    def __init__(self, repository: 'BankingRepository', customer_id: str):
+        self.repository = repository
+        self.customer_id = customer_id
+
+    @cached_property
+    def profile(self) -> Optional[Dict]:
+        """The customer_profiles row, fetched on first access"""
+        return self.repository.table('profiles').first_for_customer(self.customer_id)
+
+    @cached_property
+    def account(self) -> Optional[Dict]:
+        """The primary accounts row, fetched on first access"""
+        return self.repository.table('accounts').first_for_customer(self.customer_id)
+
+    @cached_property
+    def loans(self) -> List[Dict]:
+        """All loans rows, fetched on first access"""
+        return self.repository.table('loans').for_customer(self.customer_id)
+
+    @cached_property
+    def transactions(self) -> List[Dict]:
+        """All transactions rows, fetched on first access"""
+        return self.repository.table('transactions').for_customer(self.customer_id)
+
+    @cached_property
+    def support_issues(self) -> List[Dict]:
+        """All support_issues rows, fetched on first access"""
+        return self.repository.table('support_issues').for_customer(self.customer_id)
+
+    def to_dict(self, include: Iterable[str] = ('profile', 'account', 'loans')) -> Dict:
+        """Materialize only the requested relations"""
+        result = {"customer_id": self.customer_id}
+        for relation in include:
+            if relation not in CUSTOMER_RELATIONS:
+                raise ValueError(f"Unknown relation: {relation}")
+            result[relation] = getattr(self, relation)
+        return result
+
+
+class BankingRepository:
+    """Repository over the normalized data/ tables with per-customer hash indexes"""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.tables = {
+            name: Table(name, os.path.join(data_dir, file_name), converters, SURROGATE_KEYS.get(name))
+            for name, (file_name, converters) in TABLES.items()
+        }
+        self._transaction_index: Optional[TransactionIndex] = None
+        self._transaction_rollups: Optional[TransactionRollups] = None
+        self._index_lock = threading.Lock()
+
+    def table(self, name: str) -> Table:
+        """Get a table by name"""
+        return self.tables[name]
+
+    def exists(self, customer_id: str) -> bool:
+        """Check whether a customer has a profile"""
+        return self.table('profiles').first_for_customer(customer_id) is not None
+
+    def get_customer(self, customer_id: str) -> Optional[CustomerRecord]:
+        """Get a lazily-joined view of a customer, or None if unknown"""
+        if not self.exists(customer_id):
+            return None
+        return CustomerRecord(self, customer_id)
+
+    def get_loans(self, customer_id: str) -> List[Dict]:
+        """Get all loans held by a customer"""
+        return self.table('loans').for_customer(customer_id)
+
+    def get_transactions(self, customer_id: str) -> List[Dict]:
+        """Get all transactions of a customer in file order"""
+        return self.table('transactions').for_customer(customer_id)
+
+    def transaction_index(self) -> TransactionIndex:
+        """Get the date-sorted transaction index, building it on first use"""
+        if self._transaction_index is None:
+            with self._index_lock:
+                if self._transaction_index is None:
+                    index = TransactionIndex()
+                    index.build(self.table('transactions').rows)
+                    self._transaction_index = index
+        return self._transaction_index
+
+    def transaction_rollups(self) -> TransactionRollups:
+        """Get the time-series transaction rollups, building them on first use"""
+        if self._transaction_rollups is None:
+            with self._index_lock:
+                if self._transaction_rollups is None:
+                    rollups = TransactionRollups()
+                    rollups.build(self.table('transactions').rows, self._account_types())
+                    self._transaction_rollups = rollups
+        return self._transaction_rollups
+
+    def _account_types(self) -> Dict[str, str]:
+        """Map every customer_id to its primary account type"""
+        return {row['customer_id']: row['account_type'] for row in self.table('accounts').rows}
+
+    def get_transaction_page(self, customer_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                             cursor: Optional[str] = None, limit: int = 50, descending: bool = True) -> Dict:
+        """Get one keyset-paginated page of a customer's transactions with running balances"""
+        return self.transaction_index().query(customer_id, date_from, date_to, cursor, limit, descending)
+
+    def get_support_issues(self, customer_id: str) -> List[Dict]:
+        """Get all support issues raised by a customer"""
+        return self.table('support_issues').for_customer(customer_id)
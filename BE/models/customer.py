@@ -0,0 +1,174 @@
+import sys
+from collections.abc import Mapping
+from operator import attrgetter
+from typing import Any, Dict, Iterator, Set
+
+from models.customer_query import SENSITIVE_FIELDS
+
+# Columns of banking_customers.csv, in file order
+CUSTOMER_FIELDS = (
+    'customer_id',
+    'first_name',
+    'last_name',
+    'email',
+    'phone',
+    'account_type',
+    'account_status',
+    'balance',
+    'credit_score',
+    'last_transaction_date',
+    'preferred_contact_method',
+    'common_issues',
+    'risk_level',
+    'account_opened_date',
+    'has_loans',
+    'loan_types',
+    'loan_amounts',
+    'monthly_payments',
+    'username',
+    'password_hash',
+    'interest_rate',
+    'reset_token',
+    'reset_token_expiry',
+    'security_question',
+    'security_answer',
+    'monthly_income',
+    'monthly_expenses'
+)
+
+# Low-cardinality columns; interning makes every row share one str per distinct value
+CATEGORICAL_FIELDS = (
+    'account_type',
+    'account_status',
+    'preferred_contact_method',
+    'common_issues',
+    'risk_level',
+    'has_loans',
+    'loan_types',
+    'interest_rate',
+    'security_question'
+)
+
+# Typed columns and their converters, shared by Customer.from_row and coerce_customer_row
+NUMERIC_FIELDS = {
+    'balance': float,
+    'credit_score': int,
+    'loan_amounts': float,
+    'monthly_payments': float
+}
+
+# Per-column conversion applied by Customer.from_row, None for plain text
+_CONVERTERS = tuple(
+    (name, NUMERIC_FIELDS.get(name) or (sys.intern if name in CATEGORICAL_FIELDS else None))
+    for name in CUSTOMER_FIELDS
+)
+
+
+def coerce_customer_row(row: Dict) -> Dict:
+    """Convert the numeric fields of a plain dict row in place, raising ValueError on bad input"""
+    for name, convert in NUMERIC_FIELDS.items():
+        row[name] = convert(row[name])
+    return row
+
+
+class Customer(Mapping):
+    """One customer record with a slot per CSV column instead of a per-row dict.
+
+    Reads like a read-only dict (customer['balance'], .get(), .items(), ==),
+    so indexes, aggregates and prompts work unchanged; changes go through
+    replace(). It is not JSON serializable on purpose, so responses go through
+    to_public_dict().
+    """
+
+    __slots__ = CUSTOMER_FIELDS
+
+    def __init__(self, customer_id, first_name, last_name, email,
+                 phone, account_type, account_status, balance,
+                 credit_score, last_transaction_date, preferred_contact_method, common_issues,
+                 risk_level, account_opened_date, has_loans, loan_types,
+                 loan_amounts, monthly_payments, username, password_hash,
+                 interest_rate, reset_token, reset_token_expiry, security_question,
+                 security_answer, monthly_income, monthly_expenses):
+        """Values in CUSTOMER_FIELDS order, already typed"""
+        self.customer_id = customer_id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        self.phone = phone
+        self.account_type = account_type
+        self.account_status = account_status
+        self.balance = balance
+        self.credit_score = credit_score
+        self.last_transaction_date = last_transaction_date
+        self.preferred_contact_method = preferred_contact_method
+        self.common_issues = common_issues
+        self.risk_level = risk_level
+        self.account_opened_date = account_opened_date
+        self.has_loans = has_loans
+        self.loan_types = loan_types
+        self.loan_amounts = loan_amounts
+        self.monthly_payments = monthly_payments
+        self.username = username
+        self.password_hash = password_hash
+        self.interest_rate = interest_rate
+        self.reset_token = reset_token
+        self.reset_token_expiry = reset_token_expiry
+        self.security_question = security_question
+        self.security_answer = security_answer
+        self.monthly_income = monthly_income
+        self.monthly_expenses = monthly_expenses
+
+    @classmethod
+    def from_row(cls, row: Mapping) -> 'Customer':
+        """Build from a CSV row or dict: convert the numeric columns (ValueError on bad input) and intern categoricals"""
+        get = row.get
+        return cls(*[convert(get(name, '')) if convert else get(name, '') for name, convert in _CONVERTERS])
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in CUSTOMER_FIELDS else default
+
+    def __contains__(self, key) -> bool:
+        return key in CUSTOMER_FIELDS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CUSTOMER_FIELDS)
+
+    def __len__(self) -> int:
+        return len(CUSTOMER_FIELDS)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Customer):
+            return _values(self) == _values(other)
+        return super().__eq__(other)
+
+    def replace(self, updates: Mapping) -> 'Customer':
+        """A copy with some fields changed; records already handed to readers are never written in place"""
+        unknown = set(updates).difference(CUSTOMER_FIELDS)
+        if unknown:
+            raise KeyError(', '.join(sorted(unknown)))
+        return Customer(*[updates.get(name, value) for name, value in zip(CUSTOMER_FIELDS, _values(self))])
+
+    def changed_fields(self, other: 'Customer') -> Set[str]:
+        """Names of the fields whose values differ from another record"""
+        return {name for name, mine, theirs in zip(CUSTOMER_FIELDS, _values(self), _values(other)) if mine != theirs}
+
+    def to_dict(self) -> Dict:
+        """Every field, secrets included, for server-side use"""
+        return dict(zip(CUSTOMER_FIELDS, _values(self)))
+
+    def to_public_dict(self) -> Dict:
+        """Every field except credentials and security answers, safe to send to clients"""
+        return {name: value for name, value in zip(CUSTOMER_FIELDS, _values(self)) if name not in SENSITIVE_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"Customer({self.customer_id!r}, {self.username!r})"
+
+
+# All field values of a record as one tuple, in CUSTOMER_FIELDS order
+_values = attrgetter(*CUSTOMER_FIELDS)
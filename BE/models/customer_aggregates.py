@@ -0,0 +1,79 @@
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Every customer field the aggregates read
+AGGREGATE_FIELDS = frozenset((
+    'credit_score',
+    'balance',
+    'account_type',
+    'account_status',
+    'risk_level',
+    'has_loans',
+    'loan_amounts',
+    'monthly_payments',
+    'loan_types'
+))
+
+
+def _bump(counts: Dict[str, int], key: str, delta: int):
+    """Adjust a distribution count, dropping keys that reach zero"""
+    value = counts.get(key, 0) + delta
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+class CustomerAggregates:
+    """Running counts and sums over the customer set, maintained incrementally on writes"""
+
+    def __init__(self):
+        self.total = 0
+        self.with_loans = 0
+        self.credit_score_sum = 0
+        self.balance_sum = 0.0
+        self.loan_amount_sum = 0.0
+        self.monthly_payment_sum = 0.0
+        self.loan_types: Dict[str, int] = {}
+        self.account_types: Dict[str, int] = {}
+        self.account_statuses: Dict[str, int] = {}
+        self.risk_levels: Dict[str, int] = {}
+
+    def copy(self) -> 'CustomerAggregates':
+        """Independent copy for the next data version"""
+        clone = CustomerAggregates()
+        clone.__dict__.update(self.__dict__)
+        for name in ('loan_types', 'account_types', 'account_statuses', 'risk_levels'):
+            setattr(clone, name, dict(getattr(self, name)))
+        return clone
+
+    def build(self, customers: List[Dict]):
+        """Recompute all aggregates from scratch"""
+        self.__init__()
+        for customer in customers:
+            self.add(customer)
+
+    def add(self, customer: Dict):
+        """Fold a customer into the aggregates"""
+        self._apply(customer, 1)
+
+    def remove(self, customer: Dict):
+        """Take a customer back out of the aggregates"""
+        self._apply(customer, -1)
+
+    def _apply(self, customer: Dict, sign: int):
+        self.total += sign
+        self.credit_score_sum += sign * customer['credit_score']
+        self.balance_sum += sign * customer['balance']
+        _bump(self.account_types, customer['account_type'], sign)
+        _bump(self.account_statuses, customer['account_status'], sign)
+        _bump(self.risk_levels, customer['risk_level'], sign)
+
+        if customer['has_loans'] == 'yes':
+            self.with_loans += sign
+            self.loan_amount_sum += sign * customer['loan_amounts']
+            self.monthly_payment_sum += sign * customer['monthly_payments']
+            if customer['loan_types'] != 'none':
+                _bump(self.loan_types, customer['loan_types'], sign)
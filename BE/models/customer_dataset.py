@@ -0,0 +1,135 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Union
+
+from models.customer import Customer
+from models.customer_aggregates import CustomerAggregates, AGGREGATE_FIELDS
+from models.customer_query import CustomerQueryIndex, QUERY_FIELDS, SENSITIVE_FIELDS
+from models.customer_snapshot import SnapshotCustomers
+from models.persistent import ChunkedList, ShardedDict
+from models.search_index import CustomerSearchIndex, SEARCH_FIELDS
+from models.suggest_index import CustomerSuggestIndex, SUGGEST_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Customer fields each index reads; an index is only copied when a change touches one of them
+INDEXED_FIELDS = {
+    'search_index': frozenset(SEARCH_FIELDS),
+    'suggest_index': frozenset(SUGGEST_FIELDS),
+    'query_index': QUERY_FIELDS
+}
+
+
+class CustomerDataset:
+    """One published version of the customer list and every index over it.
+
+    A dataset is never written once BankingAssistant publishes it. Writers
+    derive the next version and swap the reference in one assignment, so a
+    reader that takes the current dataset once sees a single consistent
+    version for as long as it holds it, without taking a lock.
+
+    The customer list, the key -> doc id maps and the indexes are chunked or
+    sharded, so the next version copies only the chunks and shards a change
+    lands in and shares the rest with this one.
+    """
+
+    def __init__(self, customers: Union[ChunkedList, SnapshotCustomers], customer_ids: ShardedDict, usernames: ShardedDict,
+                 search_index: CustomerSearchIndex, suggest_index: CustomerSuggestIndex,
+                 query_index: CustomerQueryIndex, aggregates: CustomerAggregates, version: int = 1):
+        self.customers = customers
+        self.customer_ids = customer_ids
+        self.usernames = usernames
+        self.search_index = search_index
+        self.suggest_index = suggest_index
+        self.query_index = query_index
+        self.aggregates = aggregates
+        # Bumped on every change a derived result could see, so those results can be cached per version
+        self.version = version
+
+    @classmethod
+    def build(cls, customers: Sequence[Customer], sort_orders: Optional[Dict[str, List[int]]] = None,
+              version: int = 1) -> 'CustomerDataset':
+        """Build every index from scratch; customers read lazily from a snapshot are kept that way"""
+        search_index = CustomerSearchIndex()
+        search_index.build(customers)
+        suggest_index = CustomerSuggestIndex()
+        suggest_index.build(customers)
+        query_index = CustomerQueryIndex()
+        query_index.build(customers, sort_orders)
+        aggregates = CustomerAggregates()
+        aggregates.build(customers)
+        return cls(
+            customers if isinstance(customers, SnapshotCustomers) else ChunkedList(customers),
+            ShardedDict({c['customer_id']: doc_id for doc_id, c in enumerate(customers)}),
+            ShardedDict({c['username']: doc_id for doc_id, c in enumerate(customers)}),
+            search_index,
+            suggest_index,
+            query_index,
+            aggregates,
+            version
+        )
+
+    def derive(self, changed: Optional[Dict[int, Customer]] = None,
+               added: Optional[List[Customer]] = None) -> 'CustomerDataset':
+        """The next version, with some records replaced (by doc id) and new ones appended.
+
+        Only the changed rows are re-indexed, and only in copies of the indexes
+        that read a changed field; every other structure is shared with this version.
+        """
+        added = added or []
+        changes = {doc_id: (customer, customer.changed_fields(self.customers[doc_id]))
+                   for doc_id, customer in (changed or {}).items()}
+        changes = {doc_id: change for doc_id, change in changes.items() if change[1]}
+        changed_fields = set().union(*(fields for _, fields in changes.values()))
+        if not changes and not added:
+            return self
+
+        customers = self.customers.copy()
+        for doc_id, (customer, _) in changes.items():
+            customers[doc_id] = customer
+        first_added = len(customers)
+        customers.extend(added)
+
+        indexes = {}
+        for name, fields in INDEXED_FIELDS.items():
+            index = getattr(self, name)
+            if added or not changed_fields.isdisjoint(fields):
+                index = index.copy()
+                # One batch per index, so sorted structures merge the whole change set in a single pass
+                batch = {doc_id: customer for doc_id, (customer, doc_fields) in changes.items()
+                         if not doc_fields.isdisjoint(fields)}
+                batch.update((doc_id, customers[doc_id]) for doc_id in range(first_added, len(customers)))
+                index.update_many(batch)
+            indexes[name] = index
+
+        aggregates = self.aggregates
+        if added or not changed_fields.isdisjoint(AGGREGATE_FIELDS):
+            aggregates = aggregates.copy()
+            for doc_id, (customer, _) in changes.items():
+                aggregates.remove(self.customers[doc_id])
+                aggregates.add(customer)
+            for customer in added:
+                aggregates.add(customer)
+
+        customer_ids = self._derive_lookup(self.customer_ids, 'customer_id', changes, customers, first_added)
+        usernames = self._derive_lookup(self.usernames, 'username', changes, customers, first_added)
+
+        # Credentials feed no index, aggregate or cached result, so changing only those keeps the version
+        version = self.version + 1 if added or changed_fields.difference(SENSITIVE_FIELDS) else self.version
+        return CustomerDataset(customers, customer_ids, usernames, indexes['search_index'],
+                               indexes['suggest_index'], indexes['query_index'], aggregates, version)
+
+    def _derive_lookup(self, lookup: ShardedDict, field: str, changes: Dict, customers: ChunkedList,
+                       first_added: int) -> ShardedDict:
+        """Copy a key -> doc id map only if a key was renamed or rows were added"""
+        renamed = [doc_id for doc_id, (_, fields) in changes.items() if field in fields]
+        if not renamed and first_added == len(customers):
+            return lookup
+        lookup = lookup.copy()
+        for doc_id in renamed:
+            old_key = self.customers[doc_id][field]
+            if lookup.get(old_key) == doc_id:
+                del lookup[old_key]
+            lookup[customers[doc_id][field]] = doc_id
+        for doc_id in range(first_added, len(customers)):
+            lookup[customers[doc_id][field]] = doc_id
+        return lookup
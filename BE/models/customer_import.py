@@ -0,0 +1,165 @@
+import csv
+import logging
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from models.customer import Customer
+from utils.password_service import PasswordServiceBusy, identify_scheme
+
+logger = logging.getLogger(__name__)
+
+# Columns every imported row has to provide
+REQUIRED_FIELDS = (
+    'customer_id',
+    'first_name',
+    'last_name',
+    'email',
+    'username',
+    'password_hash',
+    'account_type',
+    'account_status',
+    'balance',
+    'credit_score',
+    'risk_level',
+    'has_loans'
+)
+
+# Optional numeric columns and the value used when they are left blank
+NUMERIC_DEFAULTS = {
+    'loan_amounts': '0.00',
+    'monthly_payments': '0.00'
+}
+
+# Per-row errors listed in a report; anything beyond is only counted
+MAX_REPORTED_ERRORS = 1000
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class CustomerImporter:
+    """Streams customer CSV uploads into the customer store in validated, batched commits.
+
+    A password_hash column holding a plain password is hashed with the password
+    service before its batch is written; values that are already hashes are kept.
+    """
+
+    def __init__(self, banking_assistant, password_service, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.banking_assistant = banking_assistant
+        self.password_service = password_service
+        self.batch_size = batch_size
+
+    def import_csv(self, stream: TextIO, dry_run: bool = False) -> Dict:
+        """Import customers from a CSV text stream, returning a per-row report"""
+        reader = csv.DictReader(stream)
+        missing = [field for field in REQUIRED_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            return {
+                "success": False,
+                "error": f"Missing required columns: {', '.join(missing)}",
+                "imported": 0,
+                "failed": 0,
+                "errors": []
+            }
+
+        fieldnames = self._store_fieldnames()
+        seen_ids = set()
+        seen_usernames = set()
+        batch: List[Tuple[Dict, Dict]] = []
+        report = {"success": True, "imported": 0, "failed": 0, "batches": 0, "errors": [], "dry_run": dry_run}
+
+        # Line 1 is the header
+        for line_number, row in enumerate(reader, start=2):
+            raw, customer, errors = self._validate(row, fieldnames, seen_ids, seen_usernames)
+            if errors:
+                self._record_error(report, line_number, row.get('customer_id'), errors)
+                continue
+            seen_ids.add(customer['customer_id'])
+            seen_usernames.add(customer['username'])
+            batch.append((raw, customer))
+            if len(batch) >= self.batch_size:
+                self._commit(batch, fieldnames, report, dry_run)
+                batch = []
+
+        if batch:
+            self._commit(batch, fieldnames, report, dry_run)
+
+        logger.info(f"Customer import finished: {report['imported']} imported, {report['failed']} failed "
+                    f"in {report['batches']} batches{' (dry run)' if dry_run else ''}")
+        return report
+
+    def _store_fieldnames(self) -> List[str]:
+        """Get the column order of the backing CSV file"""
+        try:
+            with open(self.banking_assistant.csv_file_path, 'r', encoding='utf-8') as file:
+                return next(csv.reader(file))
+        except (FileNotFoundError, StopIteration):
+            return list(REQUIRED_FIELDS) + list(NUMERIC_DEFAULTS)
+
+    def _validate(self, row: Dict, fieldnames: List[str], seen_ids: set,
+                  seen_usernames: set) -> Tuple[Dict, Optional[Dict], List[str]]:
+        """Validate and type-coerce one row, returning (raw row, coerced row, errors)"""
+        errors = []
+        raw = {field: (row.get(field) or '').strip() for field in fieldnames}
+        for field, default in NUMERIC_DEFAULTS.items():
+            if not raw.get(field):
+                raw[field] = default
+
+        for field in REQUIRED_FIELDS:
+            if not raw.get(field):
+                errors.append(f"{field} is required")
+
+        customer_id = raw.get('customer_id')
+        username = raw.get('username')
+        if customer_id and (customer_id in seen_ids or self.banking_assistant.get_customer_by_id(customer_id)):
+            errors.append(f"customer_id {customer_id} already exists")
+        if username and (username in seen_usernames or self.banking_assistant.get_customer_by_username(username)):
+            errors.append(f"username {username} already exists")
+        if raw.get('email') and '@' not in raw['email']:
+            errors.append("email is not a valid address")
+        if raw.get('has_loans') and raw['has_loans'] not in ('yes', 'no'):
+            errors.append("has_loans must be 'yes' or 'no'")
+        if raw.get('has_loans') == 'no' and not raw.get('loan_types'):
+            raw['loan_types'] = 'none'
+
+        customer = None
+        if not errors:
+            try:
+                customer = Customer.from_row(raw)
+            except (ValueError, KeyError) as e:
+                errors.append(f"invalid numeric value: {e}")
+        return raw, customer, errors
+
+    def _commit(self, batch: List[Tuple[Dict, Dict]], fieldnames: List[str], report: Dict, dry_run: bool):
+        """Append a batch to the CSV file in a single write, then add it to the in-memory store"""
+        report['batches'] += 1
+        if dry_run:
+            report['imported'] += len(batch)
+            return
+
+        try:
+            batch = self._hash_passwords(batch)
+            self.banking_assistant.add_customers([customer for _, customer in batch],
+                                                 persist_rows=[raw for raw, _ in batch],
+                                                 fieldnames=fieldnames)
+            report['imported'] += len(batch)
+        except (OSError, PasswordServiceBusy) as e:
+            logger.error(f"Error committing import batch {report['batches']}: {e}")
+            for raw, _ in batch:
+                self._record_error(report, None, raw.get('customer_id'), [f"batch commit failed: {e}"])
+
+    def _hash_passwords(self, batch: List[Tuple[Dict, Dict]]) -> List[Tuple[Dict, Dict]]:
+        """Replace plain passwords in the password_hash column with hashes, so none is stored as given"""
+        plain = [position for position, (raw, _) in enumerate(batch)
+                 if identify_scheme(raw['password_hash']) == 'plaintext']
+        hashes = self.password_service.hash_many([batch[position][0]['password_hash'] for position in plain])
+        batch = list(batch)
+        for position, password_hash in zip(plain, hashes):
+            raw, customer = batch[position]
+            batch[position] = ({**raw, 'password_hash': password_hash},
+                               customer.replace({'password_hash': password_hash}))
+        return batch
+
+    def _record_error(self, report: Dict, line_number: Optional[int], customer_id: Optional[str], errors: List[str]):
+        """Count a failed row and list it in the report while under the cap"""
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({"line": line_number, "customer_id": customer_id, "errors": errors})
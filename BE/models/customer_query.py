@@ -0,0 +1,283 @@
+import json
+import base64
+import logging
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+
+from models.persistent import ChunkedList, SortedChunkedList, shard_if_large
+
+logger = logging.getLogger(__name__)
+
+# Fields that never leave the server through list/export endpoints
+SENSITIVE_FIELDS = (
+    'password_hash',
+    'security_question',
+    'security_answer',
+    'reset_token',
+    'reset_token_expiry'
+)
+
+# Query parameter name -> customer field, each backed by an equality index
+FILTER_FIELDS = {
+    'status': 'account_status',
+    'risk': 'risk_level',
+    'account_type': 'account_type',
+    'loan_type': 'loan_types'
+}
+
+# Sort keys, each backed by a sorted (value, doc_id) index
+SORT_FIELDS = (
+    'customer_id',
+    'last_name',
+    'balance',
+    'credit_score',
+    'loan_amounts',
+    'account_opened_date'
+)
+
+# JSON types a cursor value can have for each sort key, matching the indexed values
+SORT_VALUE_TYPES = {
+    'customer_id': (str,),
+    'last_name': (str,),
+    'balance': (int, float),
+    'credit_score': (int, float),
+    'loan_amounts': (int, float),
+    'account_opened_date': (str,)
+}
+
+# Every customer field the query index reads
+QUERY_FIELDS = frozenset(FILTER_FIELDS.values()) | frozenset(SORT_FIELDS)
+
+DEFAULT_SORT = 'customer_id'
+
+# Below this fraction of the table, filtered rows are sorted directly instead of scanning the sort index
+SELECTIVE_FILTER_RATIO = 0.125
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(sort: str, value: Any, doc_id: int) -> str:
+    """Encode the sort position of the last returned row as an opaque cursor"""
+    raw = json.dumps([sort, value, doc_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """Decode a cursor produced by encode_cursor for the given sort key"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, value, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        doc_id = int(doc_id)
+    except (ValueError, TypeError, OverflowError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+    if cursor_sort != sort:
+        raise InvalidCursorError(f"Cursor was issued for sort key '{cursor_sort}', not '{sort}'")
+    # The value is compared with indexed values, so it has to be of the sort key's type (bool is not a number here)
+    if isinstance(value, bool) or not isinstance(value, SORT_VALUE_TYPES.get(sort, object)):
+        raise InvalidCursorError(f"Invalid cursor value for sort key '{sort}'")
+    return value, doc_id
+
+
+def project(customer: Dict, fields: Optional[List[str]] = None) -> Dict:
+    """Project a customer row onto the requested fields, never including sensitive ones"""
+    if fields is None:
+        return {k: v for k, v in customer.items() if k not in SENSITIVE_FIELDS}
+    return {k: customer[k] for k in fields if k in customer and k not in SENSITIVE_FIELDS}
+
+
+class CustomerQueryIndex:
+    """Secondary equality and sort indexes for filtered, cursor-paginated customer listings"""
+
+    def __init__(self):
+        # Buckets past SHARD_THRESHOLD are ShardedSets, so adding one doc copies a shard rather than the bucket
+        self.equality: Dict[str, Dict[Any, set]] = {field: {} for field in FILTER_FIELDS.values()}
+        self.sorted_keys: Dict[str, SortedChunkedList] = {field: SortedChunkedList() for field in SORT_FIELDS}
+        # doc id -> indexed values; None for a doc id not (or no longer) indexed
+        self.doc_values: ChunkedList = ChunkedList()
+        self.doc_count = 0
+        # (field, value) buckets this index may write; None when it owns them all
+        self._owned_buckets: Optional[set] = None
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def copy(self) -> 'CustomerQueryIndex':
+        """Copy for the next data version; buckets, sort key chunks and doc values stay shared until written.
+
+        The source must not be written again once copied.
+        """
+        clone = CustomerQueryIndex()
+        clone.equality = {field: dict(buckets) for field, buckets in self.equality.items()}
+        clone.sorted_keys = {field: keys.copy() for field, keys in self.sorted_keys.items()}
+        clone.doc_values = self.doc_values.copy()
+        clone.doc_count = self.doc_count
+        clone._owned_buckets = set()
+        return clone
+
+    def build(self, customers: List[Dict], sort_orders: Optional[Dict[str, List[int]]] = None):
+        """Rebuild all indexes from a list of customers (doc id = list position).
+
+        sort_orders, when given, holds each sort key's doc ids already in (value, doc_id)
+        order, as stored in the customer snapshot, so no sorting is needed.
+        """
+        self.__init__()
+        doc_values = []
+        for doc_id, customer in enumerate(customers):
+            doc_values.append(self._add_equality(doc_id, customer))
+        self.doc_values = ChunkedList(doc_values)
+        self.doc_count = len(doc_values)
+        for buckets in self.equality.values():
+            for value, bucket in buckets.items():
+                buckets[value] = shard_if_large(bucket)
+        for field in SORT_FIELDS:
+            if sort_orders and field in sort_orders:
+                keys = [(doc_values[doc_id][field], doc_id) for doc_id in sort_orders[field]]
+                self.sorted_keys[field] = SortedChunkedList(keys, presorted=True)
+            else:
+                self.sorted_keys[field] = SortedChunkedList((values[field], doc_id) for doc_id, values in enumerate(doc_values))
+        logger.info(f"Built customer query indexes for {self.doc_count} customers")
+
+    def add(self, doc_id: int, customer: Dict):
+        """Index a new or changed customer"""
+        self.update_many({doc_id: customer})
+
+    def update(self, doc_id: int, customer: Dict):
+        """Re-index a customer after its fields changed"""
+        self.update_many({doc_id: customer})
+
+    def update_many(self, customers: Dict[int, Dict]):
+        """Index a batch of new or changed customers (new doc ids in ascending order).
+
+        Each sort index takes the whole batch in one sorted merge rather than an insert per customer.
+        """
+        added = {field: [] for field in SORT_FIELDS}
+        removed = {field: [] for field in SORT_FIELDS}
+        for doc_id, customer in customers.items():
+            old_values = self._remove_equality(doc_id)
+            if old_values is not None:
+                for field in SORT_FIELDS:
+                    removed[field].append((old_values[field], doc_id))
+            values = self._add_equality(doc_id, customer)
+            self._set_values(doc_id, values)
+            for field in SORT_FIELDS:
+                added[field].append((values[field], doc_id))
+        for field in SORT_FIELDS:
+            self.sorted_keys[field].update(added[field], removed[field])
+
+    def remove(self, doc_id: int):
+        """Remove a customer from all indexes"""
+        values = self._remove_equality(doc_id)
+        if values is not None:
+            for field in SORT_FIELDS:
+                self.sorted_keys[field].discard((values[field], doc_id))
+
+    def query(self, filters: Dict[str, str], sort: str = DEFAULT_SORT, descending: bool = False,
+              cursor: Optional[str] = None, limit: int = 20, restrict_to: Optional[set] = None) -> Dict:
+        """Get one page of matching doc ids along with the total count and the next cursor"""
+        candidates, keys, total = self._plan(filters, sort, restrict_to)
+        after = decode_cursor(cursor, sort) if cursor else None
+
+        # One extra row is fetched to know whether another page exists
+        page = list(islice(self._walk(keys, candidates, descending, tuple(after) if after else None), limit + 1))
+        has_more = len(page) > limit
+        page = page[:limit]
+        next_cursor = encode_cursor(sort, *page[-1]) if has_more else None
+        return {
+            "doc_ids": [doc_id for _, doc_id in page],
+            "total": total,
+            "next_cursor": next_cursor
+        }
+
+    def iter_doc_ids(self, filters: Dict[str, str], sort: str = DEFAULT_SORT, descending: bool = False,
+                     restrict_to: Optional[set] = None) -> Iterator[int]:
+        """Every matching doc id in sort order, filtering and sorting once for the whole walk"""
+        candidates, keys, _ = self._plan(filters, sort, restrict_to)
+        return (doc_id for _, doc_id in self._walk(keys, candidates, descending))
+
+    def _plan(self, filters: Dict[str, str], sort: str,
+              restrict_to: Optional[set]) -> Tuple[Optional[set], SortedChunkedList, int]:
+        """Get the candidate set (None for every doc), the sorted keys to walk and the match count"""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unsupported sort key: {sort}")
+
+        candidates = self._filter(filters)
+        if restrict_to is not None:
+            candidates = restrict_to if candidates is None else candidates & restrict_to
+        total = self.doc_count if candidates is None else len(candidates)
+
+        if candidates is not None and len(candidates) < self.doc_count * SELECTIVE_FILTER_RATIO:
+            return None, SortedChunkedList((self.doc_values[doc_id][sort], doc_id) for doc_id in candidates), total
+        return candidates, self.sorted_keys[sort], total
+
+    @staticmethod
+    def _walk(keys: SortedChunkedList, candidates: Optional[set], descending: bool,
+              after: Optional[Tuple[Any, int]] = None) -> Iterator[Tuple[Any, int]]:
+        """Walk (value, doc_id) keys past the `after` position, skipping docs outside candidates"""
+        if descending:
+            walk = keys.iter_before(after)
+        else:
+            walk = keys.iter_from(after, inclusive=False) if after is not None else iter(keys)
+        if candidates is None:
+            return walk
+        return (key for key in walk if key[1] in candidates)
+
+    def _filter(self, filters: Dict[str, str]) -> Optional[set]:
+        """Intersect equality-index buckets, smallest first; None means no filter applied"""
+        buckets = []
+        for param, value in filters.items():
+            field = FILTER_FIELDS[param]
+            buckets.append(self.equality[field].get(value, set()))
+        if not buckets:
+            return None
+        buckets.sort(key=len)
+        result = set(buckets[0])
+        for bucket in buckets[1:]:
+            # Buckets may be ShardedSets, so probe them rather than use set operators
+            result = {doc_id for doc_id in result if doc_id in bucket}
+            if not result:
+                break
+        return result
+
+    def _add_equality(self, doc_id: int, customer: Dict) -> Dict[str, Any]:
+        """Add a customer to its equality-index buckets; returns its indexed values"""
+        values = {field: customer.get(field) for field in SORT_FIELDS}
+        for field in FILTER_FIELDS.values():
+            values[field] = customer.get(field)
+            self._writable_bucket(field, values[field]).add(doc_id)
+        return values
+
+    def _remove_equality(self, doc_id: int) -> Optional[Dict[str, Any]]:
+        """Take a customer out of its equality-index buckets; returns its old indexed values, if it was indexed"""
+        values = self.doc_values[doc_id] if doc_id < len(self.doc_values) else None
+        if values is None:
+            return None
+        self.doc_values[doc_id] = None
+        self.doc_count -= 1
+        for field in FILTER_FIELDS.values():
+            if values[field] in self.equality[field]:
+                bucket = self._writable_bucket(field, values[field])
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self.equality[field][values[field]]
+        return values
+
+    def _set_values(self, doc_id: int, values: Dict[str, Any]):
+        """Record a doc's indexed values; new doc ids come next in order"""
+        if doc_id < len(self.doc_values):
+            self.doc_values[doc_id] = values
+        else:
+            self.doc_values.append(values)
+        self.doc_count += 1
+
+    def _writable_bucket(self, field: str, value: Any):
+        """An equality bucket, created or copied (and sharded once large) as needed so it is safe to write"""
+        buckets = self.equality[field]
+        bucket = buckets.get(value)
+        if bucket is not None and (self._owned_buckets is None or (field, value) in self._owned_buckets):
+            return bucket
+        bucket = buckets[value] = shard_if_large(bucket.copy()) if bucket is not None else set()
+        if self._owned_buckets is not None:
+            self._owned_buckets.add((field, value))
+        return bucket
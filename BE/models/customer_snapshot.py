@@ -0,0 +1,338 @@
+import os
+import csv
+import mmap
+import json
+import struct
+import hashlib
+import logging
+import tempfile
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from models.customer import CUSTOMER_FIELDS, Customer
+from models.customer_query import SORT_FIELDS
+from models.persistent import CHUNK_SIZE, ChunkedList, ShardedDict
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b'BCSNAP01'
+SNAPSHOT_VERSION = 1
+
+# magic, version, source size, source mtime_ns, source sha256, table of contents length
+HEADER = struct.Struct('<8sIQq32sI')
+# Offset of source mtime_ns, patched in place when only the CSV's mtime moved
+MTIME_OFFSET = 8 + 4 + 8
+
+# Typed columns, stored fixed-width; every other column is an id into the string heap
+NUMERIC_COLUMNS = {
+    'balance': '<f8',
+    'credit_score': '<i8',
+    'loan_amounts': '<f8',
+    'monthly_payments': '<f8'
+}
+STRING_IDS = '<u4'
+ALIGNMENT = 8
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt or cannot represent the source"""
+
+
+def snapshot_path_for(csv_file_path: str) -> str:
+    """Default snapshot location: next to the CSV it was compiled from"""
+    return f"{csv_file_path}.snap"
+
+
+def _file_sha256(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def _sort_orders(customers: List[Dict]) -> Dict[str, List[int]]:
+    """Doc ids in (value, doc_id) order for every sort key of the query index"""
+    doc_ids = range(len(customers))
+    return {field: sorted(doc_ids, key=lambda doc_id: customers[doc_id][field]) for field in SORT_FIELDS}
+
+
+def compile_snapshot(csv_file_path: str, snapshot_path: str) -> Tuple[List[Customer], Dict[str, List[int]]]:
+    """Parse the CSV once, write its snapshot atomically and return the rows and sort orders"""
+    stat = os.stat(csv_file_path)
+    source_hash = _file_sha256(csv_file_path)
+    with open(csv_file_path, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        # Customer only has slots for the known columns, so anything else isn't stored either
+        columns = [name for name in reader.fieldnames or [] if name in CUSTOMER_FIELDS]
+        customers = []
+        for row in reader:
+            if None in row or None in row.values():
+                raise SnapshotError("Ragged CSV rows cannot be snapshotted")
+            customers.append(Customer.from_row(row))
+    orders = _sort_orders(customers)
+
+    # String heap: every distinct value once, NUL-separated so loading is a single split()
+    string_ids: Dict[str, int] = {}
+    sections: List[Tuple[str, bytes]] = []
+    toc = {"rows": len(customers), "columns": []}
+    for name in columns:
+        if name in NUMERIC_COLUMNS:
+            data = np.array([c[name] for c in customers], dtype=NUMERIC_COLUMNS[name]).tobytes()
+            toc["columns"].append({"name": name, "dtype": NUMERIC_COLUMNS[name]})
+        else:
+            ids = [string_ids.setdefault(c[name], len(string_ids)) for c in customers]
+            data = np.array(ids, dtype=STRING_IDS).tobytes()
+            toc["columns"].append({"name": name, "dtype": STRING_IDS, "strings": True})
+        sections.append((name, data))
+    if any('\x00' in value for value in string_ids):
+        raise SnapshotError("NUL characters cannot be stored in the string heap")
+    heap = '\x00'.join(string_ids).encode('utf-8')
+    for field, order in orders.items():
+        sections.append((f"order:{field}", np.array(order, dtype=STRING_IDS).tobytes()))
+    sections.append(("heap", heap))
+
+    # Lay the sections out after the header, each 8-byte aligned
+    layout = {}
+    toc_bytes = b''
+    toc_length = -1
+    while len(toc_bytes) != toc_length:
+        # The table of contents holds the offsets, so lay out again until its own length settles
+        toc_length = len(toc_bytes)
+        offset = HEADER.size + toc_length
+        for name, data in sections:
+            offset += -offset % ALIGNMENT
+            layout[name] = [offset, len(data)]
+            offset += len(data)
+        toc["sections"] = layout
+        toc["strings"] = len(string_ids)
+        toc_bytes = json.dumps(toc, separators=(',', ':')).encode('utf-8')
+        toc_bytes += b' ' * (-(HEADER.size + len(toc_bytes)) % ALIGNMENT)
+
+    header = HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, stat.st_size, stat.st_mtime_ns, source_hash, len(toc_bytes))
+    try:
+        _write_atomically(snapshot_path, header + toc_bytes, sections, layout)
+        logger.info(f"Compiled customer snapshot with {len(customers)} rows and {len(string_ids)} strings")
+    except OSError as e:
+        # A read-only data directory only costs the next start another CSV parse
+        logger.warning(f"Could not write customer snapshot {snapshot_path}: {e}")
+    return customers, orders
+
+
+def _write_atomically(snapshot_path: str, head: bytes, sections: List[Tuple[str, bytes]], layout: Dict):
+    """Write to a temp file in the same directory and rename it over the snapshot"""
+    directory = os.path.dirname(os.path.abspath(snapshot_path))
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(head)
+            for name, data in sections:
+                file.write(b'\x00' * (layout[name][0] - file.tell()))
+                file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, snapshot_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class CustomerSnapshot:
+    """Read-only, memory-mapped view of a compiled customer snapshot.
+
+    Numeric columns, string ids and sort orders are numpy views straight onto
+    the mapping, so opening costs nothing beyond the header and the pages are
+    shared by every process that maps the same file.
+    """
+
+    def __init__(self, snapshot_path: str):
+        self.path = snapshot_path
+        with open(snapshot_path, 'rb') as file:
+            try:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise SnapshotError(f"Empty snapshot {snapshot_path}") from e
+        try:
+            magic, version, self.source_size, self.source_mtime_ns, self.source_sha256, toc_length = \
+                HEADER.unpack_from(self._mmap, 0)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise SnapshotError(f"{snapshot_path} is not a version {SNAPSHOT_VERSION} customer snapshot")
+            self.toc = json.loads(self._mmap[HEADER.size:HEADER.size + toc_length])
+        except SnapshotError:
+            self.close()
+            raise
+        except (struct.error, ValueError) as e:
+            self.close()
+            raise SnapshotError(f"Corrupt snapshot {snapshot_path}: {e}") from e
+        self.row_count = self.toc['rows']
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            # numpy views still reference the mapping; it is unmapped once they are collected
+            pass
+
+    def matches(self, csv_file_path: str) -> bool:
+        """Whether the snapshot was compiled from the CSV as it is now (mtime and size, else content hash)"""
+        stat = os.stat(csv_file_path)
+        if stat.st_size != self.source_size:
+            return False
+        if stat.st_mtime_ns == self.source_mtime_ns:
+            return True
+        return _file_sha256(csv_file_path) == self.source_sha256
+
+    def _section(self, name: str, dtype: str) -> np.ndarray:
+        offset, length = self.toc['sections'][name]
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+
+    def column(self, name: str) -> np.ndarray:
+        """Fixed-width column values, or string heap ids for text columns"""
+        spec = next(column for column in self.toc['columns'] if column['name'] == name)
+        return self._section(name, spec['dtype'])
+
+    def sort_order(self, field: str) -> np.ndarray:
+        """Prebuilt (value, doc_id) order of a query index sort key"""
+        return self._section(f"order:{field}", STRING_IDS)
+
+    def strings(self) -> List[str]:
+        """Decode the string heap; each distinct value becomes one shared str object"""
+        offset, length = self.toc['sections']['heap']
+        if not self.toc['strings']:
+            return []
+        return self._mmap[offset:offset + length].decode('utf-8').split('\x00')
+
+    def rows(self) -> List[Customer]:
+        """Materialize Customer records equal to a coerced DictReader load"""
+        return list(SnapshotCustomers(self))
+
+
+class SnapshotCustomers(Sequence):
+    """The customers of a snapshot, built from its column views when read rather than held in memory.
+
+    A record is made each time it is read (by block when iterating), so only
+    the string heap and the mapped columns stay resident. Rows replaced or
+    appended by later data versions are held as records. Like ChunkedList,
+    copy() shares everything, and the source of a copy must not be written again.
+    """
+
+    __slots__ = ('_snapshot', '_names', '_columns', '_strings', '_table', '_positional', '_base',
+                 '_replaced', '_appended')
+
+    def __init__(self, snapshot: CustomerSnapshot):
+        # The views below keep the mapping alive; the snapshot is kept for its path and header
+        self._snapshot = snapshot
+        self._strings = snapshot.strings()
+        self._table = np.array(self._strings, dtype=object)
+        self._names = tuple(spec['name'] for spec in snapshot.toc['columns'])
+        self._columns = [(snapshot.column(spec['name']), bool(spec.get('strings'))) for spec in snapshot.toc['columns']]
+        # Heap strings are already one object per distinct value, so records can be built positionally
+        self._positional = self._names == CUSTOMER_FIELDS
+        self._base = snapshot.row_count
+        self._replaced = ShardedDict()
+        self._appended = ChunkedList()
+
+    def copy(self) -> 'SnapshotCustomers':
+        clone = SnapshotCustomers.__new__(SnapshotCustomers)
+        for name in SnapshotCustomers.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone._replaced = self._replaced.copy()
+        clone._appended = self._appended.copy()
+        return clone
+
+    def __len__(self) -> int:
+        return self._base + len(self._appended)
+
+    def __iter__(self) -> Iterator[Customer]:
+        replaced = self._replaced
+        for start in range(0, self._base, CHUNK_SIZE):
+            for doc_id, record in enumerate(self._block(start, min(start + CHUNK_SIZE, self._base)), start):
+                yield replaced.get(doc_id, record) if replaced else record
+        yield from self._appended
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SnapshotCustomers index out of range")
+        if index >= self._base:
+            return self._appended[index - self._base]
+        record = self._replaced.get(index)
+        if record is not None:
+            return record
+        strings = self._strings
+        values = [strings[column.item(index)] if is_string else column.item(index)
+                  for column, is_string in self._columns]
+        return self._make(values)
+
+    def __setitem__(self, index: int, customer: Customer):
+        if not 0 <= index < len(self):
+            raise IndexError("SnapshotCustomers assignment index out of range")
+        if index >= self._base:
+            self._appended[index - self._base] = customer
+        else:
+            self._replaced[index] = customer
+
+    def append(self, customer: Customer):
+        self._appended.append(customer)
+
+    def extend(self, customers: Iterable[Customer]):
+        self._appended.extend(customers)
+
+    def _block(self, start: int, stop: int) -> List[Customer]:
+        """Records for a run of rows, converted a column at a time"""
+        values = [self._table[column[start:stop]].tolist() if is_string else column[start:stop].tolist()
+                  for column, is_string in self._columns]
+        if self._positional:
+            return [Customer(*row) for row in zip(*values)]
+        return [Customer.from_row(dict(zip(self._names, row))) for row in zip(*values)]
+
+    def _make(self, values: List) -> Customer:
+        if self._positional:
+            return Customer(*values)
+        return Customer.from_row(dict(zip(self._names, values)))
+
+
+def load_customers(csv_file_path: str, snapshot_path: Optional[str] = None) -> Tuple[Sequence, Dict[str, List[int]]]:
+    """Load customers through the snapshot, recompiling it when the CSV has changed.
+
+    Returns the customers, read lazily from the snapshot (SnapshotCustomers), and the
+    prebuilt sort orders for the query index. Right after a compile whose snapshot
+    could not be written, the customers are the parsed records instead.
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(csv_file_path)
+    try:
+        snapshot = CustomerSnapshot(snapshot_path)
+    except (OSError, SnapshotError) as e:
+        logger.info(f"No usable customer snapshot ({e}), compiling one")
+    else:
+        try:
+            if snapshot.matches(csv_file_path):
+                if os.stat(csv_file_path).st_mtime_ns != snapshot.source_mtime_ns:
+                    # Same content under a new mtime: remember it so the hash isn't recomputed next start
+                    with open(snapshot_path, 'r+b') as file:
+                        file.seek(MTIME_OFFSET)
+                        file.write(struct.pack('<q', os.stat(csv_file_path).st_mtime_ns))
+                orders = {field: snapshot.sort_order(field).tolist() for field in SORT_FIELDS}
+                return SnapshotCustomers(snapshot), orders
+        except BaseException:
+            snapshot.close()
+            raise
+        logger.info("Customer CSV changed since the snapshot was compiled, recompiling")
+        snapshot.close()
+    customers, orders = compile_snapshot(csv_file_path, snapshot_path)
+    # Read back through the new snapshot so the parsed records need not stay resident
+    try:
+        snapshot = CustomerSnapshot(snapshot_path)
+    except (OSError, SnapshotError):
+        return customers, orders
+    if not snapshot.matches(csv_file_path):
+        # The snapshot could not be written (or the CSV moved on meanwhile)
+        snapshot.close()
+        return customers, orders
+    return SnapshotCustomers(snapshot), orders
@@ -0,0 +1,169 @@
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Column order of an amortization schedule
+SCHEDULE_COLUMNS = ('period', 'payment', 'principal', 'interest', 'extra', 'balance')
+
+# Balances below half a cent count as paid off
+PAID_OFF_TOLERANCE = 0.005
+
+# Distinct (rate, term) pairs whose annuity factors are kept
+ANNUITY_CACHE_SIZE = 4096
+
+CENT = Decimal('0.01')
+
+# Scaled values this close to a half cent are re-rounded through Decimal
+TIE_TOLERANCE = 1e-6
+
+
+def payment_count(years: float) -> int:
+    """Number of monthly payments in a term given in years"""
+    return int(round(years * 12))
+
+
+@lru_cache(maxsize=ANNUITY_CACHE_SIZE)
+def annuity_factor(annual_rate: float, num_payments: int) -> float:
+    """Payment per unit of principal for a fixed-rate, fully amortizing loan.
+
+    Calculator sliders revisit the same few (rate, term) pairs while only the
+    principal changes, so the (1 + r)^n power is computed once per pair.
+    """
+    monthly_rate = annual_rate / 12 / 100
+    if monthly_rate == 0:
+        return 1 / num_payments
+    growth = (1 + monthly_rate) ** num_payments
+    return monthly_rate * growth / (growth - 1)
+
+
+def round_money(value: float) -> float:
+    """Round to cents, half up, as the amount reads in decimal (2.675 -> 2.68)"""
+    return float(Decimal(repr(float(value))).quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def round_money_array(values: np.ndarray) -> np.ndarray:
+    """Vectorized round_money; only values sitting on a half cent go through Decimal"""
+    values = np.asarray(values, dtype=float)
+    scaled = np.abs(values) * 100
+    # Adding 0.0 turns -0.0 into 0.0
+    rounded = np.copysign(np.floor(scaled + 0.5), values) / 100 + 0.0
+    ties = np.abs(scaled % 1 - 0.5) < TIE_TOLERANCE
+    if ties.any():
+        rounded[ties] = [round_money(value) for value in values[ties]]
+    return rounded
+
+
+def monthly_payment(principal: float, annual_rate: float, years: float) -> float:
+    """Standard annuity payment for a fixed-rate, fully amortizing loan (unrounded)"""
+    return principal * annuity_factor(float(annual_rate), payment_count(years))
+
+
+def loan_summary(principal: float, annual_rate: float, years: float) -> Dict:
+    """Payment, total paid and total interest of a loan, in exact cents"""
+    num_payments = payment_count(years)
+    payment = Decimal(repr(round_money(monthly_payment(principal, annual_rate, years))))
+    total_payment = payment * num_payments
+    return {
+        "principal": principal,
+        "annual_rate": annual_rate,
+        "years": years,
+        "monthly_payment": float(payment),
+        "total_payment": float(total_payment),
+        "total_interest": float((total_payment - Decimal(repr(float(principal)))).quantize(CENT, rounding=ROUND_HALF_UP))
+    }
+
+
+def batch_payments(principals: np.ndarray, annual_rates: np.ndarray, years: np.ndarray) -> Dict[str, np.ndarray]:
+    """Evaluate payments for broadcast-compatible arrays of principals, rates and terms in one pass"""
+    principals = np.asarray(principals, dtype=float)
+    annual_rates = np.asarray(annual_rates, dtype=float)
+    num_payments = np.rint(np.asarray(years, dtype=float) * 12)
+
+    # Look up each distinct (rate, term) pair once through the shared factor cache
+    terms_shape = np.broadcast_shapes(annual_rates.shape, num_payments.shape)
+    pairs = np.stack([np.broadcast_to(annual_rates, terms_shape).ravel(),
+                      np.broadcast_to(num_payments, terms_shape).ravel()], axis=1)
+    distinct, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    factors = np.array([annuity_factor(float(rate), int(count)) for rate, count in distinct])
+    factors = factors[inverse.reshape(-1)].reshape(terms_shape)
+
+    payments = round_money_array(principals * factors)
+    total_payments = round_money_array(payments * num_payments)
+    return {
+        "monthly_payment": payments,
+        "total_payment": total_payments,
+        "total_interest": round_money_array(total_payments - principals)
+    }
+
+
+def amortization_schedule(principal: float, annual_rate: float, years: int,
+                          extra_payment: float = 0.0) -> Dict:
+    """Compute a full amortization table in one vectorized pass.
+
+    With a constant extra payment e on top of the scheduled payment M, the
+    balance after k payments has the closed form
+    B_k = P(1+r)^k - (M+e)((1+r)^k - 1)/r, so every row is computed at once
+    and the table is cut at the first period where the balance reaches zero.
+    M is the payment rounded to cents; the last row absorbs the leftover cents.
+    """
+    monthly_rate = annual_rate / 12 / 100
+    num_payments = payment_count(years)
+    scheduled = round_money(monthly_payment(principal, annual_rate, years))
+    paid = scheduled + extra_payment
+
+    k = np.arange(num_payments + 1, dtype=float)
+    if monthly_rate == 0:
+        balances = principal - paid * k
+    else:
+        growth = (1 + monthly_rate) ** k
+        balances = principal * growth - paid * (growth - 1) / monthly_rate
+
+    # Truncate at payoff; extra payments shorten the loan
+    paid_off = np.nonzero(balances[1:] <= PAID_OFF_TOLERANCE)[0]
+    periods = int(paid_off[0]) + 1 if paid_off.size else num_payments
+    opening = balances[:periods]
+    closing = np.clip(balances[1:periods + 1], 0.0, None)
+    closing[-1] = 0.0
+
+    interest = opening * monthly_rate
+    principal_paid = opening - closing
+    payments = principal_paid + interest
+    extra = np.minimum(extra_payment, np.maximum(payments - scheduled, 0.0))
+
+    return {
+        "columns": {
+            "period": np.arange(1, periods + 1).tolist(),
+            "payment": round_money_array(payments).tolist(),
+            "principal": round_money_array(principal_paid).tolist(),
+            "interest": round_money_array(interest).tolist(),
+            "extra": round_money_array(extra).tolist(),
+            "balance": round_money_array(closing).tolist()
+        },
+        "summary": {
+            "principal": principal,
+            "annual_rate": annual_rate,
+            "years": years,
+            "extra_payment": extra_payment,
+            "monthly_payment": scheduled,
+            "num_payments": periods,
+            "scheduled_payments": num_payments,
+            "total_payment": round_money(payments.sum()),
+            "total_interest": round_money(interest.sum()),
+            "interest_saved": round_money(scheduled * num_payments - principal - interest.sum()) if extra_payment else 0.0
+        }
+    }
+
+
+def schedule_rows(schedule: Dict, limit: Optional[int] = None) -> Iterator[Dict]:
+    """Iterate a columnar schedule as row dicts"""
+    columns = schedule['columns']
+    count = len(columns['period'])
+    if limit is not None:
+        count = min(count, limit)
+    for i in range(count):
+        yield {column: columns[column][i] for column in SCHEDULE_COLUMNS}
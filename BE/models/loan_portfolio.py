@@ -0,0 +1,314 @@
+import logging
+from datetime import date
+from itertools import count
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Customer columns a projection can be segmented by
+SEGMENT_FIELDS = {
+    'loan_type': 'loan_types',
+    'risk_level': 'risk_level'
+}
+
+DEFAULT_PROJECTION_MONTHS = 360
+MAX_PROJECTION_MONTHS = 600
+
+# Upper bound on (rate cohort x month) cells evaluated at once
+MAX_CHUNK_CELLS = 1 << 22
+
+# Rate bands are narrow enough that k * (log g - log g_band) stays within half this spread for every projected month k
+RATE_BAND_SPREAD = 0.5
+
+# Terms of the power series of exp(k * offset) summed per band; the first dropped term is below 1e-19
+RATE_BAND_TERMS = 14
+
+# Balances below half a cent count as paid off
+PAID_OFF_TOLERANCE = 0.005
+
+
+def _compact_codes(codes: np.ndarray, space: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Map codes drawn from range(space) to dense ids, returning (present codes, ids)"""
+    if space <= max(len(codes), 1) * 4:
+        # Small code space: a counting pass instead of a sort
+        present = np.flatnonzero(np.bincount(codes, minlength=space))
+        dense = np.zeros(space, dtype=np.int64)
+        dense[present] = np.arange(len(present))
+        return present, dense[codes]
+    present, ids = np.unique(codes, return_inverse=True)
+    return present, ids.reshape(-1)
+
+
+def _parse_rate(value) -> float:
+    """Read an annual percentage rate, treating blanks and junk as 0"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse_rates(values: List) -> np.ndarray:
+    """Read annual percentage rates in one conversion, parsing one at a time only if some are blank or junk"""
+    try:
+        rates = np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        rates = np.array([_parse_rate(value) for value in values], dtype=float)
+    # None, nan and inf are junk too
+    rates[~np.isfinite(rates)] = 0.0
+    return rates
+
+
+def _categorize(rows: List[Dict], field: str) -> Tuple[List[str], np.ndarray]:
+    """Get the sorted distinct values of a field as labels and each row's label index"""
+    # Code each value by the row it first appears in, then compact those positions
+    first_seen = {}
+    values = map(itemgetter(field), rows)
+    positions = np.fromiter(map(first_seen.setdefault, values, count()), dtype=np.int64, count=len(rows))
+    present, codes = _compact_codes(positions, len(rows))
+    labels = [str(rows[position][field]) for position in present.tolist()]
+    order = sorted(range(len(labels)), key=labels.__getitem__)
+    rank = np.empty(len(labels), dtype=np.int64)
+    rank[order] = np.arange(len(labels))
+    return [labels[code] for code in order], rank[codes]
+
+
+class LoanPortfolio:
+    """Column arrays of every outstanding loan, projected forward with closed-form amortization.
+
+    A loan with balance P, payment M and monthly rate r has balance
+    B_k = A g^k + C + D k after k payments, where g = 1 + r and
+    (A, C, D) = (P - M/r, M/r, 0) for r > 0 or (0, P, -M) for r = 0, until
+    its payoff month n. Loans sharing a segment and a rate form a cohort whose
+    aggregate balance is the same expression over the sums of A, C and D of the
+    loans still open, so the projection costs O(loans + cohorts x months)
+    instead of stepping every loan through every month. Books where nearly
+    every loan has its own rate are grouped into narrow rate bands instead:
+    with g = g_band e^x, sum(A g^k) = g_band^k sum_j k^j/j! sum(A x^j), and a
+    few terms of that series are exact to float precision.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.principal = np.zeros(0)
+        self.payment = np.zeros(0)
+        self.monthly_rate = np.zeros(0)
+        self.codes: Dict[str, np.ndarray] = {}
+        self.labels: Dict[str, List[str]] = {}
+
+    def build(self, customers: List[Dict]):
+        """Collect the outstanding loans of every customer into column arrays"""
+        self.__init__()
+        loans = [c for c in customers if c['has_loans'] == 'yes' and c['loan_amounts'] > 0]
+        self.size = len(loans)
+        self.principal = np.fromiter(map(itemgetter('loan_amounts'), loans), dtype=float, count=self.size)
+        self.payment = np.fromiter(map(itemgetter('monthly_payments'), loans), dtype=float, count=self.size)
+        self.monthly_rate = _parse_rates(list(map(itemgetter('interest_rate'), loans))) / 12 / 100
+        for segment, field in SEGMENT_FIELDS.items():
+            self.labels[segment], self.codes[segment] = _categorize(loans, field)
+        logger.info(f"Built loan portfolio: {self.size} outstanding loans")
+
+    def payoff_months(self) -> np.ndarray:
+        """Number of payments until each loan is repaid, or a huge value if it never amortizes.
+
+        A loan is repaid once its balance is at most PAID_OFF_TOLERANCE, so a payment
+        rounded to the cent does not keep it open another month for a fraction of a cent.
+        """
+        never = np.iinfo(np.int64).max // 4
+        r, principal, payment = self.monthly_rate, self.principal, self.payment
+        with np.errstate(divide='ignore', invalid='ignore'):
+            amortizing = np.where(r > 0, payment > principal * r, payment > 0)
+            # Solve A g^n + C = tolerance for r > 0, P - M n = tolerance for r = 0
+            ratio = np.where(amortizing & (r > 0),
+                             (payment - r * PAID_OFF_TOLERANCE) / (payment - r * principal), 1.0)
+            periods = np.where(r > 0, np.log(ratio) / np.log1p(r), (principal - PAID_OFF_TOLERANCE) / payment)
+        periods = np.where(amortizing, periods, 0)
+        # Tolerate float noise so an exact payoff does not spill into an extra month
+        months = np.ceil(periods - 1e-9).astype(np.int64)
+        return np.where(amortizing, np.maximum(months, 0), never)
+
+    def project(self, months: int = DEFAULT_PROJECTION_MONTHS, group_by: Sequence[str] = ('loan_type', 'risk_level'),
+                start: Optional[date] = None) -> Dict:
+        """Project month-by-month interest, principal, payments and balances per segment"""
+        for segment in group_by:
+            if segment not in SEGMENT_FIELDS:
+                raise ValueError(f"Unknown segment: {segment}")
+        if not 1 <= months <= MAX_PROJECTION_MONTHS:
+            raise ValueError(f"months must be between 1 and {MAX_PROJECTION_MONTHS}")
+
+        segment_codes, segment_keys = self._segments(group_by)
+        # balance[s, k] is the open balance of segment s after k payments, weighted the same balance times r
+        balance = np.zeros((len(segment_keys), months + 1))
+        weighted = np.zeros((len(segment_keys), months + 1))
+        active = np.zeros((len(segment_keys), months + 1), dtype=np.int64)
+        payoff = np.minimum(self.payoff_months(), months + 1)
+
+        cohort_segments, growth_logs, cohort_ids, offsets = self._cohorts(segment_codes, len(segment_keys), months)
+        self._project_cohorts(cohort_segments, growth_logs, cohort_ids, offsets, payoff, months,
+                              balance, weighted, active)
+
+        # Loans paying in month k are those still open after k - 1 payments
+        opening = balance[:, :-1]
+        closing = balance[:, 1:]
+        interest = weighted[:, :-1]
+        principal = opening - closing
+        return {
+            "months": months,
+            "group_by": list(group_by),
+            "periods": self._periods(start or date.today(), months),
+            "segments": [
+                self._series(dict(zip(group_by, key)), opening[s], closing[s], interest[s], principal[s], active[s, :-1])
+                for s, key in enumerate(segment_keys)
+            ],
+            "totals": self._series({}, opening.sum(axis=0), closing.sum(axis=0), interest.sum(axis=0),
+                                   principal.sum(axis=0), active[:, :-1].sum(axis=0)),
+            "summary": {
+                "loans": self.size,
+                "outstanding_principal": round(float(self.principal.sum()), 2),
+                "monthly_payments": round(float(self.payment.sum()), 2),
+                "open_after_horizon": int((payoff > months).sum()),
+                "projected_interest_income": round(float(interest.sum()), 2),
+                "projected_principal_repaid": round(float(principal.sum()), 2),
+                "remaining_balance": round(float(closing[:, -1].sum()), 2)
+            }
+        }
+
+    def _cohorts(self, segment_codes: np.ndarray, segment_count: int,
+                 months: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """Group loans into cohorts by segment and rate, or by segment and rate band when that is cheaper.
+
+        Returns each cohort's segment and log growth, each loan's cohort id, and each
+        loan's log growth offset from its cohort's (None when cohorts share exact rates).
+        Cohort ids are ordered by segment.
+        """
+        # Non-positive rates amortize linearly (A = 0), so their growth never enters a balance
+        rates, rate_ids = np.unique(self.monthly_rate, return_inverse=True)
+        rate_count = len(rates)
+        cohort_keys, cohort_ids = _compact_codes(segment_codes * rate_count + rate_ids.reshape(-1),
+                                                 segment_count * rate_count)
+
+        width = RATE_BAND_SPREAD / (months + 1)
+        growth_log = np.log1p(np.maximum(self.monthly_rate, 0))
+        bands = np.rint(growth_log / width).astype(np.int64)
+        band_count = int(bands.max()) + 1 if self.size else 1
+        band_keys, band_ids = _compact_codes(segment_codes * band_count + bands, segment_count * band_count)
+
+        # Every summed term costs a pass over the loans and one over the cohort x month grid;
+        # exact cohorts sum A, C, D, C r and the count, bands sum the series terms in place of A
+        exact_cost = (self.size + len(cohort_keys) * (months + 2)) * 5
+        band_cost = (self.size + len(band_keys) * (months + 2)) * (RATE_BAND_TERMS + 4)
+        if exact_cost <= band_cost:
+            growth_logs = np.log1p(np.maximum(rates, 0))[cohort_keys % rate_count]
+            return cohort_keys // rate_count, growth_logs, cohort_ids, None
+        return band_keys // band_count, (band_keys % band_count) * width, band_ids, growth_log - bands * width
+
+    def _project_cohorts(self, cohort_segments: np.ndarray, growth_logs: np.ndarray, cohort_ids: np.ndarray,
+                         offsets: Optional[np.ndarray], payoff: np.ndarray, months: int,
+                         balance: np.ndarray, weighted: np.ndarray, active: np.ndarray):
+        """Accumulate segment balances from closed-form cohort balances, a chunk of cohorts at a time"""
+        r = self.monthly_rate
+        positive = r > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.where(positive, self.principal - self.payment / r, 0.0)
+            c = np.where(positive, self.payment / r, self.principal)
+        d = np.where(positive, 0.0, -self.payment)
+        # C r, the interest on the C term, is just the payment
+        c_interest = np.where(positive, self.payment, 0.0)
+        terms = 1 if offsets is None else RATE_BAND_TERMS
+
+        width = months + 2
+        chunk = max(1, MAX_CHUNK_CELLS // (width * terms))
+        if len(cohort_segments) > chunk:
+            order = np.argsort(cohort_ids, kind='stable')
+            bounds = np.searchsorted(cohort_ids[order], np.arange(0, len(cohort_segments) + chunk, chunk))
+        else:
+            order, bounds = slice(None), (None, None)
+        k = np.arange(months + 1, dtype=float)
+        # series[j, k] = k^j / j!, for k in 0..months + 1
+        series = np.ones((terms, months + 2))
+        for j in range(1, terms):
+            series[j] = series[j - 1] * np.arange(months + 2) / j
+
+        for number, first in enumerate(range(0, len(cohort_segments), chunk)):
+            loans = order if isinstance(order, slice) else order[bounds[number]:bounds[number + 1]]
+            logs = growth_logs[first:first + chunk]
+            segments = cohort_segments[first:first + chunk]
+            cohort_count = len(logs)
+
+            # Sum the loan terms by cohort and payoff month; a reverse cumulative sum then gives
+            # the terms of loans still open after k payments (those with payoff > k)
+            cells = (cohort_ids[loans] - first) * width + payoff[loans]
+
+            def open_after(weights):
+                sums = np.bincount(cells, weights=weights, minlength=cohort_count * width).reshape(cohort_count, width)
+                return np.cumsum(sums[:, :0:-1], axis=1)[:, ::-1]
+
+            sum_c, sum_d, sum_interest, sum_n = (open_after(w) for w in (c[loans], d[loans], c_interest[loans], None))
+
+            # sum(A e^(k x)) over the open loans at k and, for the interest, at k + 1
+            now = np.zeros((cohort_count, months + 1))
+            later = np.zeros((cohort_count, months + 1))
+            moment = a[loans]
+            for j in range(terms):
+                sum_moment = open_after(moment)
+                now += sum_moment * series[j, :-1]
+                later += sum_moment * series[j, 1:]
+                if j + 1 < terms:
+                    moment = moment * offsets[loans]
+
+            growth = np.exp(logs[:, None] * k[None, :])
+            cohort_balance = growth * now + sum_c + sum_d * k[None, :]
+            # A g^k (g - 1) = g_band^k ((g_band - 1) later + later - now)
+            cohort_interest = growth * (np.expm1(logs)[:, None] * later + (later - now)) + sum_interest
+            # Paid-off cohorts keep a little float dust in A g^k + C
+            paid_off = sum_n == 0
+            cohort_balance[paid_off] = 0.0
+            cohort_interest[paid_off] = 0.0
+
+            # Cohort ids are ordered by segment, so each segment is a contiguous run of rows
+            starts = np.flatnonzero(np.r_[True, segments[1:] != segments[:-1]])
+            rows = segments[starts]
+            balance[rows] += np.add.reduceat(cohort_balance, starts, axis=0)
+            weighted[rows] += np.add.reduceat(cohort_interest, starts, axis=0)
+            active[rows] += np.add.reduceat(sum_n, starts, axis=0).astype(np.int64)
+
+    def _segments(self, group_by: Sequence[str]) -> Tuple[np.ndarray, List[Tuple[str, ...]]]:
+        """Combine per-field codes into one dense segment code per loan"""
+        codes = np.zeros(self.size, dtype=np.int64)
+        space = 1
+        for segment in group_by:
+            codes = codes * len(self.labels[segment]) + self.codes[segment]
+            space *= len(self.labels[segment])
+        present, codes = _compact_codes(codes, space)
+
+        keys = []
+        for value in present.tolist():
+            key = []
+            for segment in reversed(group_by):
+                value, code = divmod(value, len(self.labels[segment]))
+                key.append(self.labels[segment][code])
+            keys.append(tuple(reversed(key)))
+        return codes, keys
+
+    @staticmethod
+    def _periods(start: date, months: int) -> List[str]:
+        """Label the projected months, starting with the month after start"""
+        index = start.year * 12 + start.month
+        return [f"{(index + m) // 12:04d}-{(index + m) % 12 + 1:02d}" for m in range(months)]
+
+    @staticmethod
+    def _series(key: Dict, opening: np.ndarray, closing: np.ndarray, interest: np.ndarray,
+                principal: np.ndarray, active: np.ndarray) -> Dict:
+        """Format one segment's monthly cash flows"""
+        closing = np.where(np.abs(closing) < PAID_OFF_TOLERANCE, 0.0, closing)
+        return {
+            **key,
+            "opening_balance": np.round(opening, 2).tolist(),
+            "interest": np.round(interest, 2).tolist(),
+            "principal": np.round(principal, 2).tolist(),
+            "payment": np.round(interest + principal, 2).tolist(),
+            "closing_balance": np.round(closing, 2).tolist(),
+            "active_loans": active.tolist()
+        }
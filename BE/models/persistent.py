@@ -0,0 +1,401 @@
+import bisect
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping, MutableSet, Sequence
+from itertools import chain, islice
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+# Items per chunk of a ChunkedList / SortedChunkedList: copying one chunk on write is cheap,
+# and a million items still make a chunk list of only about a thousand entries
+CHUNK_SHIFT = 10
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+
+# Target entries per shard of a ShardedDict / ShardedSet
+SHARD_SIZE = 1024
+# A sharded container re-shards once its average shard grows past this many entries
+MAX_SHARD_FILL = 4 * SHARD_SIZE
+
+# Plain dicts and sets (index postings, equality buckets) larger than this are kept sharded,
+# so copying one for a write costs a shard rather than the whole container
+SHARD_THRESHOLD = 4 * SHARD_SIZE
+
+
+class ChunkedList(Sequence):
+    """List stored in fixed-size chunks, so that copies share them.
+
+    copy() copies only the list of chunks, and each copy copies a chunk the first
+    time it writes to it. As with the indexes built on it, a list must not be
+    written again once it has been copied.
+    """
+
+    __slots__ = ('chunks', '_length', '_owned')
+
+    def __init__(self, items: Iterable = ()):
+        items = items if isinstance(items, list) else list(items)
+        self.chunks: List[List] = [items[start:start + CHUNK_SIZE] for start in range(0, len(items), CHUNK_SIZE)]
+        self._length = len(items)
+        # Chunk positions this list may write; None when it owns them all
+        self._owned: Optional[set] = None
+
+    def copy(self) -> 'ChunkedList':
+        clone = ChunkedList.__new__(ChunkedList)
+        clone.chunks = list(self.chunks)
+        clone._length = self._length
+        clone._owned = set()
+        return clone
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self.chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("ChunkedList index out of range")
+        return self.chunks[index >> CHUNK_SHIFT][index & CHUNK_MASK]
+
+    def __setitem__(self, index: int, value: Any):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("ChunkedList assignment index out of range")
+        self._writable(index >> CHUNK_SHIFT)[index & CHUNK_MASK] = value
+
+    def append(self, value: Any):
+        if not self._length & CHUNK_MASK:
+            self.chunks.append([])
+            if self._owned is not None:
+                self._owned.add(len(self.chunks) - 1)
+        self._writable(len(self.chunks) - 1).append(value)
+        self._length += 1
+
+    def extend(self, values: Iterable):
+        for value in values:
+            self.append(value)
+
+    def _writable(self, position: int) -> List:
+        if self._owned is not None and position not in self._owned:
+            self.chunks[position] = list(self.chunks[position])
+            self._owned.add(position)
+        return self.chunks[position]
+
+
+class SortedChunkedList:
+    """Sorted list of unique items in chunks of about CHUNK_SIZE, so that copies share them.
+
+    A copy copies a chunk the first time it writes to it; update() merges a whole
+    batch in one pass over the chunk list. The source of a copy must not be
+    written again.
+    """
+
+    __slots__ = ('_chunks', '_maxes', '_length', '_owned', '_offsets')
+
+    def __init__(self, items: Iterable = (), presorted: bool = False):
+        items = list(items) if presorted else sorted(items)
+        self._chunks: List[List] = [items[start:start + CHUNK_SIZE] for start in range(0, len(items), CHUNK_SIZE)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._length = len(items)
+        # ids of the chunks this list may write (chunks move as others split or empty); None when it owns them all
+        self._owned: Optional[set] = None
+        # Position of each chunk's first item, computed on first positional read
+        self._offsets: Optional[List[int]] = None
+
+    def copy(self) -> 'SortedChunkedList':
+        clone = SortedChunkedList.__new__(SortedChunkedList)
+        clone._chunks = list(self._chunks)
+        clone._maxes = list(self._maxes)
+        clone._length = self._length
+        clone._owned = set()
+        clone._offsets = self._offsets
+        return clone
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._chunks)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("SortedChunkedList index out of range")
+        if self._offsets is None:
+            offsets, start = [], 0
+            for chunk in self._chunks:
+                offsets.append(start)
+                start += len(chunk)
+            self._offsets = offsets
+        position = bisect.bisect_right(self._offsets, index) - 1
+        return self._chunks[position][index - self._offsets[position]]
+
+    def iter_from(self, item: Any, inclusive: bool = True) -> Iterator:
+        """Ascending iteration over the items >= item (> item when not inclusive)"""
+        find = bisect.bisect_left if inclusive else bisect.bisect_right
+        position = find(self._maxes, item)
+        if position == len(self._maxes):
+            return iter(())
+        chunk = self._chunks[position]
+        return chain(islice(chunk, find(chunk, item), None),
+                     chain.from_iterable(islice(self._chunks, position + 1, None)))
+
+    def iter_before(self, item: Any = None) -> Iterator:
+        """Descending iteration over the items < item (every item when item is None)"""
+        if not self._chunks:
+            return
+        if item is None:
+            position = len(self._chunks) - 1
+            end = len(self._chunks[position])
+        else:
+            position = bisect.bisect_left(self._maxes, item)
+            if position == len(self._maxes):
+                position -= 1
+                end = len(self._chunks[position])
+            else:
+                end = bisect.bisect_left(self._chunks[position], item)
+        yield from reversed(self._chunks[position][:end])
+        for chunk in reversed(self._chunks[:position]):
+            yield from reversed(chunk)
+
+    def add(self, item: Any):
+        if not self._chunks:
+            self._chunks.append(self._own([item]))
+            self._maxes.append(item)
+        else:
+            position = min(bisect.bisect_left(self._maxes, item), len(self._maxes) - 1)
+            chunk = self._writable(position)
+            bisect.insort(chunk, item)
+            self._maxes[position] = chunk[-1]
+            if len(chunk) > 2 * CHUNK_SIZE:
+                half = len(chunk) // 2
+                self._chunks[position:position + 1] = [self._own(chunk[:half]), self._own(chunk[half:])]
+                self._maxes[position:position + 1] = [chunk[half - 1], chunk[-1]]
+        self._length += 1
+        self._offsets = None
+
+    def discard(self, item: Any) -> bool:
+        """Remove an item if present; returns whether it was"""
+        position = bisect.bisect_left(self._maxes, item)
+        if position == len(self._maxes):
+            return False
+        index = bisect.bisect_left(self._chunks[position], item)
+        if index == len(self._chunks[position]) or self._chunks[position][index] != item:
+            return False
+        chunk = self._writable(position)
+        del chunk[index]
+        if chunk:
+            self._maxes[position] = chunk[-1]
+        else:
+            del self._chunks[position]
+            del self._maxes[position]
+        self._length -= 1
+        self._offsets = None
+        return True
+
+    def update(self, added: Iterable = (), removed: Iterable = ()):
+        """Remove and insert a batch of items in a single pass over the chunk list.
+
+        Costs one sort of the batch plus a merge of each chunk it touches, rather
+        than a shift of the whole list per item.
+        """
+        added = sorted(added)
+        removed = set(removed)
+        if not added and not removed:
+            return
+        if not self._chunks:
+            for start in range(0, len(added), CHUNK_SIZE):
+                self._chunks.append(self._own(added[start:start + CHUNK_SIZE]))
+                self._maxes.append(self._chunks[-1][-1])
+            self._length = len(added)
+            self._offsets = None
+            return
+
+        last = len(self._maxes) - 1
+        touched: Dict[int, Tuple[List, set]] = {}
+        for item in added:
+            position = min(bisect.bisect_left(self._maxes, item), last)
+            touched.setdefault(position, ([], set()))[0].append(item)
+        for item in removed:
+            position = bisect.bisect_left(self._maxes, item)
+            if position <= last:
+                touched.setdefault(position, ([], set()))[1].add(item)
+
+        chunks, maxes = [], []
+        for position, chunk in enumerate(self._chunks):
+            change = touched.get(position)
+            if change is None:
+                chunks.append(chunk)
+                maxes.append(self._maxes[position])
+                continue
+            inserts, drops = change
+            kept = [item for item in chunk if item not in drops] if drops else chunk
+            # Both runs are sorted, so this is a linear merge
+            merged = sorted(kept + inserts) if inserts else list(kept)
+            self._length += len(merged) - len(chunk)
+            if not merged:
+                continue
+            pieces = -(-len(merged) // (2 * CHUNK_SIZE)) if len(merged) > 2 * CHUNK_SIZE else 1
+            size = -(-len(merged) // pieces)
+            for start in range(0, len(merged), size):
+                piece = self._own(merged[start:start + size])
+                chunks.append(piece)
+                maxes.append(piece[-1])
+        self._chunks = chunks
+        self._maxes = maxes
+        self._offsets = None
+
+    def _own(self, chunk: List) -> List:
+        if self._owned is not None:
+            self._owned.add(id(chunk))
+        return chunk
+
+    def _writable(self, position: int) -> List:
+        chunk = self._chunks[position]
+        if self._owned is not None and id(chunk) not in self._owned:
+            chunk = self._chunks[position] = self._own(list(chunk))
+        return chunk
+
+
+class _Sharded(ABC):
+    """Shared machinery of ShardedDict and ShardedSet: entries spread over hash-addressed shards.
+
+    copy() copies only the list of shards; each copy copies a shard the first time
+    it writes to it. The source of a copy must not be written again.
+    """
+
+    __slots__ = ('_shards', '_mask', '_length', '_owned')
+
+    _empty = dict
+
+    def _init_shards(self, size: int):
+        count = 1
+        while count * SHARD_SIZE < size:
+            count *= 2
+        self._shards = [self._empty() for _ in range(count)]
+        self._mask = count - 1
+        self._length = 0
+        # Shard positions this container may write; None when it owns them all
+        self._owned: Optional[set] = None
+
+    def copy(self):
+        clone = type(self).__new__(type(self))
+        clone._shards = list(self._shards)
+        clone._mask = self._mask
+        clone._length = self._length
+        clone._owned = set()
+        return clone
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._shards)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._shards[hash(key) & self._mask]
+
+    def _writable(self, key: Hashable):
+        position = hash(key) & self._mask
+        if self._owned is not None and position not in self._owned:
+            self._shards[position] = self._shards[position].copy()
+            self._owned.add(position)
+        return self._shards[position]
+
+    def _grown(self):
+        """Spread the entries over more shards once they have outgrown the current ones"""
+        if self._length > len(self._shards) * MAX_SHARD_FILL:
+            shards = self._shards
+            self._init_shards(sum(len(shard) for shard in shards))
+            self._refill(shards)
+
+    @abstractmethod
+    def _refill(self, sources: Iterable):
+        """Put every entry of the source containers into the (fresh) shards and recount them"""
+
+
+class ShardedDict(_Sharded, MutableMapping):
+    """dict whose copies share unchanged shards (see _Sharded)"""
+
+    __slots__ = ()
+
+    def __init__(self, items: Any = ()):
+        items = items if isinstance(items, dict) else dict(items)
+        self._init_shards(len(items))
+        self._refill([items])
+
+    def _refill(self, sources: Iterable[Dict]):
+        shards, mask = self._shards, self._mask
+        for source in sources:
+            for key, value in source.items():
+                shards[hash(key) & mask][key] = value
+        self._length = sum(len(shard) for shard in shards)
+
+    def __getitem__(self, key: Hashable):
+        return self._shards[hash(key) & self._mask][key]
+
+    def get(self, key: Hashable, default: Any = None):
+        return self._shards[hash(key) & self._mask].get(key, default)
+
+    def __setitem__(self, key: Hashable, value: Any):
+        shard = self._writable(key)
+        if key not in shard:
+            self._length += 1
+        shard[key] = value
+        self._grown()
+
+    def __delitem__(self, key: Hashable):
+        del self._writable(key)[key]
+        self._length -= 1
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        return chain.from_iterable(shard.items() for shard in self._shards)
+
+    def values(self) -> Iterator:
+        return chain.from_iterable(shard.values() for shard in self._shards)
+
+
+class ShardedSet(_Sharded, MutableSet):
+    """set whose copies share unchanged shards (see _Sharded)"""
+
+    __slots__ = ()
+
+    _empty = set
+
+    def __init__(self, items: Iterable = ()):
+        items = items if isinstance(items, (set, frozenset)) else set(items)
+        self._init_shards(len(items))
+        self._refill([items])
+
+    def _refill(self, sources: Iterable[set]):
+        shards, mask = self._shards, self._mask
+        for source in sources:
+            for item in source:
+                shards[hash(item) & mask].add(item)
+        self._length = sum(len(shard) for shard in shards)
+
+    def add(self, item: Hashable):
+        shard = self._writable(item)
+        if item not in shard:
+            shard.add(item)
+            self._length += 1
+            self._grown()
+
+    def discard(self, item: Hashable):
+        if item in self:
+            self._writable(item).discard(item)
+            self._length -= 1
+
+
+def shard_if_large(container):
+    """A plain dict or set that has grown past SHARD_THRESHOLD, converted so later copies are cheap"""
+    if len(container) > SHARD_THRESHOLD:
+        if type(container) is dict:
+            return ShardedDict(container)
+        if type(container) is set:
+            return ShardedSet(container)
+    return container
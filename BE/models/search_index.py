@@ -0,0 +1,359 @@
+import re
+import math
+import heapq
+import logging
+from itertools import chain, islice
+from typing import Dict, List, Tuple, Iterable, Optional, Set, Union
+
+from models.persistent import ChunkedList, SortedChunkedList, ShardedDict, CHUNK_SHIFT, CHUNK_MASK, shard_if_large
+
+logger = logging.getLogger(__name__)
+
+# Customer fields covered by full-text search
+SEARCH_FIELDS = (
+    'customer_id',
+    'first_name',
+    'last_name',
+    'email',
+    'account_type',
+    'loan_types',
+    'common_issues',
+    'risk_level'
+)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# BM25 tuning parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Score multipliers for how a query token matched an indexed term
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.7
+SUBSTRING_WEIGHT = 0.4
+
+# Upper bound on the number of indexed terms a single partial query token expands to
+MAX_TERM_EXPANSIONS = 64
+
+# Query tokens whose matched terms hold more postings than this (a risk level, an account type)
+# only filter: they add one shared score to every match instead of a BM25 score per document,
+# so they cost a set operation rather than a Python loop over a large share of the index
+MAX_SCORED_POSTINGS = 10000
+
+# Checking one document against a posting costs about as much as this many steps of a set scan
+PROBE_COST = 8
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def trigrams(term: str) -> Set[str]:
+    """Get the set of character trigrams for a term"""
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+class CustomerSearchIndex:
+    """Inverted index over customer records with BM25 ranking"""
+
+    def __init__(self, fields: Iterable[str] = SEARCH_FIELDS):
+        self.fields = tuple(fields)
+        # Term and trigram maps are sharded, as are postings and term sets past SHARD_THRESHOLD,
+        # so a copy that writes one entry copies a shard rather than the whole map
+        self.postings: Dict[str, Dict[int, int]] = ShardedDict()
+        # doc id -> term counts / length; None for a doc id not (or no longer) indexed
+        self.doc_terms: ChunkedList = ChunkedList()
+        self.doc_lengths: ChunkedList = ChunkedList()
+        self.doc_count = 0
+        self.total_length = 0
+        self.sorted_terms: SortedChunkedList = SortedChunkedList()
+        self.trigram_index: Dict[str, Set[str]] = ShardedDict()
+        # Terms and trigrams whose containers this index may write; None when it owns them all
+        self._owned_terms: Optional[Set[str]] = None
+        self._owned_grams: Optional[Set[str]] = None
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def copy(self) -> 'CustomerSearchIndex':
+        """Copy for the next data version; shards, chunks, postings and trigram sets stay shared until written.
+
+        The source must not be written again once copied.
+        """
+        clone = CustomerSearchIndex(self.fields)
+        clone.postings = self.postings.copy()
+        clone.doc_terms = self.doc_terms.copy()
+        clone.doc_lengths = self.doc_lengths.copy()
+        clone.doc_count = self.doc_count
+        clone.total_length = self.total_length
+        clone.sorted_terms = self.sorted_terms.copy()
+        clone.trigram_index = self.trigram_index.copy()
+        clone._owned_terms = set()
+        clone._owned_grams = set()
+        return clone
+
+    def build(self, customers: List[Dict]):
+        """Rebuild the index from a list of customers (doc id = list position)"""
+        self.__init__(self.fields)
+        # Built in plain containers, then wrapped once
+        self.postings = {}
+        self.trigram_index = {}
+        for doc_id, customer in enumerate(customers):
+            self._index_document(doc_id, customer)
+        self.postings = ShardedDict({term: shard_if_large(posting) for term, posting in self.postings.items()})
+        self.trigram_index = ShardedDict({gram: shard_if_large(terms) for gram, terms in self.trigram_index.items()})
+        self.sorted_terms = SortedChunkedList(self.postings)
+        logger.info(f"Built search index: {self.doc_count} documents, {len(self.postings)} terms")
+
+    def add(self, doc_id: int, customer: Dict):
+        """Add a customer document to the index"""
+        self.update_many({doc_id: customer})
+
+    def update(self, doc_id: int, customer: Dict):
+        """Re-index a customer document after its fields changed"""
+        self.update_many({doc_id: customer})
+
+    def update_many(self, customers: Dict[int, Dict]):
+        """Index a batch of new or changed documents (new doc ids in ascending order).
+
+        The sorted vocabulary takes the batch's new and vanished terms in one sorted merge.
+        """
+        new_terms, dropped_terms = [], []
+        for doc_id, customer in customers.items():
+            dropped_terms.extend(self._unindex_document(doc_id))
+            new_terms.extend(self._index_document(doc_id, customer))
+        # A term dropped by one document may come back with a later one; update() removes before it inserts
+        self.sorted_terms.update(new_terms, dropped_terms)
+
+    def remove(self, doc_id: int):
+        """Remove a customer document from the index"""
+        for term in self._unindex_document(doc_id):
+            self.sorted_terms.discard(term)
+
+    def search(self, query: str, offset: int = 0, limit: int = 10) -> Tuple[int, List[Tuple[int, float]]]:
+        """Search the index, returning (total matches, [(doc_id, score), ...]) for the requested page.
+
+        When every query token is too common to score (see MAX_SCORED_POSTINGS), all matches
+        share one score and come back in document order.
+        """
+        matches, shared_score = self._score(query)
+        total = len(matches)
+        if offset >= total:
+            return total, []
+
+        if isinstance(matches, dict):
+            # Highest score first, ties broken by document order
+            ranked = heapq.nsmallest(offset + limit, matches.items(), key=lambda item: (-item[1], item[0]))
+        else:
+            ranked = [(doc_id, 0.0) for doc_id in heapq.nsmallest(offset + limit, matches)]
+        return total, [(doc_id, round(score + shared_score, 4)) for doc_id, score in ranked[offset:]]
+
+    def match(self, query: str) -> Set[int]:
+        """Get the ids of all documents matching a query, unranked"""
+        matches = None
+        for terms, size in self._token_terms(query):
+            matches = self._restrict(matches, [posting for posting, _, _ in terms], size)
+            if not matches:
+                return set()
+        return matches or set()
+
+    def _score(self, query: str) -> Tuple[Union[Dict[int, float], Set[int]], float]:
+        """Compute BM25 scores for every document matching all query tokens.
+
+        Returns the per-document scores of the selective tokens (or, when there are none, the set
+        of matching documents) and the score that the common tokens add to every match.
+        """
+        token_terms = self._token_terms(query)
+        if not token_terms:
+            return {}, 0.0
+
+        avg_length = self.total_length / self.doc_count
+        scores: Optional[Dict[int, float]] = None
+        matches: Optional[Set[int]] = None
+        shared_score = 0.0
+        # Tokens come rarest first, so every scored token runs before the first common one
+        for terms, size in token_terms:
+            if size > MAX_SCORED_POSTINGS:
+                # Its best term's weight for a document of average length, given to every match
+                shared_score += max(weight * idf for _, weight, idf in terms)
+                postings = [posting for posting, _, _ in terms]
+                if scores is None:
+                    matches = self._restrict(matches, postings, size)
+                else:
+                    kept = self._restrict(set(scores), postings, size)
+                    scores = {doc_id: scores[doc_id] for doc_id in kept}
+            elif scores is None:
+                scores = self._token_scores(terms, None, avg_length)
+            else:
+                token_scores = self._token_scores(terms, scores, avg_length)
+                scores = {doc_id: scores[doc_id] + score for doc_id, score in token_scores.items()}
+            if not (matches if scores is None else scores):
+                return {}, 0.0
+
+        return (matches if scores is None else scores), shared_score
+
+    def _token_terms(self, query: str) -> List[Tuple[List[Tuple[Dict[int, int], float, float]], int]]:
+        """Expand each query token to its (posting, weight, idf) terms and their total postings, rarest token first.
+
+        Empty when the query has no tokens or some token matches no indexed term.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens or not self.doc_count:
+            return []
+
+        doc_count = self.doc_count
+        token_terms = []
+        for position, token in enumerate(query_tokens):
+            # The last token may still be being typed, so it is matched by prefix as well
+            is_last = position == len(query_tokens) - 1
+            terms = []
+            for term, weight in self._expand(token, allow_prefix=is_last).items():
+                posting = self.postings[term]
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                terms.append((posting, weight, idf))
+            # Every query token has to match at least one term in a document
+            if not terms:
+                return []
+            token_terms.append((terms, sum(len(posting) for posting, _, _ in terms)))
+        token_terms.sort(key=lambda item: item[1])
+        return token_terms
+
+    def _token_scores(self, terms: List[Tuple[Dict[int, int], float, float]], within: Optional[Dict[int, float]],
+                      avg_length: float) -> Dict[int, float]:
+        """Score one query token per document by its best-scoring term, only over the docs in within if given"""
+        length_chunks = self.doc_lengths.chunks
+        token_scores: Dict[int, float] = {}
+        for posting, weight, idf in terms:
+            if within is None:
+                entries = posting.items()
+            elif len(within) < len(posting):
+                entries = ((doc_id, posting[doc_id]) for doc_id in within if doc_id in posting)
+            else:
+                entries = ((doc_id, tf) for doc_id, tf in posting.items() if doc_id in within)
+            for doc_id, tf in entries:
+                length = length_chunks[doc_id >> CHUNK_SHIFT][doc_id & CHUNK_MASK]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                score = weight * idf * tf * (BM25_K1 + 1) / norm
+                if score > token_scores.get(doc_id, 0.0):
+                    token_scores[doc_id] = score
+        return token_scores
+
+    @staticmethod
+    def _restrict(matches: Optional[Set[int]], postings: List[Dict[int, int]], size: int) -> Set[int]:
+        """Narrow matches to the docs in any of the postings, or start from all of those docs if matches is None"""
+        if matches is None:
+            return set(chain.from_iterable(postings))
+        if len(matches) * len(postings) * PROBE_COST < size:
+            return {doc_id for doc_id in matches if any(doc_id in posting for posting in postings)}
+        return matches.intersection(chain.from_iterable(postings))
+
+    def _index_document(self, doc_id: int, customer: Dict) -> List[str]:
+        """Index a single document, returning any terms new to the vocabulary"""
+        term_counts: Dict[str, int] = {}
+        for field in self.fields:
+            for token in tokenize(customer.get(field, '')):
+                term_counts[token] = term_counts.get(token, 0) + 1
+
+        new_terms = []
+        for term, count in term_counts.items():
+            if term in self.postings:
+                posting = self._writable_posting(term)
+            else:
+                posting = self.postings[term] = {}
+                if self._owned_terms is not None:
+                    self._owned_terms.add(term)
+                for gram in trigrams(term):
+                    self._writable_grams(gram).add(term)
+                new_terms.append(term)
+            posting[doc_id] = count
+
+        length = sum(term_counts.values())
+        if doc_id < len(self.doc_terms):
+            self.doc_terms[doc_id] = term_counts
+            self.doc_lengths[doc_id] = length
+        else:
+            self.doc_terms.append(term_counts)
+            self.doc_lengths.append(length)
+        self.doc_count += 1
+        self.total_length += length
+        return new_terms
+
+    def _unindex_document(self, doc_id: int) -> List[str]:
+        """Remove a single document, returning the terms that no longer appear in any document"""
+        terms = self.doc_terms[doc_id] if doc_id < len(self.doc_terms) else None
+        if terms is None:
+            return []
+        self.total_length -= self.doc_lengths[doc_id]
+        self.doc_terms[doc_id] = None
+        self.doc_lengths[doc_id] = None
+        self.doc_count -= 1
+        dropped = []
+        for term in terms:
+            posting = self._writable_posting(term)
+            del posting[doc_id]
+            if not posting:
+                self._drop_term(term)
+                dropped.append(term)
+        return dropped
+
+    def _drop_term(self, term: str):
+        """Remove a term that no longer appears in any document (the caller updates sorted_terms)"""
+        del self.postings[term]
+        for gram in trigrams(term):
+            if gram in self.trigram_index:
+                terms = self._writable_grams(gram)
+                terms.discard(term)
+                if not terms:
+                    del self.trigram_index[gram]
+
+    def _expand(self, token: str, allow_prefix: bool) -> Dict[str, float]:
+        """Map a query token to the indexed terms it matches and their weights"""
+        matches: Dict[str, float] = {}
+        if token in self.postings:
+            matches[token] = EXACT_WEIGHT
+
+        if allow_prefix:
+            for term in islice(self.sorted_terms.iter_from(token), MAX_TERM_EXPANSIONS):
+                if not term.startswith(token):
+                    break
+                matches.setdefault(term, PREFIX_WEIGHT)
+
+        # Trigram lookup finds terms containing the token anywhere
+        grams = trigrams(token)
+        if grams:
+            candidates = None
+            for gram in sorted(grams, key=lambda g: len(self.trigram_index.get(g, ()))):
+                terms = self.trigram_index.get(gram)
+                if not terms:
+                    candidates = set()
+                    break
+                # Term sets may be ShardedSets, so probe them rather than use set operators
+                candidates = set(terms) if candidates is None else {term for term in candidates if term in terms}
+                if not candidates:
+                    break
+            for term in sorted(candidates or ())[:MAX_TERM_EXPANSIONS]:
+                if token in term:
+                    matches.setdefault(term, SUBSTRING_WEIGHT)
+
+        return matches
+
+    def _writable_posting(self, term: str) -> Dict[int, int]:
+        """A term's posting dict, copied (and sharded once large) first if it is still shared with the version this index was copied from"""
+        posting = self.postings[term]
+        if self._owned_terms is not None and term not in self._owned_terms:
+            posting = self.postings[term] = shard_if_large(posting.copy())
+            self._owned_terms.add(term)
+        return posting
+
+    def _writable_grams(self, gram: str) -> Set[str]:
+        """A trigram's term set, created or copied as needed so it is safe to write"""
+        terms = self.trigram_index.get(gram)
+        if terms is not None and (self._owned_grams is None or gram in self._owned_grams):
+            return terms
+        terms = self.trigram_index[gram] = shard_if_large(terms.copy()) if terms is not None else set()
+        if self._owned_grams is not None:
+            self._owned_grams.add(gram)
+        return terms
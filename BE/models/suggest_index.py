@@ -0,0 +1,112 @@
+import logging
+from typing import Dict, List, Tuple
+
+from models.persistent import ChunkedList, SortedChunkedList
+
+logger = logging.getLogger(__name__)
+
+# Customer fields offered as typeahead suggestions
+SUGGEST_FIELDS = ('username', 'first_name', 'last_name', 'email', 'customer_id')
+
+
+class CustomerSuggestIndex:
+    """Sorted-array prefix index for customer typeahead lookups"""
+
+    def __init__(self, fields: Tuple[str, ...] = SUGGEST_FIELDS):
+        self.fields = fields
+        # (key, doc_id, field) kept sorted so prefix lookups are a bisect plus a short scan
+        self.keys: SortedChunkedList = SortedChunkedList()
+        # doc id -> its (key, field) pairs; None for a doc id not (or no longer) indexed
+        self.doc_keys: ChunkedList = ChunkedList()
+        self.doc_count = 0
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def copy(self) -> 'CustomerSuggestIndex':
+        """Copy for the next data version; key and per-doc chunks stay shared until written.
+
+        The source must not be written again once copied.
+        """
+        clone = CustomerSuggestIndex(self.fields)
+        clone.keys = self.keys.copy()
+        clone.doc_keys = self.doc_keys.copy()
+        clone.doc_count = self.doc_count
+        return clone
+
+    def build(self, customers: List[Dict]):
+        """Rebuild the index from a list of customers (doc id = list position)"""
+        entries = []
+        doc_keys = []
+        for doc_id, customer in enumerate(customers):
+            keys = self._document_keys(customer)
+            entries.extend((key, doc_id, field) for key, field in keys)
+            doc_keys.append(keys)
+        self.keys = SortedChunkedList(entries)
+        self.doc_keys = ChunkedList(doc_keys)
+        self.doc_count = len(doc_keys)
+        logger.info(f"Built suggest index: {self.doc_count} customers, {len(self.keys)} keys")
+
+    def add(self, doc_id: int, customer: Dict):
+        """Add a customer to the index"""
+        self.update_many({doc_id: customer})
+
+    def update(self, doc_id: int, customer: Dict):
+        """Re-index a customer after its fields changed"""
+        self.update_many({doc_id: customer})
+
+    def update_many(self, customers: Dict[int, Dict]):
+        """Index a batch of new or changed customers (new doc ids in ascending order) in one sorted merge"""
+        added, removed = [], []
+        for doc_id, customer in customers.items():
+            removed.extend((key, doc_id, field) for key, field in self._forget(doc_id))
+            keys = self._document_keys(customer)
+            added.extend((key, doc_id, field) for key, field in keys)
+            if doc_id < len(self.doc_keys):
+                self.doc_keys[doc_id] = keys
+            else:
+                self.doc_keys.append(keys)
+            self.doc_count += 1
+        self.keys.update(added, removed)
+
+    def remove(self, doc_id: int):
+        """Remove a customer from the index"""
+        for key, field in self._forget(doc_id):
+            self.keys.discard((key, doc_id, field))
+
+    def _forget(self, doc_id: int) -> List[Tuple[str, str]]:
+        """Drop a customer's recorded keys, returning them"""
+        keys = self.doc_keys[doc_id] if doc_id < len(self.doc_keys) else None
+        if keys is None:
+            return []
+        self.doc_keys[doc_id] = None
+        self.doc_count -= 1
+        return keys
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """Get up to `limit` (doc_id, matched field) pairs whose keys start with prefix"""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        for key, doc_id, field in self.keys.iter_from((prefix,)):
+            if len(results) >= limit or not key.startswith(prefix):
+                break
+            if doc_id not in seen:
+                seen.add(doc_id)
+                results.append((doc_id, field))
+        return results
+
+    def _document_keys(self, customer: Dict) -> List[Tuple[str, str]]:
+        """Get the lowercase lookup keys for a customer"""
+        keys = []
+        for field in self.fields:
+            value = str(customer.get(field, '')).strip().lower()
+            if value:
+                keys.append((value, field))
+        full_name = f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip().lower()
+        if full_name:
+            keys.append((full_name, 'name'))
+        return keys
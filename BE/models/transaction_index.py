@@ -0,0 +1,114 @@
+import json
+import base64
+import bisect
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from models.customer_query import InvalidCursorError
+
+logger = logging.getLogger(__name__)
+
+# Transaction types that add to the balance; every other type is treated as a debit
+CREDIT_TYPES = {'deposit', 'refund', 'interest', 'transfer_in'}
+
+# Sorts after any transaction id, so (date, MAX_ID) is the end of that day
+MAX_ID = '\uffff'
+
+
+def signed_amount(transaction: Dict) -> float:
+    """Get a transaction's effect on the balance"""
+    amount = transaction['amount']
+    return amount if transaction['transaction_type'] in CREDIT_TYPES else -amount
+
+
+def encode_cursor(date: str, transaction_id: str) -> str:
+    """Encode the (date, id) key of the last returned transaction as an opaque cursor"""
+    raw = json.dumps([date, transaction_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, transaction_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return str(date), str(transaction_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+class CustomerTransactions:
+    """One customer's transactions sorted by (date, id) with prefix sums for running balances"""
+
+    def __init__(self):
+        self.keys: List[Tuple[str, str]] = []
+        self.rows: List[Dict] = []
+        # running[i] is the net of all transactions up to and including position i
+        self.running: List[float] = []
+
+    def bulk_load(self, transactions: List[Dict]):
+        """Replace the contents with a batch of transactions, sorting once"""
+        ordered = sorted(transactions, key=lambda t: (t['transaction_date'], t['transaction_id']))
+        self.keys = [(t['transaction_date'], t['transaction_id']) for t in ordered]
+        self.rows = ordered
+        self.running = []
+        total = 0.0
+        for transaction in ordered:
+            total += signed_amount(transaction)
+            self.running.append(total)
+
+
+class TransactionIndex:
+    """Per-customer, date-sorted transaction index supporting range scans and keyset pagination"""
+
+    def __init__(self):
+        self.customers: Dict[str, CustomerTransactions] = {}
+
+    def build(self, transactions: List[Dict]):
+        """Build the index from all transaction rows"""
+        grouped: Dict[str, List[Dict]] = {}
+        for transaction in transactions:
+            grouped.setdefault(transaction['customer_id'], []).append(transaction)
+        self.customers = {}
+        for customer_id, rows in grouped.items():
+            self.customers[customer_id] = CustomerTransactions()
+            self.customers[customer_id].bulk_load(rows)
+        logger.info(f"Built transaction index: {len(transactions)} transactions for {len(self.customers)} customers")
+
+    def query(self, customer_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+              cursor: Optional[str] = None, limit: int = 50, descending: bool = True) -> Dict:
+        """Get one page of a customer's transactions within an inclusive date range"""
+        history = self.customers.get(customer_id)
+        if history is None:
+            return {"transactions": [], "next_cursor": None, "total": 0}
+
+        # Range scan bounds over the sorted keys
+        start = bisect.bisect_left(history.keys, (date_from, '')) if date_from else 0
+        end = bisect.bisect_right(history.keys, (date_to, MAX_ID)) if date_to else len(history.keys)
+        total = max(end - start, 0)
+
+        if cursor:
+            after = decode_cursor(cursor)
+            if descending:
+                end = min(end, bisect.bisect_left(history.keys, after))
+            else:
+                start = max(start, bisect.bisect_right(history.keys, after))
+
+        if descending:
+            positions = range(end - 1, max(start, end - limit) - 1, -1)
+            has_more = end - limit > start
+        else:
+            positions = range(start, min(end, start + limit))
+            has_more = start + limit < end
+
+        page = []
+        for position in positions:
+            transaction = dict(history.rows[position])
+            transaction['running_balance'] = round(history.running[position], 2)
+            page.append(transaction)
+
+        next_cursor = None
+        if has_more and page:
+            last = page[-1]
+            next_cursor = encode_cursor(last['transaction_date'], last['transaction_id'])
+        return {"transactions": page, "next_cursor": next_cursor, "total": total}
@@ -0,0 +1,149 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models.transaction_index import signed_amount
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('daily', 'weekly', 'monthly')
+
+
+class TransactionRollups:
+    """Day-level cumulative sums per (transaction_type, account_type) series.
+
+    cum_amounts[s, d] holds the total of series s over days [0, d), so any
+    date range sum is a difference of two cells and daily, weekly and monthly
+    rollups are vectorized differences at bucket boundaries.
+    """
+
+    def __init__(self):
+        self.origin: Optional[date] = None
+        self.days = 0
+        self.series: List[Tuple[str, str]] = []
+        self.series_ids: Dict[Tuple[str, str], int] = {}
+        self.cum_amounts = np.zeros((0, 1))
+        self.cum_net = np.zeros((0, 1))
+        self.cum_counts = np.zeros((0, 1), dtype=np.int64)
+
+    def build(self, transactions: List[Dict], account_types: Dict[str, str]):
+        """Build the rollups from all transactions, resolving account types by customer_id"""
+        self.__init__()
+        if not transactions:
+            return
+
+        dates = np.array([t['transaction_date'] for t in transactions], dtype='datetime64[D]')
+        self.origin = dates.min().astype(date)
+        last = dates.max().astype(date)
+        self.days = (last - self.origin).days + 1
+
+        keys = [(t['transaction_type'], account_types.get(t['customer_id'], 'unknown')) for t in transactions]
+        for key in keys:
+            if key not in self.series_ids:
+                self.series_ids[key] = len(self.series)
+                self.series.append(key)
+
+        series_index = np.array([self.series_ids[key] for key in keys])
+        day_index = (dates - np.datetime64(self.origin, 'D')).astype(np.int64)
+        amounts = np.array([t['amount'] for t in transactions], dtype=float)
+        net = np.array([signed_amount(t) for t in transactions], dtype=float)
+
+        shape = (len(self.series), self.days)
+        daily_amounts = np.zeros(shape)
+        daily_net = np.zeros(shape)
+        daily_counts = np.zeros(shape, dtype=np.int64)
+        np.add.at(daily_amounts, (series_index, day_index), amounts)
+        np.add.at(daily_net, (series_index, day_index), net)
+        np.add.at(daily_counts, (series_index, day_index), 1)
+
+        self.cum_amounts = self._cumulative(daily_amounts)
+        self.cum_net = self._cumulative(daily_net)
+        self.cum_counts = self._cumulative(daily_counts)
+        logger.info(f"Built transaction rollups: {len(transactions)} transactions, "
+                    f"{len(self.series)} series over {self.days} days")
+
+    def range_sum(self, date_from: date, date_to: date, transaction_type: Optional[str] = None,
+                  account_type: Optional[str] = None) -> Dict:
+        """Get totals over an inclusive date range in O(1) per series"""
+        rows = self._select(transaction_type, account_type)
+        start, end = self._bounds(date_from, date_to)
+        return {
+            "amount": round(float((self.cum_amounts[rows, end] - self.cum_amounts[rows, start]).sum()), 2),
+            "net": round(float((self.cum_net[rows, end] - self.cum_net[rows, start]).sum()), 2),
+            "count": int((self.cum_counts[rows, end] - self.cum_counts[rows, start]).sum())
+        }
+
+    def rollup(self, granularity: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+               transaction_type: Optional[str] = None, account_type: Optional[str] = None) -> Dict:
+        """Get per-period totals for every matching series"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unsupported granularity: {granularity}")
+        if self.origin is None:
+            return {"granularity": granularity, "periods": [], "series": []}
+
+        date_from = date_from or self.origin
+        date_to = date_to or self.origin + timedelta(days=self.days - 1)
+        periods = self._period_starts(granularity, date_from, date_to)
+        # Bucket i covers [edges[i], edges[i + 1]) in cumulative-array columns; the first
+        # period may start before date_from, so its edge is clamped into the range
+        edges = np.array([self._bounds(max(start, date_from), date_to)[0] for start in periods]
+                         + [self._bounds(date_from, date_to)[1]])
+
+        rows = self._select(transaction_type, account_type)
+        amounts = np.diff(self.cum_amounts[rows][:, edges], axis=1)
+        net = np.diff(self.cum_net[rows][:, edges], axis=1)
+        counts = np.diff(self.cum_counts[rows][:, edges], axis=1)
+
+        series = []
+        for i, row in enumerate(rows):
+            series.append({
+                "transaction_type": self.series[row][0],
+                "account_type": self.series[row][1],
+                "amounts": np.round(amounts[i], 2).tolist(),
+                "net": np.round(net[i], 2).tolist(),
+                "counts": counts[i].tolist()
+            })
+        return {
+            "granularity": granularity,
+            "periods": [start.isoformat() for start in periods],
+            "series": series
+        }
+
+    def _select(self, transaction_type: Optional[str], account_type: Optional[str]) -> List[int]:
+        """Get the series rows matching optional type filters"""
+        return [
+            row for row, (t_type, a_type) in enumerate(self.series)
+            if (transaction_type is None or t_type == transaction_type)
+            and (account_type is None or a_type == account_type)
+        ]
+
+    def _bounds(self, date_from: date, date_to: date) -> Tuple[int, int]:
+        """Map an inclusive date range to clamped cumulative-array columns"""
+        start = min(max((date_from - self.origin).days, 0), self.days)
+        end = min(max((date_to - self.origin).days + 1, 0), self.days)
+        return start, max(start, end)
+
+    @staticmethod
+    def _period_starts(granularity: str, date_from: date, date_to: date) -> List[date]:
+        """Get the calendar start (day, Monday or 1st) of every period intersecting the range"""
+        if granularity == 'daily':
+            return [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+        weekly = granularity == 'weekly'
+        current = date_from - timedelta(days=date_from.weekday()) if weekly else date_from.replace(day=1)
+        starts = []
+        while current <= date_to:
+            starts.append(current)
+            if weekly:
+                current += timedelta(days=7)
+            else:
+                current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return starts
+
+    @staticmethod
+    def _cumulative(daily: np.ndarray) -> np.ndarray:
+        """Turn per-day values into prefix sums with a leading zero column"""
+        cumulative = np.zeros((daily.shape[0], daily.shape[1] + 1), dtype=daily.dtype)
+        np.cumsum(daily, axis=1, out=cumulative[:, 1:])
+        return cumulative
@@ -1,133 +1,321 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context, current_app
 import logging
-import csv
-from datetime import datetime
+import io
+from datetime import datetime, date
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.auth_utils import admin_required
+from models.customer_query import FILTER_FIELDS, SORT_FIELDS, DEFAULT_SORT, SENSITIVE_FIELDS, InvalidCursorError, project
+from models.banking_repository import CUSTOMER_RELATIONS
+from models.transaction_rollups import GRANULARITIES
+from models.loan_portfolio import SEGMENT_FIELDS, DEFAULT_PROJECTION_MONTHS, MAX_PROJECTION_MONTHS
+from models.customer_import import CustomerImporter, DEFAULT_BATCH_SIZE
+from utils.export_utils import EXPORT_FORMATS, stream_export
+from utils.request_utils import parse_transaction_args
+from utils.json_provider import cached_json
 
 logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__)
 
-def init_admin_routes(app, csv_file_path):
+def init_admin_routes(app, banking_assistant, repository):
     """Initialize admin routes"""
     
+    @admin_bp.route('/api/admin/customers/suggest', methods=['GET'])
+    @admin_required
+    def suggest_customers():
+        """Typeahead suggestions for admin customer lookup (admin only)"""
+        prefix = request.args.get('prefix', '').strip()
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+        except ValueError:
+            return jsonify({"error": "Invalid limit"}), 400
+        
+        suggestions = banking_assistant.suggest_customers(prefix, limit) if prefix else []
+        response = jsonify({
+            "prefix": prefix,
+            "suggestions": suggestions,
+            "count": len(suggestions)
+        })
+        # Let the browser absorb repeated keystrokes for the same prefix
+        response.headers['Cache-Control'] = 'private, max-age=30'
+        return response
+
     @admin_bp.route('/api/admin/customers', methods=['GET'])
     @admin_required
     def get_all_customers():
-        """Get all customer data (admin only)"""
+        """Get a page of customer data with filters, sorting and field projection (admin only)"""
         try:
-            customers = []
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for customer in reader:
-                    customers.append(customer)
-            
-            return jsonify({
-                "customers": customers,
-                "count": len(customers),
-                "timestamp": datetime.now().isoformat()
-            })
+            limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        except ValueError:
+            return jsonify({"error": "Invalid limit"}), 400
+        
+        sort = request.args.get('sort', DEFAULT_SORT)
+        descending = sort.startswith('-')
+        sort = sort.lstrip('-')
+        if sort not in SORT_FIELDS:
+            return jsonify({"error": f"Unsupported sort key. Use one of: {', '.join(SORT_FIELDS)}"}), 400
+        
+        filters = {param: request.args[param] for param in FILTER_FIELDS if request.args.get(param)}
+        fields = request.args.get('fields')
+        fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        
+        try:
+            page = banking_assistant.list_customers(
+                filters,
+                sort=sort,
+                descending=descending,
+                cursor=request.args.get('cursor') or None,
+                limit=limit,
+                fields=fields,
+                query=request.args.get('q', '').strip()
+            )
+        except InvalidCursorError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             logger.error(f"Error loading customer data: {e}")
             return jsonify({"error": "Failed to load customer data"}), 500
+        
+        return jsonify({
+            "customers": page['customers'],
+            "count": len(page['customers']),
+            "total": page['total'],
+            "next_cursor": page['next_cursor'],
+            "timestamp": datetime.now().isoformat()
+        })
+
+    @admin_bp.route('/api/admin/export', methods=['GET'])
+    @admin_required
+    def export_customers():
+        """Stream customer data as CSV or NDJSON (admin only)"""
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+        
+        sort = request.args.get('sort', DEFAULT_SORT)
+        descending = sort.startswith('-')
+        sort = sort.lstrip('-')
+        if sort not in SORT_FIELDS:
+            return jsonify({"error": f"Unsupported sort key. Use one of: {', '.join(SORT_FIELDS)}"}), 400
+        
+        available = banking_assistant.public_fields()
+        fields = request.args.get('fields')
+        if fields:
+            fields = [f.strip() for f in fields.split(',') if f.strip()]
+            unknown = [f for f in fields if f not in available or f in SENSITIVE_FIELDS]
+            if unknown:
+                return jsonify({"error": f"Unknown or restricted fields: {', '.join(unknown)}"}), 400
+        else:
+            fields = available
+        
+        filters = {param: request.args[param] for param in FILTER_FIELDS if request.args.get(param)}
+        compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+        
+        rows = banking_assistant.iter_customers(
+            filters,
+            sort=sort,
+            descending=descending,
+            fields=fields,
+            query=request.args.get('q', '').strip()
+        )
+        filename = f"customer_data_{datetime.now().strftime('%Y-%m-%d')}.{export_format}"
+        response = Response(
+            stream_with_context(stream_export(rows, fields, export_format, compress)),
+            mimetype=EXPORT_FORMATS[export_format]
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response.headers['Cache-Control'] = 'no-store'
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        
+        logger.info(f"Streaming {export_format} export of customers (filters: {filters})")
+        return response
 
     @admin_bp.route('/api/admin/customer/<customer_id>', methods=['GET'])
     @admin_required
     def get_customer_by_id(customer_id):
         """Get specific customer by ID (admin only)"""
-        try:
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for customer in reader:
-                    if customer['customer_id'] == customer_id:
-                        return jsonify(customer)
-            
+        customer = banking_assistant.get_customer_by_id(customer_id)
+        if customer is None:
+            return jsonify({"error": "Customer not found"}), 404
+        return jsonify(customer.to_public_dict())
+
+    @admin_bp.route('/api/admin/customer/<customer_id>/details', methods=['GET'])
+    @admin_required
+    def get_customer_details(customer_id):
+        """Get a customer joined with the requested related tables (admin only)"""
+        include = request.args.get('include', 'profile,account,loans')
+        include = [relation.strip() for relation in include.split(',') if relation.strip()]
+        unknown = [relation for relation in include if relation not in CUSTOMER_RELATIONS]
+        if unknown:
+            return jsonify({"error": f"Unknown relations: {', '.join(unknown)}. Use: {', '.join(CUSTOMER_RELATIONS)}"}), 400
+        
+        record = repository.get_customer(customer_id)
+        if record is None:
             return jsonify({"error": "Customer not found"}), 404
+        
+        details = record.to_dict(include)
+        if details.get('profile'):
+            details['profile'] = project(details['profile'])
+        return jsonify(details)
+
+    @admin_bp.route('/api/admin/customer/<customer_id>/transactions', methods=['GET'])
+    @admin_required
+    def get_customer_transactions(customer_id):
+        """Get any customer's transaction history (admin only)"""
+        if not repository.exists(customer_id):
+            return jsonify({"error": "Customer not found"}), 404
+        
+        try:
+            params = parse_transaction_args(request.args)
+            page = repository.get_transaction_page(customer_id, **params)
+        except (ValueError, InvalidCursorError) as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify({
+            "customer_id": customer_id,
+            "transactions": page['transactions'],
+            "count": len(page['transactions']),
+            "total": page['total'],
+            "next_cursor": page['next_cursor']
+        })
+
+    @admin_bp.route('/api/admin/analytics/transactions', methods=['GET'])
+    @admin_required
+    def get_transaction_analytics():
+        """Deposit/withdrawal volume over time by transaction and account type (admin only)"""
+        granularity = request.args.get('granularity', 'monthly').lower()
+        if granularity not in GRANULARITIES:
+            return jsonify({"error": f"Unsupported granularity. Use one of: {', '.join(GRANULARITIES)}"}), 400
+        
+        try:
+            params = parse_transaction_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        date_from = date.fromisoformat(params['date_from']) if params['date_from'] else None
+        date_to = date.fromisoformat(params['date_to']) if params['date_to'] else None
+        transaction_type = request.args.get('transaction_type') or None
+        account_type = request.args.get('account_type') or None
+        
+        try:
+            rollups = repository.transaction_rollups()
+            result = rollups.rollup(granularity, date_from, date_to, transaction_type, account_type)
+            if rollups.origin is not None:
+                result['totals'] = rollups.range_sum(
+                    date_from or rollups.origin,
+                    date_to or date.max,
+                    transaction_type,
+                    account_type
+                )
+            result['timestamp'] = datetime.now().isoformat()
+            return jsonify(result)
         except Exception as e:
-            logger.error(f"Error loading customer data: {e}")
-            return jsonify({"error": "Failed to load customer data"}), 500
+            logger.error(f"Error generating transaction analytics: {e}")
+            return jsonify({"error": "Failed to generate transaction analytics"}), 500
+
+    @admin_bp.route('/api/admin/analytics/loans', methods=['GET'])
+    @admin_required
+    def get_loan_projection():
+        """Month-by-month projected loan cash flows by loan type and risk level (admin only).
+
+        active_loans counts the loans whose balance is above half a cent before each month's
+        payment, exactly as a per-loan ledger with that cut-off would; amounts match such a
+        ledger to within a cent (tests/test_loan_portfolio.py).
+        """
+        months = request.args.get('months', DEFAULT_PROJECTION_MONTHS, type=int)
+        if not 1 <= months <= MAX_PROJECTION_MONTHS:
+            return jsonify({"error": f"months must be between 1 and {MAX_PROJECTION_MONTHS}"}), 400
+        group_by = tuple(g for g in request.args.get('group_by', 'loan_type,risk_level').split(',') if g)
+        unknown = [g for g in group_by if g not in SEGMENT_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown group_by: {', '.join(unknown)}. Use any of: {', '.join(SEGMENT_FIELDS)}"}), 400
+        
+        try:
+            projection = dict(banking_assistant.get_loan_projection(months, group_by))
+            projection['timestamp'] = datetime.now().isoformat()
+            return jsonify(projection)
+        except Exception as e:
+            logger.error(f"Error projecting loan portfolio: {e}")
+            return jsonify({"error": "Failed to project loan portfolio"}), 500
+
+    @admin_bp.route('/api/admin/sessions', methods=['GET'])
+    @admin_required
+    def get_session_stats():
+        """Active session count and memory used by the session store (admin only)"""
+        stats = current_app.extensions['session_store'].stats()
+        stats['timestamp'] = datetime.now().isoformat()
+        return jsonify(stats)
+
+    @admin_bp.route('/api/admin/auth/passwords', methods=['GET'])
+    @admin_required
+    def get_password_stats():
+        """Password verification counts, queue depth and hashing latency (admin only)"""
+        stats = current_app.extensions['password_service'].stats()
+        stats['timestamp'] = datetime.now().isoformat()
+        return jsonify(stats)
+
+    @admin_bp.route('/api/admin/auth/rate-limits', methods=['GET'])
+    @admin_required
+    def get_rate_limit_stats():
+        """Throttled addresses, locked-out keys and rejections (admin only)"""
+        stats = current_app.extensions['rate_limiter'].stats()
+        stats['timestamp'] = datetime.now().isoformat()
+        return jsonify(stats)
+
+    @admin_bp.route('/api/admin/json', methods=['GET'])
+    @admin_required
+    def get_json_stats():
+        """JSON encoder in use, encode timings and cached response hits (admin only)"""
+        stats = current_app.json.stats()
+        stats['timestamp'] = datetime.now().isoformat()
+        return jsonify(stats)
 
     @admin_bp.route('/api/admin/stats', methods=['GET'])
     @admin_required
     def get_admin_stats():
         """Get comprehensive admin statistics"""
+        def build():
+            stats = banking_assistant.get_admin_stats()
+            stats["timestamp"] = datetime.now().isoformat()
+            return stats
+        
+        # Serialized once per version of the customer data; timestamp is when these stats were computed
         try:
-            customers = []
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for customer in reader:
-                    customers.append(customer)
-            
-            # Basic stats
-            total_customers = len(customers)
-            active_accounts = len([c for c in customers if c['account_status'] == 'active'])
-            frozen_accounts = len([c for c in customers if c['account_status'] == 'frozen'])
-            
-            # Account type distribution
-            account_types = {}
-            for customer in customers:
-                account_type = customer['account_type']
-                account_types[account_type] = account_types.get(account_type, 0) + 1
-            
-            # Risk level distribution
-            risk_levels = {}
-            for customer in customers:
-                risk_level = customer['risk_level']
-                risk_levels[risk_level] = risk_levels.get(risk_level, 0) + 1
-            
-            # Loan statistics
-            customers_with_loans = len([c for c in customers if c['has_loans'] == 'yes'])
-            total_loan_amount = sum([float(c['loan_amounts']) for c in customers if c['has_loans'] == 'yes'])
-            total_monthly_payments = sum([float(c['monthly_payments']) for c in customers if c['has_loans'] == 'yes'])
-            
-            # Loan type distribution
-            loan_types = {}
-            for customer in customers:
-                if customer['has_loans'] == 'yes' and customer['loan_types'] != 'none':
-                    loan_type = customer['loan_types']
-                    loan_types[loan_type] = loan_types.get(loan_type, 0) + 1
-            
-            # Credit score statistics
-            credit_scores = [int(c['credit_score']) for c in customers]
-            avg_credit_score = sum(credit_scores) / len(credit_scores) if credit_scores else 0
-            
-            # Balance statistics
-            balances = [float(c['balance']) for c in customers]
-            total_balance = sum(balances)
-            avg_balance = total_balance / len(balances) if balances else 0
-            
-            return jsonify({
-                "total_customers": total_customers,
-                "active_accounts": active_accounts,
-                "frozen_accounts": frozen_accounts,
-                "account_types": account_types,
-                "risk_levels": risk_levels,
-                "loan_stats": {
-                    "customers_with_loans": customers_with_loans,
-                    "total_loan_amount": total_loan_amount,
-                    "total_monthly_payments": total_monthly_payments,
-                    "loan_types": loan_types
-                },
-                "credit_score_stats": {
-                    "average": round(avg_credit_score, 2),
-                    "min": min(credit_scores) if credit_scores else 0,
-                    "max": max(credit_scores) if credit_scores else 0
-                },
-                "balance_stats": {
-                    "total_balance": total_balance,
-                    "average_balance": avg_balance,
-                    "min_balance": min(balances) if balances else 0,
-                    "max_balance": max(balances) if balances else 0
-                },
-                "timestamp": datetime.now().isoformat()
-            })
+            return cached_json('admin_stats', banking_assistant.data_version, build)
         except Exception as e:
             logger.error(f"Error generating admin stats: {e}")
             return jsonify({"error": "Failed to generate statistics"}), 500
 
+    @admin_bp.route('/api/admin/customers/import', methods=['POST'])
+    @admin_required
+    def import_customers():
+        """Bulk import customers from an uploaded CSV file (admin only)"""
+        try:
+            batch_size = min(max(int(request.args.get('batch_size', DEFAULT_BATCH_SIZE)), 1), 10000)
+        except ValueError:
+            return jsonify({"error": "Invalid batch_size"}), 400
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        
+        # Accept either a multipart upload or a raw text/csv body, read as a stream
+        upload = request.files.get('file')
+        binary_stream = upload.stream if upload else request.stream
+        
+        try:
+            importer = CustomerImporter(banking_assistant, current_app.extensions['password_service'],
+                                        batch_size=batch_size)
+            with io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='') as stream:
+                report = importer.import_csv(stream, dry_run=dry_run)
+        except UnicodeDecodeError:
+            return jsonify({"error": "Upload must be UTF-8 encoded CSV"}), 400
+        except Exception as e:
+            logger.error(f"Error importing customers: {e}")
+            return jsonify({"error": "Customer import failed"}), 500
+        
+        if not report['success']:
+            return jsonify(report), 400
+        return jsonify(report)
+
     # Register the blueprint
     app.register_blueprint(admin_bp) 
\ No newline at end of file
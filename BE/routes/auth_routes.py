@@ -9,35 +9,42 @@ from utils.auth_utils import (
     validate_customer_login, 
     update_customer_password, 
     generate_reset_token, 
-    validate_reset_token,
+    consume_reset_token,
     create_multi_session_cookie,
     get_current_session_data,
-    clear_session_cookies
+    clear_session_cookies,
+    lookup_customer,
+    rate_limited
 )
+from utils.password_service import PasswordServiceBusy
+from utils.json_provider import cached_json
+from utils.request_utils import json_object
 
 logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
-def init_auth_routes(app, csv_file_path):
+def init_auth_routes(app, banking_assistant):
     """Initialize authentication routes"""
     
     @auth_bp.route('/api/auth/login', methods=['POST'])
+    @rate_limited
     def login():
         """Handle user login (general endpoint)"""
         try:
-            data = request.get_json()
+            data = json_object(request)
+            if data is None:
+                return jsonify({"error": "Request body must be a JSON object"}), 400
             username = data.get('username', '').strip()
             password = data.get('password', '').strip()
             
             logger.info(f"Login attempt for username: {username}")
-            logger.info(f"Session before login: {dict(session)}")
             
             if not username or not password:
                 return jsonify({"error": "Username and password are required"}), 400
             
             # Check customer login from CSV data only
-            customer_user = validate_customer_login(csv_file_path, username, password)
+            customer_user = validate_customer_login(username, password)
             if customer_user:
                 # Create response with multi-session cookie
                 response = jsonify({
@@ -53,31 +60,28 @@ def init_auth_routes(app, csv_file_path):
                 # Set role-specific session cookie
                 response = create_multi_session_cookie(customer_user, response)
                 
-                # Also set Flask session for backward compatibility
-                session['user_id'] = customer_user['username']
-                session['user_role'] = customer_user['role']
-                session['user_name'] = customer_user['name']
-                session['customer_data'] = customer_user['customer_data']
-                session['_created'] = datetime.now().timestamp()
-                session.modified = True
-                
                 logger.info(f"User {username} logged in successfully")
-                logger.info(f"Session after login: {dict(session)}")
                 
                 return response
             
             logger.info(f"Login failed for username: {username}")
             return jsonify({"error": "Invalid username or password"}), 401
             
+        except PasswordServiceBusy:
+            logger.warning("Password service busy, asking client to retry")
+            return jsonify({"error": "Too many login attempts in progress, please retry"}), 503, {"Retry-After": "1"}
         except Exception as e:
             logger.error(f"Login error: {e}")
             return jsonify({"error": "Login failed"}), 500
 
     @auth_bp.route('/api/auth/login/admin', methods=['POST'])
+    @rate_limited
     def admin_login():
         """Handle admin login specifically"""
         try:
-            data = request.get_json()
+            data = json_object(request)
+            if data is None:
+                return jsonify({"error": "Request body must be a JSON object"}), 400
             username = data.get('username', '').strip()
             password = data.get('password', '').strip()
             
@@ -87,7 +91,7 @@ def init_auth_routes(app, csv_file_path):
                 return jsonify({"error": "Username and password are required"}), 400
             
             # Check admin login from CSV data
-            admin_user = validate_customer_login(csv_file_path, username, password)
+            admin_user = validate_customer_login(username, password)
             if admin_user and admin_user['role'] == 'admin':
                 # Create response with multi-session cookie
                 response = jsonify({
@@ -103,14 +107,6 @@ def init_auth_routes(app, csv_file_path):
                 # Set role-specific session cookie
                 response = create_multi_session_cookie(admin_user, response)
                 
-                # Also set Flask session for backward compatibility
-                session['user_id'] = admin_user['username']
-                session['user_role'] = admin_user['role']
-                session['user_name'] = admin_user['name']
-                session['customer_data'] = admin_user['customer_data']
-                session['_created'] = datetime.now().timestamp()
-                session.modified = True
-                
                 logger.info(f"Admin {username} logged in successfully")
                 
                 return response
@@ -118,15 +114,21 @@ def init_auth_routes(app, csv_file_path):
             logger.info(f"Admin login failed for username: {username}")
             return jsonify({"error": "Invalid admin credentials"}), 401
             
+        except PasswordServiceBusy:
+            logger.warning("Password service busy, asking client to retry")
+            return jsonify({"error": "Too many login attempts in progress, please retry"}), 503, {"Retry-After": "1"}
         except Exception as e:
             logger.error(f"Admin login error: {e}")
             return jsonify({"error": "Admin login failed"}), 500
 
     @auth_bp.route('/api/auth/login/customer', methods=['POST'])
+    @rate_limited
     def customer_login():
         """Handle customer login specifically"""
         try:
-            data = request.get_json()
+            data = json_object(request)
+            if data is None:
+                return jsonify({"error": "Request body must be a JSON object"}), 400
             username = data.get('username', '').strip()
             password = data.get('password', '').strip()
             
@@ -136,7 +138,7 @@ def init_auth_routes(app, csv_file_path):
                 return jsonify({"error": "Username and password are required"}), 400
             
             # Check customer login from CSV data
-            customer_user = validate_customer_login(csv_file_path, username, password)
+            customer_user = validate_customer_login(username, password)
             if customer_user and customer_user['role'] == 'customer':
                 # Create response with multi-session cookie
                 response = jsonify({
@@ -152,14 +154,6 @@ def init_auth_routes(app, csv_file_path):
                 # Set role-specific session cookie
                 response = create_multi_session_cookie(customer_user, response)
                 
-                # Also set Flask session for backward compatibility
-                session['user_id'] = customer_user['username']
-                session['user_role'] = customer_user['role']
-                session['user_name'] = customer_user['name']
-                session['customer_data'] = customer_user['customer_data']
-                session['_created'] = datetime.now().timestamp()
-                session.modified = True
-                
                 logger.info(f"Customer {username} logged in successfully")
                 
                 return response
@@ -167,6 +161,9 @@ def init_auth_routes(app, csv_file_path):
             logger.info(f"Customer login failed for username: {username}")
             return jsonify({"error": "Invalid customer credentials"}), 401
             
+        except PasswordServiceBusy:
+            logger.warning("Password service busy, asking client to retry")
+            return jsonify({"error": "Too many login attempts in progress, please retry"}), 503, {"Retry-After": "1"}
         except Exception as e:
             logger.error(f"Customer login error: {e}")
             return jsonify({"error": "Customer login failed"}), 500
@@ -248,23 +245,13 @@ def init_auth_routes(app, csv_file_path):
         
         if session_data and 'user_id' in session_data:
             logger.info(f"User {session_data['user_id']} is authenticated")
+            customer = lookup_customer(session_data['user_id'])
             return jsonify({
                 "authenticated": True,
                 "user": {
                     "username": session_data['user_id'],
                     "role": session_data.get('user_role'),
-                    "name": session_data.get('user_name')
-                }
-            })
-        elif 'user_id' in session:
-            # Fallback to Flask session
-            logger.info(f"User {session['user_id']} is authenticated (Flask session)")
-            return jsonify({
-                "authenticated": True,
-                "user": {
-                    "username": session['user_id'],
-                    "role": session.get('user_role'),
-                    "name": session.get('user_name')
+                    "name": f"{customer['first_name']} {customer['last_name']}" if customer else session_data['user_id']
                 }
             })
         else:
@@ -272,17 +259,20 @@ def init_auth_routes(app, csv_file_path):
             return jsonify({"authenticated": False})
 
     @auth_bp.route('/api/auth/forgot-password', methods=['POST'])
+    @rate_limited
     def forgot_password():
         """Handle forgot password request"""
         try:
-            data = request.get_json()
+            data = json_object(request)
+            if data is None:
+                return jsonify({"error": "Request body must be a JSON object"}), 400
             username = data.get('username', '').strip()
             
             if not username:
                 return jsonify({"error": "Username is required"}), 400
             
             # Generate reset token
-            reset_token = generate_reset_token(csv_file_path, username)
+            reset_token = generate_reset_token(username)
             if not reset_token:
                 # Don't reveal if user exists or not for security
                 return jsonify({
@@ -304,10 +294,13 @@ def init_auth_routes(app, csv_file_path):
             return jsonify({"error": "Password reset failed"}), 500
 
     @auth_bp.route('/api/auth/reset-password', methods=['POST'])
+    @rate_limited
     def reset_password():
         """Reset password using token"""
         try:
-            data = request.get_json()
+            data = json_object(request)
+            if data is None:
+                return jsonify({"error": "Request body must be a JSON object"}), 400
             username = data.get('username', '').strip()
             token = data.get('token', '').strip()
             new_password = data.get('new_password', '').strip()
@@ -318,12 +311,12 @@ def init_auth_routes(app, csv_file_path):
             if len(new_password) < 6:
                 return jsonify({"error": "Password must be at least 6 characters long"}), 400
             
-            # Validate token
-            if not validate_reset_token(csv_file_path, username, token):
+            # Use up the token first so it can only reset the password once
+            if not consume_reset_token(username, token):
                 return jsonify({"error": "Invalid or expired reset token"}), 401
             
             # Update password
-            if update_customer_password(csv_file_path, username, new_password):
+            if update_customer_password(username, new_password):
                 return jsonify({
                     "success": True,
                     "message": "Password reset successfully"
@@ -331,11 +324,15 @@ def init_auth_routes(app, csv_file_path):
             else:
                 return jsonify({"error": "Failed to update password"}), 500
             
+        except PasswordServiceBusy:
+            logger.warning("Password service busy, asking client to retry")
+            return jsonify({"error": "Too many login attempts in progress, please retry"}), 503, {"Retry-After": "1"}
         except Exception as e:
             logger.error(f"Password reset error: {e}")
             return jsonify({"error": "Password reset failed"}), 500
 
     @auth_bp.route('/api/auth/get-security-question', methods=['GET'])
+    @rate_limited
     def get_security_question():
         """Get security question for a username"""
         try:
@@ -344,50 +341,45 @@ def init_auth_routes(app, csv_file_path):
             if not username:
                 return jsonify({"error": "Username is required"}), 400
             
-            # Read from CSV to get security question
-            import csv
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for customer in reader:
-                    if customer['username'] == username:
-                        return jsonify({
-                            "security_question": customer.get('security_question', '')
-                        })
+            customer = banking_assistant.get_customer_by_username(username)
+            if customer is None:
+                return jsonify({"error": "User not found"}), 404
             
-            return jsonify({"error": "User not found"}), 404
+            return jsonify({
+                "security_question": customer.get('security_question') or ''
+            })
             
         except Exception as e:
             logger.error(f"Get security question error: {e}")
             return jsonify({"error": "Failed to get security question"}), 500
 
     @auth_bp.route('/api/auth/verify-security-question', methods=['POST'])
+    @rate_limited
     def verify_security_question():
         """Verify security question answer"""
         try:
-            data = request.get_json()
+            data = json_object(request)
+            if data is None:
+                return jsonify({"error": "Request body must be a JSON object"}), 400
             username = data.get('username', '').strip()
             answer = data.get('answer', '').strip()
             
             if not username or not answer:
                 return jsonify({"error": "Username and answer are required"}), 400
             
-            # Read from CSV to verify security answer
-            import csv
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for customer in reader:
-                    if customer['username'] == username:
-                        # Check security answer (case-insensitive)
-                        if customer.get('security_answer', '').lower() == answer.lower():
-                            return jsonify({
-                                "success": True,
-                                "message": "Security question verified",
-                                "security_question": customer.get('security_question', '')
-                            })
-                        else:
-                            return jsonify({"error": "Incorrect answer"}), 401
-            
-            return jsonify({"error": "User not found"}), 404
+            customer = banking_assistant.get_customer_by_username(username)
+            if customer is None:
+                return jsonify({"error": "User not found"}), 404
+            
+            # Check security answer (case-insensitive)
+            if (customer.get('security_answer') or '').lower() != answer.lower():
+                return jsonify({"error": "Incorrect answer"}), 401
+            
+            return jsonify({
+                "success": True,
+                "message": "Security question verified",
+                "security_question": customer.get('security_question') or ''
+            })
             
         except Exception as e:
             logger.error(f"Security question verification error: {e}")
@@ -396,22 +388,22 @@ def init_auth_routes(app, csv_file_path):
     @auth_bp.route('/api/customer/usernames', methods=['GET'])
     def list_customer_usernames():
         """List available customer usernames for login"""
-        try:
-            import csv
-            customers = []
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for customer in reader:
-                    customers.append({
-                        "username": customer['username'], 
-                        "name": f"{customer['first_name']} {customer['last_name']}"
-                    })
-            
-            return jsonify({
+        def build():
+            customers = [{
+                "username": customer['username'],
+                "name": f"{customer['first_name']} {customer['last_name']}"
+            } for customer in banking_assistant.customers]
+            return {
                 "usernames": customers,
                 "count": len(customers),
-                "note": "Use the password_hash from CSV as the password for login"
-            })
+                "note": ("Log in with the password_hash value from the CSV: plaintext rows store the password "
+                         "itself and bcrypt/argon2/scrypt hashes are accepted as typed while "
+                         "auth.accept_stored_hash_as_password is on. Legacy sha256 rows need the original password.")
+            }
+        
+        # Serialized once per version of the customer data
+        try:
+            return cached_json('customer_usernames', banking_assistant.data_version, build)
         except Exception as e:
             logger.error(f"Error listing usernames: {e}")
             return jsonify({"error": "Failed to list usernames"}), 500
@@ -1,10 +1,10 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify
 import logging
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.auth_utils import login_required
+from utils.auth_utils import login_required, current_customer
 from utils.chat_utils import send_chat_message, test_ollama_connection
 
 logger = logging.getLogger(__name__)
@@ -27,7 +27,7 @@ def init_chat_routes(app, ollama_endpoint, model_name):
                 return jsonify({"error": "Message is required"}), 400
             
             # Get customer-specific data if available
-            customer_data = session.get('customer_data')
+            customer_data = current_customer()
             
             # Send message to Ollama
             result = send_chat_message(
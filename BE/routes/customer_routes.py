@@ -1,36 +1,52 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, Response
 import logging
+import math
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.auth_utils import login_required
+from utils.auth_utils import login_required, current_customer
 from models.banking_assistant import BankingAssistant
+from models.customer import Customer
+from models.customer_query import InvalidCursorError
+import numpy as np
+from models.loan_math import amortization_schedule, batch_payments, schedule_rows, SCHEDULE_COLUMNS
+from utils.request_utils import parse_transaction_args, parse_numeric_axis, parse_positive_int
+from utils.export_utils import stream_csv
+from utils.json_provider import cached_json
 
 logger = logging.getLogger(__name__)
 
+# Largest payment matrix a single batch request may ask for
+MAX_BATCH_CELLS = 100000
+
 customer_bp = Blueprint('customer', __name__)
 
-def init_customer_routes(app, banking_assistant):
+def public_customer(customer):
+    """Customer records go out without credentials; error payloads pass through unchanged"""
+    return customer.to_public_dict() if isinstance(customer, Customer) else customer
+
+def init_customer_routes(app, banking_assistant, repository):
     """Initialize customer routes"""
     
     @customer_bp.route('/api/customer/current', methods=['GET'])
     @login_required
     def get_current_customer():
         """Get the current logged-in customer's profile"""
-        if 'customer_data' in session:
-            return jsonify(session['customer_data'])
+        customer = current_customer()
+        if customer:
+            return jsonify(customer.to_public_dict())
         else:
             # Fallback for non-customer users (admin, banker, demo)
             customer = banking_assistant.get_random_customer()
-            return jsonify(customer)
+            return jsonify(public_customer(customer))
 
     @customer_bp.route('/api/customer/random', methods=['GET'])
     @login_required
     def get_random_customer():
         """Get a random customer profile"""
         customer = banking_assistant.get_random_customer()
-        return jsonify(customer)
+        return jsonify(public_customer(customer))
 
     @customer_bp.route('/api/customer/search', methods=['GET'])
     @login_required
@@ -40,19 +56,29 @@ def init_customer_routes(app, banking_assistant):
         if not query:
             return jsonify({"error": "Search query is required"}), 400
         
-        results = banking_assistant.search_customers(query)
+        try:
+            page = int(request.args.get('page', 1))
+            page_size = min(max(int(request.args.get('page_size', 10)), 1), 100)
+        except ValueError:
+            return jsonify({"error": "Invalid pagination parameters"}), 400
+        
+        results = banking_assistant.search_customers(query, page, page_size)
         return jsonify({
             "query": query,
-            "results": results,
-            "count": len(results)
+            "results": [customer.to_public_dict() for customer in results['results']],
+            "scores": results['scores'],
+            "count": len(results['results']),
+            "total": results['total'],
+            "page": results['page'],
+            "page_size": results['page_size']
         })
 
     @customer_bp.route('/api/customer/stats', methods=['GET'])
     @login_required
     def get_customer_stats():
         """Get customer statistics"""
-        stats = banking_assistant.get_customer_stats()
-        return jsonify(stats)
+        # Serialized once per version of the customer data
+        return cached_json('customer_stats', banking_assistant.data_version, banking_assistant.get_customer_stats)
 
     @customer_bp.route('/api/customer/loan-type/<loan_type>', methods=['GET'])
     @login_required
@@ -61,7 +87,7 @@ def init_customer_routes(app, banking_assistant):
         customers = banking_assistant.get_customers_by_loan_type(loan_type)
         return jsonify({
             "loan_type": loan_type,
-            "customers": customers,
+            "customers": [customer.to_public_dict() for customer in customers],
             "count": len(customers)
         })
 
@@ -72,7 +98,7 @@ def init_customer_routes(app, banking_assistant):
         customers = banking_assistant.get_customers_by_risk_level(risk_level)
         return jsonify({
             "risk_level": risk_level,
-            "customers": customers,
+            "customers": [customer.to_public_dict() for customer in customers],
             "count": len(customers)
         })
 
@@ -86,13 +112,113 @@ def init_customer_routes(app, banking_assistant):
             rate = float(data.get('rate', 0))
             years = int(data.get('years', 0))
             
-            if principal <= 0 or rate < 0 or years <= 0:
+            if not (math.isfinite(principal) and math.isfinite(rate)) or principal <= 0 or rate < 0 or years <= 0:
                 return jsonify({"error": "Invalid loan parameters"}), 400
             
             result = banking_assistant.calculate_loan_payment(principal, rate, years)
             return jsonify(result)
             
-        except (ValueError, TypeError) as e:
+        except (ValueError, TypeError, OverflowError) as e:
+            return jsonify({"error": "Invalid input parameters"}), 400
+        except Exception as e:
+            return jsonify({"error": f"Calculation error: {str(e)}"}), 500
+
+    @customer_bp.route('/api/loan/calculate/batch', methods=['POST'])
+    @login_required
+    def calculate_loan_batch():
+        """Calculate payments for a whole grid (or zipped list) of loan scenarios in one pass"""
+        try:
+            data = request.get_json()
+            principals = np.array(parse_numeric_axis(data.get('principals', data.get('principal')), 'principals'))
+            rates = np.array(parse_numeric_axis(data.get('rates', data.get('rate')), 'rates'))
+            years = np.array(parse_numeric_axis(data.get('years'), 'years'))
+            mode = data.get('mode', 'grid')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except (TypeError, AttributeError):
+            return jsonify({"error": "Invalid input parameters"}), 400
+        
+        if mode not in ('grid', 'zip'):
+            return jsonify({"error": "mode must be 'grid' or 'zip'"}), 400
+        # NaN compares false against every bound, so non-finite values are rejected first;
+        # a term has to round to at least one monthly payment
+        if not (np.isfinite(principals).all() and np.isfinite(rates).all() and np.isfinite(years).all()):
+            return jsonify({"error": "Invalid loan parameters"}), 400
+        if (principals <= 0).any() or (rates < 0).any() or (np.rint(years * 12) < 1).any() or (years > 50).any():
+            return jsonify({"error": "Invalid loan parameters"}), 400
+        
+        if mode == 'grid':
+            cells = principals.size * rates.size * years.size
+            # Axes: principal x rate x term
+            principals = principals.reshape(-1, 1, 1)
+            rates = rates.reshape(1, -1, 1)
+            years = years.reshape(1, 1, -1)
+        else:
+            sizes = {principals.size, rates.size, years.size} - {1}
+            if len(sizes) > 1:
+                return jsonify({"error": "In zip mode all lists must have the same length"}), 400
+            cells = max(principals.size, rates.size, years.size)
+        if cells > MAX_BATCH_CELLS:
+            return jsonify({"error": f"Batch too large: {cells} scenarios (max {MAX_BATCH_CELLS})"}), 400
+        
+        try:
+            result = batch_payments(principals, rates, years)
+        except Exception as e:
+            return jsonify({"error": f"Calculation error: {str(e)}"}), 500
+        
+        return jsonify({
+            "mode": mode,
+            "axes": {
+                "principals": principals.ravel().tolist(),
+                "rates": rates.ravel().tolist(),
+                "years": years.ravel().tolist()
+            },
+            "shape": list(result['monthly_payment'].shape),
+            "monthly_payment": result['monthly_payment'].tolist(),
+            "total_payment": result['total_payment'].tolist(),
+            "total_interest": result['total_interest'].tolist()
+        })
+
+    @customer_bp.route('/api/loan/schedule', methods=['POST'])
+    @login_required
+    def loan_schedule():
+        """Full amortization schedule as columnar JSON, or streamed as CSV"""
+        try:
+            data = request.get_json()
+            principal = float(data.get('principal', 0))
+            rate = float(data.get('rate', 0))
+            years = int(data.get('years', 0))
+            extra_payment = float(data.get('extra_payment', 0))
+            limit = data.get('limit')
+            output_format = data.get('format', 'json')
+            
+            if not all(math.isfinite(value) for value in (principal, rate, extra_payment)):
+                return jsonify({"error": "Invalid loan parameters"}), 400
+            if principal <= 0 or rate < 0 or years <= 0 or years > 50 or extra_payment < 0:
+                return jsonify({"error": "Invalid loan parameters"}), 400
+            if output_format not in ('json', 'csv'):
+                return jsonify({"error": "format must be 'json' or 'csv'"}), 400
+            if limit is not None:
+                try:
+                    limit = parse_positive_int(limit, 'limit')
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+            
+            schedule = amortization_schedule(principal, rate, years, extra_payment)
+            
+            if output_format == 'csv':
+                response = Response(
+                    stream_csv(schedule_rows(schedule, limit), list(SCHEDULE_COLUMNS)),
+                    mimetype='text/csv'
+                )
+                response.headers['Content-Disposition'] = 'attachment; filename="amortization_schedule.csv"'
+                return response
+            
+            if limit is not None:
+                schedule['columns'] = {name: values[:limit] for name, values in schedule['columns'].items()}
+            return jsonify(schedule)
+            
+        except (ValueError, TypeError, AttributeError, OverflowError) as e:
             return jsonify({"error": "Invalid input parameters"}), 400
         except Exception as e:
             return jsonify({"error": f"Calculation error: {str(e)}"}), 500
@@ -101,8 +227,8 @@ def init_customer_routes(app, banking_assistant):
     @login_required
     def get_my_loan():
         """Get current customer's loan information"""
-        if 'customer_data' in session:
-            customer = session['customer_data']
+        customer = current_customer()
+        if customer:
             if customer['has_loans'] == 'yes':
                 return jsonify({
                     "has_loan": True,
@@ -119,12 +245,49 @@ def init_customer_routes(app, banking_assistant):
         else:
             return jsonify({"error": "No customer data available"}), 400
 
+    @customer_bp.route('/api/customer/my-loans', methods=['GET'])
+    @login_required
+    def get_my_loans():
+        """Get every loan held by the current customer"""
+        customer = current_customer()
+        if customer:
+            loans = repository.get_loans(customer['customer_id'])
+            return jsonify({
+                "loans": loans,
+                "count": len(loans),
+                "total_loan_amount": round(sum(loan['loan_amount'] for loan in loans), 2),
+                "total_monthly_payment": round(sum(loan['monthly_payment'] for loan in loans), 2)
+            })
+        else:
+            return jsonify({"error": "No customer data available"}), 400
+
+    @customer_bp.route('/api/customer/transactions', methods=['GET'])
+    @login_required
+    def get_my_transactions():
+        """Get the current customer's transaction history (date range, keyset pagination)"""
+        customer = current_customer()
+        if not customer:
+            return jsonify({"error": "No customer data available"}), 400
+        
+        try:
+            params = parse_transaction_args(request.args)
+            page = repository.get_transaction_page(customer['customer_id'], **params)
+        except (ValueError, InvalidCursorError) as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify({
+            "transactions": page['transactions'],
+            "count": len(page['transactions']),
+            "total": page['total'],
+            "next_cursor": page['next_cursor']
+        })
+
     @customer_bp.route('/api/customer/my-account', methods=['GET'])
     @login_required
     def get_my_account():
         """Get current customer's account summary"""
-        if 'customer_data' in session:
-            customer = session['customer_data']
+        customer = current_customer()
+        if customer:
             return jsonify({
                 "name": f"{customer['first_name']} {customer['last_name']}",
                 "account_type": customer['account_type'],
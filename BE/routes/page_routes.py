@@ -1,26 +1,29 @@
-from flask import Blueprint, request, jsonify, session, redirect, send_file
+from flask import Blueprint, request, jsonify, redirect, send_file
 import logging
 import os
-from datetime import datetime
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.auth_utils import login_required_page
+from utils.auth_utils import login_required_page, current_session, get_current_session_data
+from utils.static_assets import init_static_assets
+from utils.file_watcher import DEFAULT_WATCH_INTERVAL
 
 logger = logging.getLogger(__name__)
 
 page_bp = Blueprint('pages', __name__)
 
-def init_page_routes(app, frontend_path):
+def init_page_routes(app, frontend_path, reload_interval=DEFAULT_WATCH_INTERVAL):
     """Initialize page routes"""
     
+    # Frontend files are held in memory, precompressed, and reloaded when one changes on disk
+    assets = init_static_assets(app, frontend_path, reload_interval)
+    
     @page_bp.route('/')
     def index():
         """Serve the main index page"""
         try:
-            index_file_path = os.path.join(frontend_path, "index.html")
-            return send_file(index_file_path, mimetype='text/html')
+            return assets.response("index.html")
         except FileNotFoundError:
             # Fallback to login page if index.html doesn't exist
             return redirect('/login.html')
@@ -29,8 +32,7 @@ def init_page_routes(app, frontend_path):
     def test_auth_page():
         """Serve the authentication test page"""
         try:
-            test_file_path = os.path.join(frontend_path, "test-auth.html")
-            return send_file(test_file_path, mimetype='text/html')
+            return assets.response("test-auth.html")
         except FileNotFoundError:
             return "Test page not found", 404
 
@@ -65,36 +67,26 @@ def init_page_routes(app, frontend_path):
     def login_page():
         """Serve the login page"""
         # Check if user is already authenticated
-        if 'user_id' in session:
-            user_role = session.get('user_role')
+        session_data = get_current_session_data(request)
+        if session_data:
+            user_role = session_data.get('user_role')
             if user_role == 'admin':
                 return redirect('/admin')
             else:
                 return redirect('/chat')
         
+        # Revalidated on every load, so the redirect above always runs first
         try:
-            login_file_path = os.path.join(frontend_path, "login.html")
-            logger.info(f"Login page path: {login_file_path}")
-            logger.info(f"File exists: {os.path.exists(login_file_path)}")
-            
-            response = send_file(login_file_path, mimetype='text/html')
-            
-            # Add cache-busting headers to prevent caching
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            
-            return response
-        except FileNotFoundError:
-            logger.error(f"Login page not found at: {login_file_path}")
+            return assets.response("login.html")
+        except FileNotFoundError:
+            logger.error(f"Login page not found in {frontend_path}")
             return "Login page not found", 404
 
     @page_bp.route('/images/<filename>')
     def serve_image(filename):
         """Serve images from the FE/images directory"""
         try:
-            image_file_path = os.path.join(frontend_path, "images", filename)
-            return send_file(image_file_path)
+            return assets.response(f"images/{filename}")
         except FileNotFoundError:
             return "Image not found", 404
 
@@ -102,8 +94,7 @@ def init_page_routes(app, frontend_path):
     def serve_css(filename):
         """Serve CSS files from the FE/css directory"""
         try:
-            css_file_path = os.path.join(frontend_path, "css", filename)
-            return send_file(css_file_path, mimetype='text/css')
+            return assets.response(f"css/{filename}", mimetype='text/css')
         except FileNotFoundError:
             return "CSS file not found", 404
 
@@ -111,8 +102,7 @@ def init_page_routes(app, frontend_path):
     def serve_js(filename):
         """Serve JavaScript files from the FE/js directory"""
         try:
-            js_file_path = os.path.join(frontend_path, "js", filename)
-            return send_file(js_file_path, mimetype='application/javascript')
+            return assets.response(f"js/{filename}", mimetype='application/javascript')
         except FileNotFoundError:
             return "JavaScript file not found", 404
 
@@ -120,8 +110,7 @@ def init_page_routes(app, frontend_path):
     def serve_bank_logo():
         """Serve the bank logo image"""
         try:
-            logo_file_path = os.path.join(frontend_path, "images", "Gemini_Generated_Image_b2kiqjb2kiqjb2ki.png")
-            return send_file(logo_file_path, mimetype='image/png')
+            return assets.response("images/Gemini_Generated_Image_b2kiqjb2kiqjb2ki.png", mimetype='image/png')
         except FileNotFoundError:
             return "Logo not found", 404
 
@@ -130,8 +119,7 @@ def init_page_routes(app, frontend_path):
     def loan_calculator():
         """Serve the loan calculator page"""
         try:
-            loan_file_path = os.path.join(frontend_path, "loan-calculator.html")
-            return send_file(loan_file_path, mimetype='text/html')
+            return assets.response("loan-calculator.html", private=True)
         except FileNotFoundError:
             return "Loan calculator not found", 404
 
@@ -140,18 +128,7 @@ def init_page_routes(app, frontend_path):
     def chat_page():
         """Serve the chat page (requires authentication)"""
         try:
-            chat_file_path = os.path.join(frontend_path, "small-bank-chat-backend.html")
-            response = send_file(chat_file_path, mimetype='text/html')
-            
-            # Add cache-busting headers with unique timestamp
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            response.headers['Last-Modified'] = f'Mon, 04 Aug 2025 12:02:{timestamp} GMT'
-            response.headers['ETag'] = f'v1.0.4-{timestamp}'
-            
-            return response
+            return assets.response("small-bank-chat-backend.html", private=True)
         except FileNotFoundError:
             return "Chat page not found", 404
 
@@ -160,15 +137,14 @@ def init_page_routes(app, frontend_path):
     def admin_page():
         """Serve the admin dashboard page (requires admin authentication)"""
         # Check if user is admin (session check already done by decorator)
-        user_role = session.get('user_role')
+        user_role = current_session().get('user_role')
         
         # Check if user is admin
         if user_role != 'admin':
             return redirect('/chat')
         
         try:
-            admin_file_path = os.path.join(frontend_path, "admin_dashboard.html")
-            return send_file(admin_file_path, mimetype='text/html')
+            return assets.response("admin_dashboard.html", private=True)
         except FileNotFoundError:
             return "Admin dashboard not found", 404
 
@@ -177,8 +153,7 @@ def init_page_routes(app, frontend_path):
     def admin_dashboard_page():
         """Serve the admin dashboard page"""
         try:
-            admin_file_path = os.path.join(frontend_path, "admin_dashboard.html")
-            return send_file(admin_file_path, mimetype='text/html')
+            return assets.response("admin_dashboard.html", private=True)
         except FileNotFoundError:
             return "Admin dashboard not found", 404
 
@@ -186,40 +161,18 @@ def init_page_routes(app, frontend_path):
     def admin_login_page():
         """Serve the admin login page"""
         try:
-            admin_login_file_path = os.path.join(frontend_path, "admin_login.html")
-            logger.info(f"Admin login page path: {admin_login_file_path}")
-            logger.info(f"File exists: {os.path.exists(admin_login_file_path)}")
-            
-            response = send_file(admin_login_file_path, mimetype='text/html')
-            
-            # Add cache-busting headers to prevent caching
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            
-            return response
-        except FileNotFoundError:
-            logger.error(f"Admin login page not found at: {admin_login_file_path}")
+            return assets.response("admin_login.html")
+        except FileNotFoundError:
+            logger.error(f"Admin login page not found in {frontend_path}")
             return "Admin login page not found", 404
 
     @page_bp.route('/customer_profile.html')
     def customer_profile_page():
         """Serve the customer profile page"""
         try:
-            profile_file_path = os.path.join(frontend_path, "customer_profile.html")
-            logger.info(f"Customer profile path: {profile_file_path}")
-            logger.info(f"File exists: {os.path.exists(profile_file_path)}")
-            
-            response = send_file(profile_file_path, mimetype='text/html')
-            
-            # Add cache-busting headers
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            
-            return response
-        except FileNotFoundError:
-            logger.error(f"Customer profile not found at: {profile_file_path}")
+            return assets.response("customer_profile.html")
+        except FileNotFoundError:
+            logger.error(f"Customer profile not found in {frontend_path}")
             return "Customer profile not found", 404
 
     @page_bp.route('/test_customer_profile.html')
@@ -227,24 +180,13 @@ def init_page_routes(app, frontend_path):
     def test_customer_profile_page():
         """Serve the customer profile test page"""
         # Check if user is admin
-        if session.get('user_role') != 'admin':
+        if current_session().get('user_role') != 'admin':
             return redirect('/login.html')
         
         try:
-            test_file_path = os.path.join(frontend_path, "test_customer_profile.html")
-            logger.info(f"Test customer profile path: {test_file_path}")
-            logger.info(f"File exists: {os.path.exists(test_file_path)}")
-            
-            response = send_file(test_file_path, mimetype='text/html')
-            
-            # Add cache-busting headers
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            
-            return response
-        except FileNotFoundError:
-            logger.error(f"Test customer profile not found at: {test_file_path}")
+            return assets.response("test_customer_profile.html", private=True)
+        except FileNotFoundError:
+            logger.error(f"Test customer profile not found in {frontend_path}")
             return "Test customer profile not found", 404
 
     # Register the blueprint
@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify
 import logging
 from datetime import datetime
 
+from utils.auth_utils import get_current_session_data
+
 logger = logging.getLogger(__name__)
 
 utility_bp = Blueprint('utility', __name__)
@@ -12,14 +14,15 @@ def init_utility_routes(app, banking_assistant):
     @utility_bp.route('/api/health', methods=['GET'])
     def health_check():
         """Health check endpoint"""
+        session_data = get_current_session_data(request) or {}
         return jsonify({
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "customer_count": len(banking_assistant.customers),
             "session_info": {
-                "has_session": 'user_id' in session,
-                "user_id": session.get('user_id'),
-                "user_role": session.get('user_role')
+                "has_session": 'user_id' in session_data,
+                "user_id": session_data.get('user_id'),
+                "user_role": session_data.get('user_role')
             }
         })
 
@@ -35,11 +38,27 @@ def init_utility_routes(app, banking_assistant):
             {"method": "POST", "path": "/api/chat", "description": "Send chat message to AI assistant"},
             {"method": "GET", "path": "/api/customer/random", "description": "Get random customer profile"},
             {"method": "GET", "path": "/api/customer/stats", "description": "Get customer statistics"},
-            {"method": "GET", "path": "/api/customer/search?q=<query>", "description": "Search customers"},
+            {"method": "GET", "path": "/api/customer/search?q=<query>&page=<n>&page_size=<n>", "description": "Search customers (ranked, paginated)"},
             {"method": "GET", "path": "/api/customer/loan-type/<type>", "description": "Get customers by loan type"},
             {"method": "GET", "path": "/api/customer/risk-level/<level>", "description": "Get customers by risk level"},
             {"method": "GET", "path": "/api/customer/usernames", "description": "List customer usernames for login"},
+            {"method": "GET", "path": "/api/admin/customers?cursor=&limit=&sort=&fields=&status=&risk=&account_type=&loan_type=&q=", "description": "Paginated customer listing (admin)"},
+            {"method": "GET", "path": "/api/admin/export?format=csv|ndjson&gzip=&fields=", "description": "Streaming customer export (admin)"},
+            {"method": "POST", "path": "/api/admin/customers/import?batch_size=&dry_run=", "description": "Bulk import customers from CSV (admin)"},
+            {"method": "GET", "path": "/api/admin/customers/suggest?prefix=<prefix>", "description": "Typeahead customer suggestions (admin)"},
+            {"method": "GET", "path": "/api/customer/my-loans", "description": "List all loans of the current customer"},
+            {"method": "GET", "path": "/api/admin/customer/<id>/details?include=profile,account,loans,transactions,support_issues", "description": "Customer joined with related tables (admin)"},
+            {"method": "GET", "path": "/api/customer/transactions?from=&to=&cursor=&limit=&order=", "description": "Transaction history of the current customer"},
+            {"method": "GET", "path": "/api/admin/customer/<id>/transactions?from=&to=&cursor=&limit=&order=", "description": "Transaction history of any customer (admin)"},
+            {"method": "GET", "path": "/api/admin/analytics/transactions?granularity=daily|weekly|monthly&from=&to=", "description": "Transaction volume rollups (admin)"},
+            {"method": "GET", "path": "/api/admin/analytics/loans?months=&group_by=loan_type,risk_level", "description": "Projected loan portfolio cash flows (admin)"},
+            {"method": "GET", "path": "/api/admin/sessions", "description": "Session store statistics (admin)"},
+            {"method": "GET", "path": "/api/admin/auth/passwords", "description": "Password hashing metrics (admin)"},
+            {"method": "GET", "path": "/api/admin/auth/rate-limits", "description": "Login rate limiter statistics (admin)"},
+            {"method": "GET", "path": "/api/admin/json", "description": "JSON encoder and response cache metrics (admin)"},
             {"method": "POST", "path": "/api/loan/calculate", "description": "Calculate loan payment"},
+            {"method": "POST", "path": "/api/loan/calculate/batch", "description": "Payment matrix for a grid of principals, rates and terms"},
+            {"method": "POST", "path": "/api/loan/schedule", "description": "Full amortization schedule (columnar JSON or CSV)"},
             {"method": "GET", "path": "/api/endpoints", "description": "List all endpoints"}
         ]
         return jsonify({"endpoints": endpoints})
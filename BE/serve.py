@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Pre-fork production launcher
+Builds the app and loads the customer data once in the master process, then
+forks workers that share it copy-on-write and accept on one listening socket
+"""
+
+import gc
+import os
+import sys
+import signal
+import socket
+import logging
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.serving import make_server
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Background threads started by create_app; threads don't survive fork, so each worker restarts them
+SWEEPERS = ('session_sweeper', 'reset_token_sweeper', 'customer_watcher', 'static_watcher')
+BACKGROUND_THREADS = SWEEPERS + ('password_rehash_writer',)
+
+
+def use_shared_state(state_dir: str):
+    """Point sessions and rate limits at SQLite files every worker can see"""
+    for store, path_var, filename in (('SESSION_STORE', 'SESSION_SQLITE_PATH', 'sessions.sqlite3'),
+                                      ('RATE_LIMIT_STORE', 'RATE_LIMIT_SQLITE_PATH', 'rate_limits.sqlite3')):
+        if os.environ.setdefault(store, 'sqlite') != 'sqlite':
+            raise SystemExit(f"{store}={os.environ[store]} cannot be shared between workers; use sqlite")
+        os.environ.setdefault(path_var, os.path.join(state_dir, filename))
+
+
+def run_worker(app, listener: socket.socket, host: str, port: int):
+    """Serve requests in a forked worker until told to stop"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name in BACKGROUND_THREADS:
+        app.extensions[name].start()
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+    server.serve_forever()
+
+
+def main():
+    """Load once, fork N workers and keep them running"""
+    parser = argparse.ArgumentParser(description="Run the backend with pre-forked worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--host", default=None, help="defaults to app.host from the config")
+    parser.add_argument("--port", type=int, default=None, help="defaults to app.port from the config")
+    parser.add_argument("--state-dir", default=tempfile.gettempdir(),
+                        help="directory for the shared session and rate limit databases")
+    args = parser.parse_args()
+
+    use_shared_state(args.state_dir)
+
+    from app_new import create_app
+    from utils.worker_sync import WriteCoordinator, init_worker_sync
+
+    app, banking_assistant, config = create_app()
+    init_worker_sync(app, WriteCoordinator(), banking_assistant)
+    host = args.host or config.get_app_host()
+    port = args.port or config.get_app_port()
+
+    listener = socket.create_server((host, port), backlog=1024)
+    listener.set_inheritable(True)
+
+    # Fork with no sweep or reload running, so no worker inherits a held store lock
+    for name in SWEEPERS:
+        app.extensions[name].stop()
+    # Move everything loaded so far out of the collector's reach; otherwise every
+    # GC pass in a worker writes to the shared pages and un-shares them
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, listener, host, port)
+            finally:
+                os._exit(0)
+        workers.add(pid)
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                # Already gone, e.g. the whole process group was signalled
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(args.workers):
+        spawn()
+    logger.info(f"Serving {len(banking_assistant.customers)} customers on http://{host}:{port} "
+                f"with {args.workers} workers")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting")
+            spawn()
+
+    listener.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import unittest
+from datetime import date
+
+from models.loan_portfolio import PAID_OFF_TOLERANCE, LoanPortfolio
+
+LOAN_TYPES = ('auto_loan', 'mortgage', 'personal_loan', 'student_loan', 'business_loan')
+RISK_LEVELS = ('low', 'medium', 'high')
+MONTHS = 120
+
+# Projected amounts are rounded to the cent, so they may differ from the ledger by half a cent
+# plus float noise; loan counts must match exactly
+AMOUNT_TOLERANCE = 0.01
+COUNT_TOLERANCE = 0
+
+
+def loan(number: int, principal: float, payment: float, rate) -> dict:
+    """A customer row holding one loan, spread over the segments by its number"""
+    return {'has_loans': 'yes', 'loan_amounts': principal, 'monthly_payments': payment,
+            'interest_rate': rate, 'loan_types': LOAN_TYPES[number % 5], 'risk_level': RISK_LEVELS[number % 3]}
+
+
+def amortized_payment(principal: float, annual_rate: float, term: int) -> float:
+    """Level payment for a term, rounded to the cent like the customer data"""
+    r = annual_rate / 1200
+    return round(principal * r / (1 - (1 + r) ** -term), 2)
+
+
+def fixed_book(distinct_rates: bool) -> list:
+    """Loans with shared or per-loan rates, plus zero-rate, blank-rate and non-amortizing loans"""
+    rows = []
+    for number in range(300):
+        rate = round(1 + (number * 7.3 if distinct_rates else number % 6 * 3.1) % 18, 4)
+        principal = 2000.0 + number * 997 % 250000
+        term = (12, 36, 60, 90, 150, 240)[number % 6]
+        rows.append(loan(number, principal, amortized_payment(principal, rate, term), str(rate)))
+    rows += [
+        loan(300, 12000.0, 400.0, '0'),
+        loan(301, 5000.0, 250.0, ''),
+        loan(302, 10000.0, 150.0, '0'),
+        # 60/month does not cover 1% interest on 10000, so this balance grows
+        loan(303, 10000.0, 60.0, '12'),
+        loan(304, 0.004, 1.0, '5'),
+        {'has_loans': 'no', 'loan_amounts': 0, 'monthly_payments': 0, 'interest_rate': '',
+         'loan_types': '', 'risk_level': 'low'}
+    ]
+    return rows
+
+
+def ledger(rows: list, months: int, group_by: tuple) -> dict:
+    """Step every loan through every month, the straightforward way, summing by segment"""
+    columns = ('opening_balance', 'interest', 'principal', 'payment', 'closing_balance', 'active_loans')
+    segments = {}
+    for row in rows:
+        if row['has_loans'] != 'yes' or row['loan_amounts'] <= 0:
+            continue
+        fields = {'loan_type': row['loan_types'], 'risk_level': row['risk_level']}
+        key = tuple(fields[g] for g in group_by)
+        series = segments.setdefault(key, {column: [0.0] * months for column in columns})
+        r = float(row['interest_rate'] or 0) / 1200
+        balance = row['loan_amounts']
+        for k in range(months):
+            if balance <= PAID_OFF_TOLERANCE:
+                break
+            interest = balance * r
+            paid = min(row['monthly_payments'], balance + interest)
+            closing = balance + interest - paid
+            if closing <= PAID_OFF_TOLERANCE:
+                # The last payment clears the sub-cent remainder as well
+                paid, closing = balance + interest, 0.0
+            for column, value in zip(columns, (balance, interest, paid - interest, paid, closing, 1)):
+                series[column][k] += value
+            balance = closing
+    return segments
+
+
+class LoanPortfolioTest(unittest.TestCase):
+
+    def assert_matches_ledger(self, rows: list, group_by: tuple):
+        portfolio = LoanPortfolio()
+        portfolio.build(rows)
+        projection = portfolio.project(MONTHS, group_by, start=date(2024, 1, 15))
+        expected = ledger(rows, MONTHS, group_by)
+
+        self.assertEqual(projection['periods'][:2], ['2024-02', '2024-03'])
+        self.assertEqual(len(projection['segments']), len(expected))
+        for segment in projection['segments']:
+            key = tuple(segment[g] for g in group_by)
+            for column, values in expected[key].items():
+                tolerance = COUNT_TOLERANCE if column == 'active_loans' else AMOUNT_TOLERANCE
+                worst = max(abs(got - want) for got, want in zip(segment[column], values))
+                self.assertLessEqual(worst, tolerance, f"{column} of {key}")
+        return portfolio
+
+    def test_shared_rates_use_exact_cohorts(self):
+        rows = fixed_book(distinct_rates=False)
+        portfolio = self.assert_matches_ledger(rows, ('loan_type', 'risk_level'))
+        segment_codes, segment_keys = portfolio._segments(('loan_type', 'risk_level'))
+        offsets = portfolio._cohorts(segment_codes, len(segment_keys), MONTHS)[3]
+        self.assertIsNone(offsets)
+
+    def test_distinct_rates_use_rate_bands(self):
+        rows = fixed_book(distinct_rates=True)
+        portfolio = self.assert_matches_ledger(rows, ('loan_type',))
+        segment_codes, segment_keys = portfolio._segments(('loan_type',))
+        offsets = portfolio._cohorts(segment_codes, len(segment_keys), MONTHS)[3]
+        self.assertIsNotNone(offsets)
+
+    def test_sub_cent_remainders_do_not_keep_loans_open(self):
+        portfolio = LoanPortfolio()
+        # 36 payments of 238.66 leave about four tenths of a cent on this loan
+        portfolio.build([loan(0, 7845.0, 238.66, '6')])
+        self.assertEqual(portfolio.payoff_months().tolist(), [36])
+        self.assertEqual(portfolio.project(40)['summary']['open_after_horizon'], 0)
+
+    def test_rejects_bad_arguments(self):
+        portfolio = LoanPortfolio()
+        portfolio.build(fixed_book(distinct_rates=False))
+        with self.assertRaises(ValueError):
+            portfolio.project(0)
+        with self.assertRaises(ValueError):
+            portfolio.project(MONTHS, ('branch',))
+
+
+if __name__ == '__main__':
+    unittest.main()
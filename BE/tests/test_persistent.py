@@ -0,0 +1,352 @@
+import random
+import unittest
+
+from models.customer import CUSTOMER_FIELDS, Customer
+from models.customer_dataset import CustomerDataset
+from models.persistent import (CHUNK_SIZE, MAX_SHARD_FILL, SHARD_SIZE, SHARD_THRESHOLD, ChunkedList,
+                               ShardedDict, ShardedSet, SortedChunkedList, _Sharded, shard_if_large)
+
+# Lengths around the chunk boundaries
+BOUNDARY_LENGTHS = (0, 1, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE + 1, 2 * CHUNK_SIZE, 3 * CHUNK_SIZE + 7)
+
+
+def sorted_chunks(items: SortedChunkedList):
+    """The chunk lists of a SortedChunkedList, to check how it split or merged"""
+    return items._chunks
+
+
+class ChunkedListTest(unittest.TestCase):
+
+    def test_matches_list_at_chunk_boundaries(self):
+        for length in BOUNDARY_LENGTHS:
+            expected = list(range(length))
+            items = ChunkedList(expected)
+            self.assertEqual(len(items), length)
+            self.assertEqual(list(items), expected)
+            self.assertEqual([items[i] for i in range(length)], expected)
+            self.assertEqual(len(items.chunks), -(-length // CHUNK_SIZE))
+
+    def test_negative_and_out_of_range_indexes(self):
+        expected = list(range(CHUNK_SIZE + 5))
+        items = ChunkedList(expected)
+        for index in (-1, -2, -CHUNK_SIZE, -len(expected)):
+            self.assertEqual(items[index], expected[index])
+        for index in (len(expected), len(expected) + CHUNK_SIZE, -len(expected) - 1):
+            with self.assertRaises(IndexError):
+                items[index]
+            with self.assertRaises(IndexError):
+                items[index] = 0
+        items[-1] = 'last'
+        items[-len(expected)] = 'first'
+        self.assertEqual(items[0], 'first')
+        self.assertEqual(items[len(expected) - 1], 'last')
+        with self.assertRaises(IndexError):
+            ChunkedList()[0]
+
+    def test_slices(self):
+        expected = list(range(2 * CHUNK_SIZE + 3))
+        items = ChunkedList(expected)
+        for window in (slice(None), slice(5, CHUNK_SIZE + 5), slice(-10, None), slice(None, None, -3),
+                       slice(CHUNK_SIZE - 1, CHUNK_SIZE + 1), slice(10**6, None), slice(-10**6, 2)):
+            self.assertEqual(items[window], expected[window])
+
+    def test_append_across_chunk_boundary(self):
+        items = ChunkedList()
+        expected = []
+        for value in range(2 * CHUNK_SIZE + 1):
+            items.append(value)
+            expected.append(value)
+        self.assertEqual(list(items), expected)
+        self.assertEqual([len(chunk) for chunk in items.chunks], [CHUNK_SIZE, CHUNK_SIZE, 1])
+
+    def test_copy_leaves_source_unchanged(self):
+        for length in BOUNDARY_LENGTHS:
+            source = ChunkedList(range(length))
+            clone = source.copy()
+            if length:
+                clone[0] = 'changed'
+                clone[-1] = 'changed'
+            clone.extend(range(CHUNK_SIZE + 1))
+            self.assertEqual(list(source), list(range(length)))
+            self.assertEqual(len(clone), length + CHUNK_SIZE + 1)
+
+    def test_copy_shares_unwritten_chunks(self):
+        source = ChunkedList(range(3 * CHUNK_SIZE))
+        clone = source.copy()
+        clone[CHUNK_SIZE] = 'changed'
+        self.assertIs(clone.chunks[0], source.chunks[0])
+        self.assertIsNot(clone.chunks[1], source.chunks[1])
+        self.assertIs(clone.chunks[2], source.chunks[2])
+
+    def test_copy_of_copy(self):
+        first = ChunkedList(range(CHUNK_SIZE + 1))
+        second = first.copy()
+        second[0] = 'second'
+        third = second.copy()
+        third[0] = 'third'
+        third.append('appended')
+        self.assertEqual((first[0], second[0], third[0]), (0, 'second', 'third'))
+        self.assertEqual((len(first), len(second), len(third)), (CHUNK_SIZE + 1, CHUNK_SIZE + 1, CHUNK_SIZE + 2))
+
+
+class SortedChunkedListTest(unittest.TestCase):
+
+    def assert_matches(self, items: SortedChunkedList, expected):
+        expected = sorted(expected)
+        self.assertEqual(len(items), len(expected))
+        self.assertEqual(list(items), expected)
+        for chunk in sorted_chunks(items):
+            self.assertTrue(0 < len(chunk) <= 2 * CHUNK_SIZE)
+
+    def test_add_splits_full_chunks(self):
+        items = SortedChunkedList(range(CHUNK_SIZE))
+        expected = set(range(CHUNK_SIZE))
+        # Everything lands in the single chunk until it passes 2 * CHUNK_SIZE and splits
+        for value in range(3 * CHUNK_SIZE, CHUNK_SIZE - 1, -1):
+            items.add(value)
+            expected.add(value)
+        self.assert_matches(items, expected)
+        self.assertGreater(len(sorted_chunks(items)), 1)
+
+    def test_discard_drops_emptied_chunks(self):
+        items = SortedChunkedList(range(3 * CHUNK_SIZE))
+        for value in range(CHUNK_SIZE, 2 * CHUNK_SIZE):
+            self.assertTrue(items.discard(value))
+        self.assertFalse(items.discard(CHUNK_SIZE))
+        self.assertFalse(items.discard(10**9))
+        self.assert_matches(items, list(range(CHUNK_SIZE)) + list(range(2 * CHUNK_SIZE, 3 * CHUNK_SIZE)))
+        self.assertEqual(len(sorted_chunks(items)), 2)
+
+    def test_update_matches_sorted_reference(self):
+        rng = random.Random(47)
+        expected = set(rng.sample(range(10**6), 5 * CHUNK_SIZE))
+        items = SortedChunkedList(expected)
+        for _ in range(20):
+            removed = rng.sample(sorted(expected), rng.randint(0, 2 * CHUNK_SIZE))
+            added = {rng.randrange(10**6) for _ in range(rng.randint(0, 3 * CHUNK_SIZE))} - expected
+            items.update(added, removed)
+            expected.difference_update(removed)
+            expected.update(added)
+            self.assert_matches(items, expected)
+
+    def test_update_merges_and_splits_chunks(self):
+        items = SortedChunkedList(range(0, 4 * CHUNK_SIZE, 4))
+        # Merging past 2 * CHUNK_SIZE into the single chunk splits it
+        items.update(added=range(1, 4 * CHUNK_SIZE, 2), removed=range(0, 2 * CHUNK_SIZE, 4))
+        self.assert_matches(items, list(range(1, 4 * CHUNK_SIZE, 2)) + list(range(2 * CHUNK_SIZE, 4 * CHUNK_SIZE, 4)))
+        self.assertGreater(len(sorted_chunks(items)), 1)
+        # Removing every item of a chunk drops it
+        first = list(sorted_chunks(items)[0])
+        items.update(removed=first)
+        self.assertNotIn(first[0], list(items))
+        self.assertTrue(all(len(chunk) for chunk in sorted_chunks(items)))
+        items.update(removed=list(items))
+        self.assert_matches(items, [])
+        items.update(added=range(3 * CHUNK_SIZE))
+        self.assert_matches(items, range(3 * CHUNK_SIZE))
+
+    def test_update_removes_before_inserting(self):
+        items = SortedChunkedList([(1, 'a'), (2, 'b')])
+        items.update(added=[(1, 'a')], removed=[(1, 'a')])
+        self.assert_matches(items, [(1, 'a'), (2, 'b')])
+
+    def test_positional_reads(self):
+        expected = list(range(0, 6 * CHUNK_SIZE, 3))
+        items = SortedChunkedList(expected)
+        items.update(added=range(1, 3 * CHUNK_SIZE, 3))
+        expected = sorted(expected + list(range(1, 3 * CHUNK_SIZE, 3)))
+        for index in (0, 1, CHUNK_SIZE - 1, CHUNK_SIZE, len(expected) - 1, -1, -CHUNK_SIZE, -len(expected)):
+            self.assertEqual(items[index], expected[index])
+        for index in (len(expected), -len(expected) - 1):
+            with self.assertRaises(IndexError):
+                items[index]
+        with self.assertRaises(IndexError):
+            SortedChunkedList()[0]
+
+    def test_iteration_from_and_before(self):
+        expected = list(range(0, 3 * CHUNK_SIZE, 2))
+        items = SortedChunkedList(expected)
+        for probe in (-1, 0, 1, 2 * CHUNK_SIZE - 2, 2 * CHUNK_SIZE - 1, 2 * CHUNK_SIZE, expected[-1], 10**9):
+            self.assertEqual(list(items.iter_from(probe)), [v for v in expected if v >= probe])
+            self.assertEqual(list(items.iter_from(probe, inclusive=False)), [v for v in expected if v > probe])
+            self.assertEqual(list(items.iter_before(probe)), [v for v in reversed(expected) if v < probe])
+        self.assertEqual(list(items.iter_before()), expected[::-1])
+        self.assertEqual(list(SortedChunkedList().iter_before()), [])
+        self.assertEqual(list(SortedChunkedList().iter_from(0)), [])
+
+    def test_copy_leaves_source_unchanged(self):
+        expected = list(range(0, 4 * CHUNK_SIZE, 2))
+        source = SortedChunkedList(expected)
+        clone = source.copy()
+        clone.add(1)
+        clone.discard(0)
+        clone.update(added=range(3, 2 * CHUNK_SIZE, 2), removed=range(3 * CHUNK_SIZE, 4 * CHUNK_SIZE, 2))
+        self.assert_matches(source, expected)
+        self.assertEqual(source[0], 0)
+        grandchild = clone.copy()
+        grandchild.update(removed=list(clone))
+        self.assert_matches(grandchild, [])
+        self.assertIn(1, list(clone))
+
+    def test_copy_shares_unwritten_chunks(self):
+        source = SortedChunkedList(range(3 * CHUNK_SIZE))
+        clone = source.copy()
+        clone.discard(CHUNK_SIZE)
+        self.assertIs(sorted_chunks(clone)[0], sorted_chunks(source)[0])
+        self.assertIsNot(sorted_chunks(clone)[1], sorted_chunks(source)[1])
+        self.assertIs(sorted_chunks(clone)[2], sorted_chunks(source)[2])
+
+
+class ShardedTest(unittest.TestCase):
+
+    def test_sharded_base_is_abstract(self):
+        with self.assertRaises(TypeError):
+            _Sharded()
+
+    def test_dict_behaves_like_dict(self):
+        expected = {f"key{i}": i for i in range(3 * SHARD_SIZE)}
+        items = ShardedDict(expected)
+        self.assertEqual(dict(items.items()), expected)
+        self.assertEqual(len(items), len(expected))
+        self.assertEqual(items.get('missing', 'default'), 'default')
+        items['key0'] = 'replaced'
+        del items['key1']
+        with self.assertRaises(KeyError):
+            items['key1']
+        with self.assertRaises(KeyError):
+            del items['key1']
+        self.assertEqual(len(items), len(expected) - 1)
+        self.assertEqual(items['key0'], 'replaced')
+
+    def test_growth_reshards_without_losing_entries(self):
+        items = ShardedDict()
+        shards = len(items._shards)
+        count = shards * MAX_SHARD_FILL + 1
+        for i in range(count):
+            items[i] = -i
+        self.assertGreater(len(items._shards), shards)
+        self.assertEqual(len(items), count)
+        self.assertEqual(dict(items.items()), {i: -i for i in range(count)})
+
+        members = ShardedSet()
+        for i in range(count):
+            members.add(i)
+        self.assertGreater(len(members._shards), 1)
+        self.assertEqual(set(members), set(range(count)))
+
+    def test_copies_leave_sources_unchanged(self):
+        source = ShardedDict({i: i for i in range(4 * SHARD_SIZE)})
+        clone = source.copy()
+        clone[0] = 'changed'
+        del clone[1]
+        clone['new'] = 'added'
+        self.assertEqual(dict(source.items()), {i: i for i in range(4 * SHARD_SIZE)})
+        self.assertEqual((clone[0], 'new' in clone, 1 in clone), ('changed', True, False))
+
+        members = ShardedSet(range(4 * SHARD_SIZE))
+        member_clone = members.copy()
+        member_clone.discard(0)
+        member_clone.add(-1)
+        # Growing the copy past its shards re-shards only the copy
+        for i in range(4 * SHARD_SIZE, len(members._shards) * MAX_SHARD_FILL + 1):
+            member_clone.add(i)
+        self.assertEqual(set(members), set(range(4 * SHARD_SIZE)))
+        self.assertNotIn(0, member_clone)
+        self.assertIn(-1, member_clone)
+
+    def test_shard_if_large(self):
+        small, large = set(range(SHARD_THRESHOLD)), set(range(SHARD_THRESHOLD + 1))
+        self.assertIs(shard_if_large(small), small)
+        self.assertIsInstance(shard_if_large(large), ShardedSet)
+        self.assertIsInstance(shard_if_large(dict.fromkeys(large)), ShardedDict)
+        self.assertEqual(set(shard_if_large(large)), large)
+
+
+def make_customer(number: int, **updates) -> Customer:
+    row = {name: '' for name in CUSTOMER_FIELDS}
+    row.update({
+        'customer_id': f"CUST{number:06d}",
+        'first_name': ('Ann', 'Bob', 'Cleo', 'Dev')[number % 4],
+        'last_name': f"Last{number % 97}",
+        'email': f"user{number}@example.com",
+        'account_type': ('checking', 'savings', 'business')[number % 3],
+        'account_status': ('active', 'inactive')[number % 2],
+        'balance': str(number * 10.5),
+        'credit_score': str(500 + number % 300),
+        'risk_level': ('low', 'medium', 'high')[number % 3],
+        'has_loans': 'yes' if number % 2 else 'no',
+        'loan_types': 'auto_loan' if number % 2 else 'none',
+        'loan_amounts': str(1000 + number if number % 2 else 0),
+        'monthly_payments': str(50 + number % 20 if number % 2 else 0),
+        'username': f"user{number}",
+        'account_opened_date': f"20{10 + number % 10}-01-01",
+    })
+    row.update(updates)
+    return Customer.from_row(row)
+
+
+def fingerprint(data: CustomerDataset):
+    """Everything a reader can observe of one dataset version"""
+    query = data.query_index
+    return (
+        [c.to_dict() for c in data.customers],
+        sorted(data.customer_ids.items()),
+        sorted(data.usernames.items()),
+        data.search_index.search('ann last5', limit=50),
+        data.search_index.search('user1', limit=50),
+        data.suggest_index.suggest('us', limit=50),
+        query.query({'risk': 'high'}, sort='balance', limit=100)['doc_ids'],
+        query.query({}, sort='last_name', descending=True, limit=100)['doc_ids'],
+        query.query({'status': 'active', 'account_type': 'savings'}, limit=10**6),
+        (data.aggregates.total, data.aggregates.with_loans, data.aggregates.balance_sum),
+        data.version
+    )
+
+
+class DeriveIsolationTest(unittest.TestCase):
+    """derive() shares chunks and shards with the version it starts from, which must not change"""
+
+    def test_old_versions_are_unchanged_by_newer_ones(self):
+        # Past CHUNK_SIZE and SHARD_THRESHOLD, so chunks and sharded buckets are shared
+        count = SHARD_THRESHOLD * 3 + 30
+        first = CustomerDataset.build([make_customer(i) for i in range(count)])
+        before = fingerprint(first)
+
+        changed = {
+            0: first.customers[0].replace({'first_name': 'Zed', 'balance': 1.5}),
+            CHUNK_SIZE: first.customers[CHUNK_SIZE].replace({'risk_level': 'low', 'username': 'renamed'}),
+            count - 1: first.customers[count - 1].replace({'account_status': 'closed', 'last_name': 'Aardvark'}),
+        }
+        added = [make_customer(i) for i in range(count, count + CHUNK_SIZE + 3)]
+        second = first.derive(changed, added)
+        second_before = fingerprint(second)
+
+        # Keep writing newer versions on top of the second
+        third = second.derive({1: second.customers[1].replace({'credit_score': 850, 'risk_level': 'high'})},
+                              [make_customer(count * 2)])
+        third.derive({count: third.customers[count].replace({'email': 'x@example.com'})})
+
+        self.assertEqual(fingerprint(first), before)
+        self.assertEqual(fingerprint(second), second_before)
+        self.assertNotEqual(second_before, before)
+        self.assertEqual(second.customers[0]['first_name'], 'Zed')
+        self.assertEqual(second.usernames.get('renamed'), CHUNK_SIZE)
+        self.assertIsNone(first.usernames.get('renamed'))
+        self.assertEqual(len(second.customers), count + CHUNK_SIZE + 3)
+
+    def test_derived_version_matches_a_fresh_build(self):
+        count = CHUNK_SIZE * 2 + 5
+        customers = [make_customer(i) for i in range(count)]
+        first = CustomerDataset.build(customers)
+        changed = {doc_id: customers[doc_id].replace({'risk_level': 'high', 'last_name': f"New{doc_id}"})
+                   for doc_id in range(0, count, 97)}
+        added = [make_customer(i) for i in range(count, count + 40)]
+        derived = first.derive(changed, added)
+
+        rebuilt = [changed.get(doc_id, customer) for doc_id, customer in enumerate(customers)] + added
+        fresh = CustomerDataset.build(rebuilt, version=derived.version)
+        self.assertEqual(fingerprint(derived), fingerprint(fresh))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+
+from models.search_index import CustomerSearchIndex
+
+CUSTOMERS = [
+    {'customer_id': 'CUST001', 'first_name': 'Ann', 'last_name': 'Lee', 'account_type': 'checking', 'risk_level': 'low'},
+    {'customer_id': 'CUST002', 'first_name': 'Bob', 'last_name': 'Annson', 'account_type': 'savings', 'risk_level': 'low'},
+    {'customer_id': 'CUST003', 'first_name': 'Ann', 'last_name': 'Annett Annett', 'account_type': 'checking',
+     'risk_level': 'high'},
+    {'customer_id': 'CUST004', 'first_name': 'Cy', 'last_name': 'Ng', 'account_type': 'checking', 'risk_level': 'low'},
+]
+
+
+def build(customers=CUSTOMERS) -> CustomerSearchIndex:
+    index = CustomerSearchIndex()
+    index.build(customers)
+    return index
+
+
+class CustomerSearchIndexTest(unittest.TestCase):
+
+    def test_matches_exact_prefix_and_substring_terms(self):
+        index = build()
+        total, hits = index.search('ann')
+        self.assertEqual(total, 3)
+        scores = [score for _, score in hits]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(index.match('ann'), {0, 1, 2})
+        self.assertEqual(index.match('ann low'), {0, 1})
+        self.assertEqual(index.search('ann zzz'), (0, []))
+
+    def test_common_tokens_only_filter(self):
+        index = build()
+        with mock.patch('models.search_index.MAX_SCORED_POSTINGS', 2):
+            # 'checking' and 'low' are in 3 documents each: matches share a score, in document order
+            total, hits = index.search('checking low')
+            self.assertEqual(total, 2)
+            self.assertEqual([doc_id for doc_id, _ in hits], [0, 3])
+            self.assertEqual(hits[0][1], hits[1][1])
+            self.assertEqual(index.search('checking low', offset=1), (2, hits[1:]))
+            self.assertEqual(index.match('checking low'), {0, 3})
+
+            # 'cy' is selective and scored; 'checking' only narrows its matches
+            total, hits = index.search('checking cy')
+            self.assertEqual((total, [doc_id for doc_id, _ in hits]), (1, [3]))
+
+    def test_common_tokens_keep_the_same_matches(self):
+        customers = [dict(CUSTOMERS[i % len(CUSTOMERS)], customer_id=f"CUST{i:04d}") for i in range(200)]
+        index = build(customers)
+        queries = ('checking', 'low ann', 'ann checking low', 'annett high', 'sav', 'cust01')
+        expected = {query: (index.match(query), index.search(query, limit=500)[0]) for query in queries}
+        with mock.patch('models.search_index.MAX_SCORED_POSTINGS', 10):
+            for query in queries:
+                self.assertEqual((index.match(query), index.search(query, limit=500)[0]), expected[query], query)
+
+
+if __name__ == '__main__':
+    unittest.main()
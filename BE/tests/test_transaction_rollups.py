@@ -0,0 +1,56 @@
+import unittest
+from datetime import date
+
+from models.transaction_rollups import TransactionRollups
+
+ACCOUNT_TYPES = {'C1': 'checking', 'C2': 'savings'}
+
+
+def transaction(day: str, amount: float, transaction_type: str = 'deposit', customer_id: str = 'C1'):
+    """A transaction row as the repository loads it"""
+    return {'transaction_date': day, 'amount': amount, 'transaction_type': transaction_type,
+            'customer_id': customer_id}
+
+
+def totals(result):
+    """Per-period amounts summed over every series"""
+    return [round(sum(values), 2) for values in zip(*(s['amounts'] for s in result['series']))]
+
+
+class TransactionRollupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rollups = TransactionRollups()
+        self.rollups.build([
+            transaction('2023-11-27', 100.0),
+            transaction('2023-11-30', 50.0, 'withdrawal'),
+            transaction('2023-12-01', 25.0, customer_id='C2'),
+            transaction('2023-12-06', 10.0),
+            transaction('2024-01-02', 5.0, 'withdrawal', 'C2'),
+        ], ACCOUNT_TYPES)
+
+    def test_periods_are_labelled_with_calendar_starts(self):
+        monthly = self.rollups.rollup('monthly')
+        self.assertEqual(monthly['periods'], ['2023-11-01', '2023-12-01', '2024-01-01'])
+        self.assertEqual(totals(monthly), [150.0, 35.0, 5.0])
+        weekly = self.rollups.rollup('weekly')
+        self.assertEqual(weekly['periods'][:2], ['2023-11-27', '2023-12-04'])
+        self.assertEqual(totals(weekly)[:2], [175.0, 10.0])
+
+    def test_first_period_only_counts_days_inside_the_range(self):
+        monthly = self.rollups.rollup('monthly', date(2023, 11, 28), date(2023, 12, 31))
+        self.assertEqual(monthly['periods'], ['2023-11-01', '2023-12-01'])
+        self.assertEqual(totals(monthly), [50.0, 35.0])
+        weekly = self.rollups.rollup('weekly', date(2023, 11, 30), date(2023, 12, 6))
+        self.assertEqual(weekly['periods'], ['2023-11-27', '2023-12-04'])
+        self.assertEqual(totals(weekly), [75.0, 10.0])
+
+    def test_range_sum_filters_by_series(self):
+        result = self.rollups.range_sum(date(2023, 11, 1), date(2024, 1, 31), account_type='savings')
+        self.assertEqual(result, {'amount': 30.0, 'net': 20.0, 'count': 2})
+        result = self.rollups.range_sum(date(2023, 12, 2), date(2023, 12, 31), 'deposit')
+        self.assertEqual(result['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
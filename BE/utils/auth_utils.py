@@ -1,14 +1,44 @@
-import hashlib
-import uuid
-import csv
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, Optional
 from functools import wraps
-from flask import session, request, jsonify, redirect, make_response
+from flask import session, request, jsonify, redirect, make_response, current_app, g
+
+from utils.session_tokens import SessionTokenSigner, SESSION_MAX_AGE
+from utils.session_store import SessionSweeper, DEFAULT_SWEEP_INTERVAL
+from utils.password_service import PasswordRehashWriter
 
 logger = logging.getLogger(__name__)
 
+def init_sessions(app, banking_assistant, session_store, sweep_interval: float = DEFAULT_SWEEP_INTERVAL):
+    """Set up the server-side session store, its sweeper and signed session cookies"""
+    app.extensions['session_tokens'] = SessionTokenSigner(app.secret_key)
+    app.extensions['session_store'] = session_store
+    app.extensions['customer_lookup'] = banking_assistant.get_customer_by_username
+    sweeper = SessionSweeper(session_store, sweep_interval)
+    sweeper.start()
+    app.extensions['session_sweeper'] = sweeper
+
+def init_passwords(app, banking_assistant, password_service, rehash_on_login: bool = True):
+    """Set up password verification and the writer that persists upgraded hashes"""
+    app.extensions['password_service'] = password_service
+    app.extensions['password_rehash_on_login'] = rehash_on_login
+    app.extensions['password_hash_update'] = banking_assistant.update_password_hashes
+    writer = PasswordRehashWriter(banking_assistant.update_password_hashes)
+    writer.start()
+    app.extensions['password_rehash_writer'] = writer
+
+def init_reset_tokens(app, token_store, sweep_interval: float = DEFAULT_SWEEP_INTERVAL):
+    """Set up the password reset token store and its sweeper"""
+    app.extensions['reset_tokens'] = token_store
+    sweeper = SessionSweeper(token_store, sweep_interval, label='reset tokens')
+    sweeper.start()
+    app.extensions['reset_token_sweeper'] = sweeper
+
+def init_rate_limiter(app, rate_limiter):
+    """Set up the limiter used by the rate_limited decorator"""
+    app.extensions['rate_limiter'] = rate_limiter
+
 def create_multi_session_cookie(user_data: Dict, response: jsonify) -> jsonify:
     """Create session cookie with role-specific name for concurrent sessions"""
     role = user_data.get('role', 'customer')
@@ -17,32 +47,18 @@ def create_multi_session_cookie(user_data: Dict, response: jsonify) -> jsonify:
     # Create role-specific session cookie name
     session_cookie_name = f"session_{role}_{username}"
     
-    # Create session data
-    session_data = {
+    # The session lives server-side; the cookie only carries its signed, opaque id
+    session_id = current_app.extensions['session_store'].create({
         'user_id': username,
         'user_role': role,
-        'user_name': user_data.get('name', ''),
-        'customer_data': user_data.get('customer_data', {}),
         '_created': datetime.now().timestamp()
-    }
+    }, SESSION_MAX_AGE)
     
     # Set the role-specific session cookie
     response.set_cookie(
         session_cookie_name,
-        str(session_data),  # In production, use proper session serialization
-        max_age=86400,  # 24 hours
-        path='/',
-        domain=None,
-        secure=False,
-        httponly=True,
-        samesite='Lax'
-    )
-    
-    # Also set a general session cookie for backward compatibility
-    response.set_cookie(
-        'session',
-        str(session_data),
-        max_age=86400,
+        current_app.extensions['session_tokens'].sign(session_id),
+        max_age=SESSION_MAX_AGE,
         path='/',
         domain=None,
         secure=False,
@@ -52,172 +68,141 @@ def create_multi_session_cookie(user_data: Dict, response: jsonify) -> jsonify:
     
     return response
 
+def _session_id(cookie_value: str) -> Optional[str]:
+    """Get the session id from a signed session cookie, or None if the signature is bad"""
+    return current_app.extensions['session_tokens'].verify(cookie_value)
+
 def get_current_session_data(request) -> Optional[Dict]:
-    """Get current session data from role-specific cookies"""
+    """Get the ids of the current session (user_id, user_role, _created) from role-specific cookies"""
     cookies = request.cookies
+    store = current_app.extensions['session_store']
     
     # Check for role-specific session cookies first
     for cookie_name, cookie_value in cookies.items():
         if cookie_name.startswith('session_'):
-            try:
-                # In production, use proper session deserialization
-                session_data = eval(cookie_value)  # Simple for demo - use proper serialization in production
-                if isinstance(session_data, dict) and 'user_id' in session_data:
-                    return session_data
-            except:
-                continue
+            session_id = _session_id(cookie_value)
+            stored = store.get(session_id) if session_id else None
+            if stored is not None:
+                return stored
     
-    # Fallback to regular session
+    # Fallback to a Flask session left over from before sessions moved server-side
     if 'user_id' in session:
         return {
             'user_id': session.get('user_id'),
             'user_role': session.get('user_role'),
-            'user_name': session.get('user_name'),
-            'customer_data': session.get('customer_data', {}),
             '_created': session.get('_created')
         }
     
     return None
 
+def lookup_customer(username: str) -> Optional[Dict]:
+    """Get a customer record from the in-memory customer store"""
+    return current_app.extensions['customer_lookup'](username)
+
+def current_session() -> Dict:
+    """Session data of the current request, as set by the auth decorators"""
+    return g.get('session_data') or {}
+
+def current_customer() -> Optional[Dict]:
+    """Customer record of the logged-in user, looked up on first use in a request"""
+    if 'customer' not in g:
+        user_id = current_session().get('user_id')
+        g.customer = lookup_customer(user_id) if user_id else None
+    return g.customer
+
 def clear_session_cookies(response: jsonify, username: str = None, role: str = None) -> jsonify:
-    """Clear all session cookies for a user"""
+    """Clear all session cookies for a user and end their server-side sessions"""
     cookies = request.cookies if request else {}
+    store = current_app.extensions['session_store']
     
     # Clear role-specific cookies
-    for cookie_name in cookies.keys():
+    for cookie_name, cookie_value in cookies.items():
         if cookie_name.startswith('session_'):
-            if username and role:
-                # Clear specific user's session
-                if cookie_name == f"session_{role}_{username}":
-                    response.delete_cookie(cookie_name, path='/', domain=None)
-            else:
-                # Clear all session cookies
-                response.delete_cookie(cookie_name, path='/', domain=None)
+            if username and role and cookie_name != f"session_{role}_{username}":
+                # Only clear the specific user's session
+                continue
+            session_id = _session_id(cookie_value)
+            if session_id:
+                store.delete(session_id)
+            response.delete_cookie(cookie_name, path='/', domain=None)
     
     # Clear general session cookie
     response.delete_cookie('session', path='/', domain=None)
     
     return response
 
-def validate_customer_login(csv_file_path: str, username: str, password: str) -> Optional[Dict]:
-    """Validate customer login using CSV data"""
-    try:
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for customer in reader:
-                if customer['username'] == username:
-                    # Hash the input password and compare with stored hash
-                    hashed_input = hashlib.sha256(password.encode()).hexdigest()
-                    
-                    # Check if password matches (either hashed or plain text for demo)
-                    # In production, you'd use proper password hashing like bcrypt
-                    if customer['password_hash'] == hashed_input or customer['password_hash'] == password:
-                        # Determine role based on account_type
-                        role = "admin" if customer['account_type'] == 'admin' else "customer"
-                        
-                        # Log successful login for security monitoring
-                        logger.info(f"Successful login for user: {username} (role: {role})")
-                        
-                        return {
-                            "username": customer['username'],
-                            "role": role,
-                            "name": f"{customer['first_name']} {customer['last_name']}",
-                            "customer_data": customer
-                        }
-                    else:
-                        # Log failed login attempt for security monitoring
-                        logger.warning(f"Failed login attempt for user: {username}")
-                        break
-    except Exception as e:
-        logger.error(f"Error validating login: {e}")
+def validate_customer_login(username: str, password: str) -> Optional[Dict]:
+    """Validate customer login against the in-memory customer store.
+
+    Raises PasswordServiceBusy when the verification queue is full.
+    """
+    customer = lookup_customer(username)
+    if customer is None:
+        return None
     
-    return None
+    password_service = current_app.extensions['password_service']
+    stored_hash = customer['password_hash']
+    if not password_service.verify(password, stored_hash):
+        # Log failed login attempt for security monitoring
+        logger.warning(f"Failed login attempt for user: {username}")
+        return None
+    
+    # Upgrade legacy or weaker hashes now that the plaintext is known
+    if current_app.extensions['password_rehash_on_login'] and password_service.needs_rehash(password, stored_hash):
+        writer = current_app.extensions['password_rehash_writer']
+        password_service.rehash_in_background(
+            password, lambda new_hash: writer.submit(username, stored_hash, new_hash))
+    
+    # Determine role based on account_type
+    role = "admin" if customer['account_type'] == 'admin' else "customer"
+    
+    # Log successful login for security monitoring
+    logger.info(f"Successful login for user: {username} (role: {role})")
+    
+    return {
+        "username": customer['username'],
+        "role": role,
+        "name": f"{customer['first_name']} {customer['last_name']}",
+        "customer_data": customer
+    }
+
+def update_customer_password(username: str, new_password: str) -> bool:
+    """Hash a new password with the preferred KDF and store it.
 
-def update_customer_password(csv_file_path: str, username: str, new_password: str) -> bool:
-    """Update customer password in CSV"""
+    Raises PasswordServiceBusy when the hashing queue is full.
+    """
+    new_hash = current_app.extensions['password_service'].hash(new_password)
     try:
-        # Read all customers
-        customers = []
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row['username'] == username:
-                    # Update password hash
-                    row['password_hash'] = hashlib.sha256(new_password.encode()).hexdigest()
-                    # Clear reset token
-                    row['reset_token'] = ''
-                    row['reset_token_expiry'] = ''
-                customers.append(row)
-        
-        # Write back to CSV
-        with open(csv_file_path, 'w', newline='', encoding='utf-8') as file:
-            if customers:
-                fieldnames = customers[0].keys()
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(customers)
-        
+        if not current_app.extensions['password_hash_update']({username: new_hash}):
+            return False
         logger.info(f"Password updated for user {username}")
         return True
     except Exception as e:
         logger.error(f"Error updating password for {username}: {e}")
         return False
 
-def generate_reset_token(csv_file_path: str, username: str) -> Optional[str]:
+def generate_reset_token(username: str) -> Optional[str]:
     """Generate a password reset token for a user"""
+    customer = lookup_customer(username)
+    if customer is None:
+        return None
     try:
-        # Read all customers
-        customers = []
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row['username'] == username:
-                    # Generate reset token and expiry
-                    reset_token = str(uuid.uuid4())
-                    expiry = (datetime.now() + timedelta(hours=1)).isoformat()
-                    row['reset_token'] = reset_token
-                    row['reset_token_expiry'] = expiry
-                customers.append(row)
-        
-        # Write back to CSV
-        with open(csv_file_path, 'w', newline='', encoding='utf-8') as file:
-            if customers:
-                fieldnames = customers[0].keys()
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(customers)
-        
+        reset_token = current_app.extensions['reset_tokens'].issue(customer['customer_id'])
         logger.info(f"Reset token generated for user {username}")
         return reset_token
     except Exception as e:
         logger.error(f"Error generating reset token for {username}: {e}")
         return None
 
-def validate_reset_token(csv_file_path: str, username: str, token: str) -> bool:
+def validate_reset_token(username: str, token: str) -> bool:
     """Validate a password reset token"""
-    try:
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for customer in reader:
-                if customer['username'] == username:
-                    if not customer.get('reset_token') or not customer.get('reset_token_expiry'):
-                        return False
-                    
-                    if customer['reset_token'] != token:
-                        return False
-                    
-                    try:
-                        expiry = datetime.fromisoformat(customer['reset_token_expiry'])
-                        if datetime.now() > expiry:
-                            return False
-                    except:
-                        return False
-                    
-                    return True
-    except Exception as e:
-        logger.error(f"Error validating reset token: {e}")
-    
-    return False
+    customer = lookup_customer(username)
+    return customer is not None and current_app.extensions['reset_tokens'].validate(customer['customer_id'], token)
+
+def consume_reset_token(username: str, token: str) -> bool:
+    """Use up a password reset token so it cannot be replayed"""
+    customer = lookup_customer(username)
+    return customer is not None and current_app.extensions['reset_tokens'].consume(customer['customer_id'], token)
 
 def login_required(f):
     """Decorator to require login for protected API routes"""
@@ -232,12 +217,12 @@ def login_required(f):
         
         # Check if session has expired (24 hours)
         session_created = session_data.get('_created', datetime.now().timestamp())
-        if datetime.now().timestamp() - session_created > 86400:  # 24 hours
+        if datetime.now().timestamp() - session_created > SESSION_MAX_AGE:
             logger.warning(f"Session expired for user {session_data['user_id']}")
             return jsonify({"error": "Session expired"}), 401
         
-        # Store session data in Flask session for backward compatibility
-        session.update(session_data)
+        # Expose the session to the view without writing it back into the cookie
+        g.session_data = session_data
             
         return f(*args, **kwargs)
     return decorated_function
@@ -255,12 +240,12 @@ def login_required_page(f):
         
         # Check if session has expired (24 hours)
         session_created = session_data.get('_created', datetime.now().timestamp())
-        if datetime.now().timestamp() - session_created > 86400:  # 24 hours
+        if datetime.now().timestamp() - session_created > SESSION_MAX_AGE:
             logger.warning(f"Session expired for user {session_data['user_id']}")
             return redirect('/login.html')
         
-        # Store session data in Flask session for backward compatibility
-        session.update(session_data)
+        # Expose the session to the view without writing it back into the cookie
+        g.session_data = session_data
             
         return f(*args, **kwargs)
     return decorated_function
@@ -279,8 +264,48 @@ def admin_required(f):
         if user_role != 'admin':
             return jsonify({"error": "Admin privileges required"}), 403
         
-        # Store session data in Flask session for backward compatibility
-        session.update(session_data)
+        # Expose the session to the view without writing it back into the cookie
+        g.session_data = session_data
         
         return f(*args, **kwargs)
-    return decorated_function 
\ No newline at end of file
+    return decorated_function 
+
+def rate_limited(f):
+    """Decorator to throttle credential endpoints (login, security question, reset).
+
+    Each remote address draws from a token bucket before anything else runs, and
+    a username or address that keeps failing is locked out for the failure window.
+    Both checks happen before the body is parsed for credentials or any customer
+    is looked up. 401 and 404 responses count as failures; a 2xx clears the username's.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        limiter = current_app.extensions['rate_limiter']
+        address_key = f"ip:{request.remote_addr}"
+        
+        retry_after = limiter.acquire(address_key)
+        if retry_after is None:
+            payload = request.get_json(silent=True) if request.is_json else None
+            # A body that isn't a JSON object (a list, a string) carries no username
+            fields = payload if isinstance(payload, dict) else request.args
+            username = fields.get('username')
+            user_key = f"user:{str(username).strip()}" if username else None
+            lockouts = [limiter.locked_for(key) for key in (address_key, user_key) if key]
+            lockouts = [seconds for seconds in lockouts if seconds is not None]
+            retry_after = max(lockouts) if lockouts else None
+        if retry_after is not None:
+            logger.warning(f"Rate limited {request.path} from {request.remote_addr}")
+            response = jsonify({"error": "Too many attempts, please try again later"})
+            response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+            return response, 429
+        
+        response = make_response(f(*args, **kwargs))
+        if response.status_code in (401, 404):
+            limiter.record_failure(address_key)
+            if user_key:
+                limiter.record_failure(user_key)
+        elif response.status_code < 300 and user_key:
+            # Address failures are left to expire, so one good login can't reset a spray
+            limiter.reset(user_key)
+        return response
+    return decorated_function
@@ -0,0 +1,66 @@
+import io
+import csv
+import json
+import zlib
+import logging
+from typing import Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Rows are buffered into chunks of roughly this many bytes before being yielded
+CHUNK_SIZE = 64 * 1024
+
+
+def stream_csv(rows: Iterable[Dict], fields: List[str]) -> Iterator[bytes]:
+    """Stream rows as CSV, header first, in chunks of roughly CHUNK_SIZE bytes"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_ndjson(rows: Iterable[Dict], fields: List[str]) -> Iterator[bytes]:
+    """Stream rows as newline-delimited JSON objects in chunks of roughly CHUNK_SIZE bytes"""
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps({field: row.get(field) for field in fields}, separators=(',', ':'))
+        lines.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_SIZE:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+            size = 0
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a byte stream incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(rows: Iterable[Dict], fields: List[str], export_format: str = 'csv',
+                  compress: bool = False) -> Iterator[bytes]:
+    """Stream rows in the requested export format, optionally gzip-compressed"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    chunks = stream_csv(rows, fields) if export_format == 'csv' else stream_ndjson(rows, fields)
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,50 @@
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCH_INTERVAL = 2.0
+
+
+class ChangeWatcher:
+    """Daemon thread that polls a check for outside changes, e.g. BankingAssistant.refresh.
+
+    The check does the cheap part itself (one stat of the watched file) and only
+    reloads when the file moved on, so polling every couple of seconds costs nothing.
+    """
+
+    def __init__(self, check: Callable[[], bool], interval: float = DEFAULT_WATCH_INTERVAL, label: str = 'file'):
+        self.check = check
+        self.interval = interval
+        self.label = label
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the thread; called again in each forked worker, since threads don't survive fork"""
+        if self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'{self.label}-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and wait for a reload in progress to finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Checking {self.label} for changes failed: {e}")
+
+
+def init_customer_reload(app, banking_assistant, interval: float = DEFAULT_WATCH_INTERVAL):
+    """Reload customers in the background whenever the CSV is changed outside this process"""
+    watcher = ChangeWatcher(banking_assistant.refresh, interval, label='customers')
+    watcher.start()
+    app.extensions['customer_watcher'] = watcher
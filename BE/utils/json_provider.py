@@ -0,0 +1,160 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from flask import Response, current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+ENCODERS = ('orjson', 'json')
+
+# Keyword arguments orjson can honour; anything else (cls, ensure_ascii, ...) goes to the stdlib encoder
+ORJSON_KWARGS = frozenset(('indent', 'separators'))
+
+# Most pre-serialized bodies kept at once; the oldest key is dropped first
+MAX_CACHED_BODIES = 64
+
+
+def encoder_available(encoder: str) -> bool:
+    return encoder == 'json' or (encoder == 'orjson' and orjson is not None)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding with orjson when it is installed.
+
+    Responses keep the stdlib provider's output (sorted keys, compact
+    separators, dates as HTTP dates), except that non-ASCII text is written
+    as UTF-8 instead of \\u escapes. orjson writes bytes, so response bodies
+    skip the str round trip. Every encode is timed per encoder, and
+    cached_response() serves a body serialized once per data version.
+    """
+
+    def __init__(self, app, encoder: Optional[str] = None):
+        super().__init__(app)
+        if encoder is None:
+            encoder = next(e for e in ENCODERS if encoder_available(e))
+        elif encoder not in ENCODERS:
+            raise ValueError(f"Unknown JSON encoder: {encoder}. Use one of: {', '.join(ENCODERS)}")
+        elif not encoder_available(encoder):
+            logger.warning(f"JSON encoder {encoder} is not installed, using json")
+            encoder = 'json'
+        self.encoder = encoder
+        # Flask passes dates and dataclasses to default(); keep doing so rather than use orjson's formats
+        self._orjson_options = 0
+        if orjson is not None:
+            self._orjson_options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            if self.sort_keys:
+                self._orjson_options |= orjson.OPT_SORT_KEYS
+
+        # key -> (data version, serialized body)
+        self._bodies: Dict[Hashable, Tuple[Hashable, bytes]] = {}
+        self._bodies_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "encodes": {e: 0 for e in ENCODERS},
+            "encode_seconds_total": {e: 0.0 for e in ENCODERS},
+            "encode_seconds_max": {e: 0.0 for e in ENCODERS},
+            "encoded_bytes": {e: 0 for e in ENCODERS},
+            "orjson_fallbacks": 0,
+            "cache_hits": 0,
+            "cache_misses": 0
+        }
+
+    def encode(self, obj: Any, **kwargs) -> bytes:
+        """Serialize to UTF-8 JSON bytes with the configured encoder, recording how long it took"""
+        started = time.perf_counter()
+        body = None
+        encoder = self.encoder
+        if encoder == 'orjson' and ORJSON_KWARGS.issuperset(kwargs):
+            option = self._orjson_options | (orjson.OPT_INDENT_2 if kwargs.get('indent') else 0)
+            try:
+                body = orjson.dumps(obj, default=self.default, option=option)
+            except orjson.JSONEncodeError:
+                # e.g. integers beyond 64 bits; the stdlib encoder serializes them or raises the usual TypeError
+                with self._metrics_lock:
+                    self._metrics['orjson_fallbacks'] += 1
+        if body is None:
+            encoder = 'json'
+            body = super().dumps(obj, **kwargs).encode('utf-8')
+
+        seconds = time.perf_counter() - started
+        with self._metrics_lock:
+            metrics = self._metrics
+            metrics['encodes'][encoder] += 1
+            metrics['encode_seconds_total'][encoder] += seconds
+            metrics['encode_seconds_max'][encoder] = max(metrics['encode_seconds_max'][encoder], seconds)
+            metrics['encoded_bytes'][encoder] += len(body)
+        return body
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        return self.encode(obj, **kwargs).decode('utf-8')
+
+    def _dump_args(self) -> Dict[str, Any]:
+        """Pretty-printed in debug mode, compact otherwise, as Flask's provider does"""
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return {"indent": 2}
+        return {"separators": (",", ":")}
+
+    def response(self, *args, **kwargs) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj, **self._dump_args()) + b"\n", mimetype=self.mimetype)
+
+    def cached_response(self, key: Hashable, version: Hashable, build: Callable[[], Any]) -> Response:
+        """Serve the body cached under key, serializing build() again only when version has moved on"""
+        cached = self._bodies.get(key)
+        if cached is not None and cached[0] == version:
+            with self._metrics_lock:
+                self._metrics['cache_hits'] += 1
+            body = cached[1]
+        else:
+            with self._metrics_lock:
+                self._metrics['cache_misses'] += 1
+            body = self.encode(build(), **self._dump_args()) + b"\n"
+            with self._bodies_lock:
+                if key not in self._bodies and len(self._bodies) >= MAX_CACHED_BODIES:
+                    self._bodies.pop(next(iter(self._bodies)))
+                self._bodies[key] = (version, body)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def stats(self) -> Dict:
+        """Encoder in use, encode counts and timings per encoder, and response cache hits"""
+        with self._metrics_lock:
+            metrics = {name: dict(value) if isinstance(value, dict) else value
+                       for name, value in self._metrics.items()}
+        encoders = {}
+        for encoder in ENCODERS:
+            encodes = metrics['encodes'][encoder]
+            total = metrics['encode_seconds_total'][encoder]
+            encoders[encoder] = {
+                "encodes": encodes,
+                "encode_ms_avg": round(total / encodes * 1000, 3) if encodes else 0.0,
+                "encode_ms_max": round(metrics['encode_seconds_max'][encoder] * 1000, 3),
+                "encoded_bytes": metrics['encoded_bytes'][encoder]
+            }
+        return {
+            "encoder": self.encoder,
+            "available_encoders": [e for e in ENCODERS if encoder_available(e)],
+            "encoders": encoders,
+            "orjson_fallbacks": metrics['orjson_fallbacks'],
+            "cache_hits": metrics['cache_hits'],
+            "cache_misses": metrics['cache_misses'],
+            "cached_bodies": len(self._bodies)
+        }
+
+
+def cached_json(key: Hashable, version: Hashable, build: Callable[[], Any]) -> Response:
+    """Respond with build()'s JSON, serialized once per version (e.g. BankingAssistant.data_version)"""
+    return current_app.json.cached_response(key, version, build)
+
+
+def init_json_provider(app, encoder: Optional[str] = None):
+    """Encode every jsonify() response through FastJSONProvider"""
+    app.json = FastJSONProvider(app, encoder)
+    logger.info(f"JSON responses encoded with {app.json.encoder}")
@@ -0,0 +1,342 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import logging
+import secrets
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Optional KDF backends; scrypt from hashlib is always available
+try:
+    import bcrypt
+except ImportError:
+    bcrypt = None
+
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import VerificationError, InvalidHashError
+except ImportError:
+    PasswordHasher = None
+
+logger = logging.getLogger(__name__)
+
+# Schemes in order of preference for new hashes
+PREFERRED_SCHEMES = ('argon2', 'bcrypt', 'scrypt')
+# Schemes that are upgraded to a KDF after the next successful login
+LEGACY_SCHEMES = ('sha256', 'plaintext')
+
+SCRYPT_LOG_N = 15  # n = 2**15, r = 8: 32 MiB and ~100 ms per hash
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MAXMEM = 64 * 1024 * 1024
+BCRYPT_ROUNDS = 12
+
+DEFAULT_QUEUE_TIMEOUT = 2.0  # seconds to wait for a free queue slot
+DEFAULT_RESULT_TIMEOUT = 10.0  # seconds to wait for a worker's answer
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when every verification slot is taken; callers should answer 503"""
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def identify_scheme(stored_hash: str) -> str:
+    """Name the scheme of a stored hash from its prefix"""
+    if stored_hash.startswith(('$2a$', '$2b$', '$2y$')):
+        return 'bcrypt'
+    if stored_hash.startswith('$argon2'):
+        return 'argon2'
+    if stored_hash.startswith('$scrypt$'):
+        return 'scrypt'
+    if len(stored_hash) == 64 and all(c in '0123456789abcdef' for c in stored_hash):
+        return 'sha256'
+    return 'plaintext'
+
+
+def scheme_available(scheme: str) -> bool:
+    """Whether the library needed for a scheme is installed"""
+    if scheme == 'bcrypt':
+        return bcrypt is not None
+    if scheme == 'argon2':
+        return PasswordHasher is not None
+    return True
+
+
+def _scrypt(password: str, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=2 ** log_n, r=r, p=p,
+                          maxmem=SCRYPT_MAXMEM, dklen=32)
+
+
+def _scrypt_params(stored_hash: str):
+    """Split $scrypt$ln=..,r=..,p=..$salt$hash into its parts"""
+    _, _, params, salt, digest = stored_hash.split('$')
+    values = dict(item.split('=') for item in params.split(','))
+    return int(values['ln']), int(values['r']), int(values['p']), _b64decode(salt), _b64decode(digest)
+
+
+def hash_password(password: str, scheme: str) -> str:
+    """Hash a password with a KDF scheme (CPU heavy; runs in a worker process)"""
+    if scheme == 'argon2':
+        return PasswordHasher().hash(password)
+    if scheme == 'bcrypt':
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('ascii')
+    if scheme == 'scrypt':
+        salt = secrets.token_bytes(16)
+        digest = _scrypt(password, salt, SCRYPT_LOG_N, SCRYPT_R, SCRYPT_P)
+        return f"$scrypt$ln={SCRYPT_LOG_N},r={SCRYPT_R},p={SCRYPT_P}${_b64encode(salt)}${_b64encode(digest)}"
+    raise ValueError(f"Unsupported password scheme: {scheme}")
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    """Check a password against a stored hash of any supported scheme (runs in a worker process)"""
+    scheme = identify_scheme(stored_hash)
+    try:
+        if scheme == 'argon2':
+            try:
+                return PasswordHasher().verify(stored_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+        if scheme == 'bcrypt':
+            return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('ascii'))
+        if scheme == 'scrypt':
+            log_n, r, p, salt, digest = _scrypt_params(stored_hash)
+            return hmac.compare_digest(_scrypt(password, salt, log_n, r, p), digest)
+    except ValueError:
+        # Malformed hash
+        return False
+    if scheme == 'sha256':
+        return hmac.compare_digest(hashlib.sha256(password.encode('utf-8')).hexdigest(), stored_hash)
+    return hmac.compare_digest(password.encode('utf-8'), stored_hash.encode('utf-8'))
+
+
+class PasswordService:
+    """Password hashing and verification on a process pool.
+
+    KDF work runs in worker processes so a burst of logins never holds the GIL
+    that chat and API request threads need. At most max_pending jobs are queued
+    or running; past that, callers wait up to queue_timeout for a slot and then
+    get PasswordServiceBusy instead of piling up behind the pool. Legacy sha256
+    and plaintext checks are cheap and stay on the request thread.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 scheme: Optional[str] = None, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT,
+                 result_timeout: float = DEFAULT_RESULT_TIMEOUT, accept_stored_hash: bool = True):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.workers * 4
+        self.scheme = scheme or next(s for s in PREFERRED_SCHEMES if scheme_available(s))
+        if not scheme_available(self.scheme):
+            raise ValueError(f"Password scheme {self.scheme} is not installed")
+        self.queue_timeout = queue_timeout
+        self.result_timeout = result_timeout
+        # Demo data: the stored hash string itself is accepted as the password
+        self.accept_stored_hash = accept_stored_hash
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "verifications": {},
+            "succeeded": 0,
+            "failed": 0,
+            "rejected_busy": 0,
+            "hashes": 0,
+            "rehashes": 0,
+            "in_flight": 0,
+            "pool_seconds_total": 0.0,
+            "pool_seconds_max": 0.0,
+            "pool_jobs": 0
+        }
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # forkserver children do not inherit the app's threads and locks
+                    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    def _run(self, fn: Callable, *args):
+        """Run a CPU-heavy call on the pool, bounded by the pending-job slots"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('rejected_busy')
+            raise PasswordServiceBusy("Password verification queue is full")
+        started = time.perf_counter()
+        self._count('in_flight')
+        try:
+            return self._pool().submit(fn, *args).result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            raise PasswordServiceBusy("Password verification timed out")
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._metrics_lock:
+                self._metrics['in_flight'] -= 1
+                self._metrics['pool_jobs'] += 1
+                self._metrics['pool_seconds_total'] += elapsed
+                self._metrics['pool_seconds_max'] = max(self._metrics['pool_seconds_max'], elapsed)
+            self._slots.release()
+
+    def _count(self, name: str, amount: int = 1):
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+    def verify(self, password: str, stored_hash: str) -> bool:
+        """Check a password against a stored hash"""
+        scheme = identify_scheme(stored_hash)
+        if scheme in LEGACY_SCHEMES:
+            ok = verify_password(password, stored_hash)
+        elif scheme_available(scheme):
+            ok = self._run(verify_password, password, stored_hash)
+        else:
+            logger.warning(f"Cannot verify {scheme} hash: library not installed")
+            ok = False
+        if not ok and self.accept_stored_hash and scheme not in LEGACY_SCHEMES:
+            ok = hmac.compare_digest(password.encode('utf-8'), stored_hash.encode('utf-8'))
+            if ok:
+                scheme = 'stored_hash'
+        with self._metrics_lock:
+            verifications = self._metrics['verifications']
+            verifications[scheme] = verifications.get(scheme, 0) + 1
+            self._metrics['succeeded' if ok else 'failed'] += 1
+        return ok
+
+    def needs_rehash(self, password: str, stored_hash: str) -> bool:
+        """Whether a hash that just verified should be replaced with the preferred scheme"""
+        scheme = identify_scheme(stored_hash)
+        if scheme in LEGACY_SCHEMES:
+            return True
+        # Accounts that log in with the stored hash string keep it, so the demo login keeps working
+        if self.accept_stored_hash and hmac.compare_digest(password.encode('utf-8'), stored_hash.encode('utf-8')):
+            return False
+        if scheme != self.scheme:
+            return True
+        if scheme == 'scrypt':
+            return _scrypt_params(stored_hash)[0] < SCRYPT_LOG_N
+        if scheme == 'bcrypt':
+            return int(stored_hash.split('$')[2]) < BCRYPT_ROUNDS
+        return PasswordHasher().check_needs_rehash(stored_hash)
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the preferred scheme"""
+        hashed = self._run(hash_password, password, self.scheme)
+        self._count('hashes')
+        return hashed
+
+    def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hash a batch of passwords with the preferred scheme, spread over the pool.
+
+        Each hash takes a pending slot like any login does, so a bulk job never
+        shuts verifications out of the pool.
+        """
+        if not passwords:
+            return []
+        with ThreadPoolExecutor(min(self.workers, len(passwords))) as threads:
+            return list(threads.map(self.hash, passwords))
+
+    def rehash_in_background(self, password: str, on_done: Callable[[str], None]) -> bool:
+        """Upgrade a hash without making the login wait; skipped (until next login) when the pool is busy"""
+        if not self._slots.acquire(blocking=False):
+            return False
+
+        def done(future):
+            self._slots.release()
+            if future.exception() is not None:
+                logger.error(f"Password rehash failed: {future.exception()}")
+                return
+            self._count('rehashes')
+            on_done(future.result())
+
+        try:
+            future = self._pool().submit(hash_password, password, self.scheme)
+        except Exception as e:
+            self._slots.release()
+            logger.error(f"Could not queue password rehash: {e}")
+            return False
+        future.add_done_callback(done)
+        return True
+
+    def stats(self) -> Dict:
+        """Verification counters, queue depth and worker timings"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics, verifications=dict(self._metrics['verifications']))
+        jobs = metrics.pop('pool_jobs')
+        total = metrics.pop('pool_seconds_total')
+        metrics.update({
+            "scheme": self.scheme,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pool_jobs": jobs,
+            "pool_ms_avg": round(total / jobs * 1000, 2) if jobs else 0.0,
+            "pool_ms_max": round(metrics.pop('pool_seconds_max') * 1000, 2),
+            "available_schemes": [s for s in PREFERRED_SCHEMES if scheme_available(s)]
+        })
+        return metrics
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PasswordRehashWriter:
+    """Daemon thread that persists upgraded hashes off the login path.
+
+    Upgrades are coalesced by username, so a burst of first logins after a
+    deploy costs one write of the customer file rather than one per login.
+    Each upgrade only lands if the user's stored hash is still the one that
+    was verified, so a password changed in the meantime is never overwritten.
+    """
+
+    def __init__(self, persist: Callable[[Dict[str, str], Dict[str, str]], int], delay: float = 1.0):
+        self.persist = persist
+        self.delay = delay
+        # username -> (hash the upgrade replaces, upgraded hash)
+        self._pending: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the thread; called again in each forked worker, since threads don't survive fork"""
+        self._thread = threading.Thread(target=self._run, name='password-rehash-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, username: str, expected_hash: str, password_hash: str):
+        """Queue a new hash for a user, to replace expected_hash only"""
+        with self._lock:
+            self._pending[username] = (expected_hash, password_hash)
+        self._wake.set()
+
+    def flush(self) -> int:
+        """Write every queued hash now, returning how many were persisted"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        hashes = {username: new_hash for username, (_, new_hash) in pending.items()}
+        expected = {username: old_hash for username, (old_hash, _) in pending.items()}
+        try:
+            return self.persist(hashes, expected)
+        except Exception as e:
+            logger.error(f"Failed to persist {len(pending)} rehashed passwords: {e}")
+            return 0
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # Let concurrent logins land in the same write
+            time.sleep(self.delay)
+            self._wake.clear()
+            self.flush()
@@ -0,0 +1,212 @@
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKENDS = ('memory', 'sqlite')
+
+DEFAULT_BURST = 20  # requests an address may make back to back
+DEFAULT_REFILL_PER_SECOND = 1.0
+DEFAULT_MAX_FAILURES = 5  # failed attempts per key inside the window
+DEFAULT_FAILURE_WINDOW = 300  # seconds
+
+PRUNE_EVERY = 1024  # operations between clean-ups of idle keys
+
+
+class MemoryRateLimiter:
+    """Per-process limiter: a token bucket per remote address and a sliding
+    window of failed attempts per username and per address.
+
+    The bucket caps raw request rate and is checked before the request body is
+    read; the failure window locks a key after max_failures misses until the
+    oldest miss slides out of the window.
+    """
+
+    backend = 'memory'
+
+    def __init__(self, burst: int = DEFAULT_BURST, refill_per_second: float = DEFAULT_REFILL_PER_SECOND,
+                 max_failures: int = DEFAULT_MAX_FAILURES, failure_window: float = DEFAULT_FAILURE_WINDOW):
+        self.burst = burst
+        self.refill_per_second = refill_per_second
+        self.max_failures = max_failures
+        self.failure_window = failure_window
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.failures: Dict[str, Deque[float]] = {}
+        self.rejected = 0
+        self._operations = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> Optional[float]:
+        """Take a token for key, returning None if allowed or seconds to wait"""
+        now = time.monotonic()
+        with self._lock:
+            self._tick(now)
+            tokens, updated = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.refill_per_second)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now)
+                self.rejected += 1
+                return (1 - tokens) / self.refill_per_second
+            self.buckets[key] = (tokens - 1, now)
+            return None
+
+    def locked_for(self, key: str) -> Optional[float]:
+        """Seconds until key may try again, or None if it is under the failure limit"""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self.failures.get(key)
+            if not attempts:
+                return None
+            while attempts and attempts[0] <= now - self.failure_window:
+                attempts.popleft()
+            if len(attempts) < self.max_failures:
+                return None
+            self.rejected += 1
+            return attempts[-self.max_failures] + self.failure_window - now
+
+    def record_failure(self, key: str):
+        """Note a failed attempt for key"""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self.failures.setdefault(key, deque(maxlen=self.max_failures))
+            attempts.append(now)
+
+    def reset(self, key: str):
+        """Forget key's failed attempts (after a success)"""
+        with self._lock:
+            self.failures.pop(key, None)
+
+    def _tick(self, now: float):
+        """Every PRUNE_EVERY operations, drop full buckets and windows that have emptied"""
+        self._operations += 1
+        if self._operations % PRUNE_EVERY:
+            return
+        refill_time = self.burst / self.refill_per_second
+        self.buckets = {key: value for key, value in self.buckets.items() if now - value[1] < refill_time}
+        self.failures = {key: attempts for key, attempts in self.failures.items()
+                         if attempts and attempts[-1] > now - self.failure_window}
+
+    def stats(self) -> Dict:
+        """Tracked keys and rejections so far"""
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "tracked_addresses": len(self.buckets),
+                "tracked_failure_keys": len(self.failures),
+                "rejected": self.rejected
+            }
+
+
+class SQLiteRateLimiter:
+    """Limiter state in a SQLite file, so every worker process on the host shares
+    one budget per address and username. Same policy as MemoryRateLimiter;
+    wall-clock time is used since monotonic clocks differ between processes.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path: str, burst: int = DEFAULT_BURST, refill_per_second: float = DEFAULT_REFILL_PER_SECOND,
+                 max_failures: int = DEFAULT_MAX_FAILURES, failure_window: float = DEFAULT_FAILURE_WINDOW):
+        self.db_path = db_path
+        self.burst = burst
+        self.refill_per_second = refill_per_second
+        self.max_failures = max_failures
+        self.failure_window = failure_window
+        self.rejected = 0
+        self._operations = 0
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS rate_failures (key TEXT NOT NULL, at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS rate_failures_key ON rate_failures (key, at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit; writes take the lock explicitly with BEGIN IMMEDIATE
+            connection = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def acquire(self, key: str) -> Optional[float]:
+        """Take a token for key, returning None if allowed or seconds to wait"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (self.burst, now)
+            tokens = min(self.burst, tokens + (now - updated) * self.refill_per_second)
+            allowed = tokens >= 1
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens - 1 if allowed else tokens, now)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._tick(now)
+        if allowed:
+            return None
+        self.rejected += 1
+        return (1 - tokens) / self.refill_per_second
+
+    def locked_for(self, key: str) -> Optional[float]:
+        """Seconds until key may try again, or None if it is under the failure limit"""
+        now = time.time()
+        rows = self._connection().execute(
+            "SELECT at FROM rate_failures WHERE key = ? AND at > ? ORDER BY at DESC LIMIT ?",
+            (key, now - self.failure_window, self.max_failures)
+        ).fetchall()
+        if len(rows) < self.max_failures:
+            return None
+        self.rejected += 1
+        return rows[-1][0] + self.failure_window - now
+
+    def record_failure(self, key: str):
+        """Note a failed attempt for key"""
+        self._connection().execute("INSERT INTO rate_failures (key, at) VALUES (?, ?)", (key, time.time()))
+
+    def reset(self, key: str):
+        """Forget key's failed attempts (after a success)"""
+        self._connection().execute("DELETE FROM rate_failures WHERE key = ?", (key,))
+
+    def _tick(self, now: float):
+        """Every PRUNE_EVERY operations, drop refilled buckets and failures outside the window"""
+        self._operations += 1
+        if self._operations % PRUNE_EVERY:
+            return
+        connection = self._connection()
+        connection.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self.burst / self.refill_per_second,))
+        connection.execute("DELETE FROM rate_failures WHERE at <= ?", (now - self.failure_window,))
+
+    def stats(self) -> Dict:
+        """Tracked keys and rejections so far (rejections counted by this process)"""
+        connection = self._connection()
+        return {
+            "backend": self.backend,
+            "tracked_addresses": connection.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0],
+            "tracked_failure_keys": connection.execute("SELECT COUNT(DISTINCT key) FROM rate_failures").fetchone()[0],
+            "rejected": self.rejected
+        }
+
+
+def create_rate_limiter(backend: str = 'memory', sqlite_path: Optional[str] = None, **limits):
+    """Build the configured rate limiter backend"""
+    if backend == 'memory':
+        return MemoryRateLimiter(**limits)
+    if backend == 'sqlite':
+        if not sqlite_path:
+            raise ValueError("The sqlite rate limiter needs a sqlite_path")
+        return SQLiteRateLimiter(sqlite_path, **limits)
+    raise ValueError(f"Unknown rate limiter backend: {backend}. Use one of: {', '.join(RATE_LIMIT_BACKENDS)}")
@@ -0,0 +1,80 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_TRANSACTION_PAGE_SIZE = 500
+
+# Upper bound on values produced by a single {"start", "stop", "step"} range
+MAX_AXIS_VALUES = 10000
+
+
+def json_object(request) -> Optional[Dict]:
+    """The request's JSON body if it is an object; None for a missing, malformed or non-object body"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+
+def parse_transaction_args(args) -> Dict:
+    """Parse transaction history query parameters, raising ValueError with a client-facing message"""
+    params = {}
+    for param, key in (('from', 'date_from'), ('to', 'date_to')):
+        value = args.get(param, '').strip()
+        if value:
+            try:
+                params[key] = datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+            except ValueError:
+                raise ValueError(f"'{param}' must be a date in YYYY-MM-DD format")
+        else:
+            params[key] = None
+
+    try:
+        params['limit'] = min(max(int(args.get('limit', 50)), 1), MAX_TRANSACTION_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("Invalid limit")
+
+    order = args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("'order' must be 'asc' or 'desc'")
+    params['descending'] = order == 'desc'
+    params['cursor'] = args.get('cursor') or None
+    return params
+
+
+def parse_numeric_axis(spec, name: str) -> List[float]:
+    """Expand a number, a list of numbers or an inclusive {"start", "stop", "step"} range into a list"""
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        return [float(spec)]
+    if isinstance(spec, list):
+        if not spec:
+            raise ValueError(f"'{name}' must not be empty")
+        return [float(value) for value in spec]
+    if isinstance(spec, dict):
+        try:
+            start, stop = float(spec['start']), float(spec['stop'])
+            step = float(spec.get('step', 1))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"'{name}' range needs numeric start, stop and step")
+        if step <= 0 or stop < start:
+            raise ValueError(f"'{name}' range must have step > 0 and stop >= start")
+        count = int(round((stop - start) / step)) + 1
+        if count > MAX_AXIS_VALUES:
+            raise ValueError(f"'{name}' range expands to more than {MAX_AXIS_VALUES} values")
+        return [round(start + i * step, 10) for i in range(count)]
+    raise ValueError(f"'{name}' must be a number, a list or a range object")
+
+
+def parse_positive_int(value, name: str) -> int:
+    """Parse a whole number >= 1 from a JSON value or query string, raising ValueError with a client-facing message"""
+    if isinstance(value, bool):
+        raise ValueError(f"'{name}' must be a whole number of at least 1")
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    try:
+        number = int(value) if isinstance(value, (int, str)) else None
+    except ValueError:
+        number = None
+    if number is None or number < 1:
+        raise ValueError(f"'{name}' must be a whole number of at least 1")
+    return number
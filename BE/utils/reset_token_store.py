@@ -0,0 +1,155 @@
+import os
+import csv
+import time
+import heapq
+import hashlib
+import logging
+import secrets
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESET_TOKEN_TTL = 3600  # 1 hour
+
+RESET_FIELDS = ['customer_id', 'reset_token', 'reset_token_expiry', 'status']
+
+# Statuses in password_resets.csv; only 'active' rows issue a token
+ACTIVE = 'active'
+USED = 'used'
+
+
+def _digest(token: str) -> str:
+    """Tokens are held in memory by their SHA-256, never in the clear"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class ResetTokenStore:
+    """Password reset tokens, looked up by token hash, with a min-heap of expiry times.
+
+    password_resets.csv is an append-only log: issuing a token appends an
+    'active' row and consuming one appends a 'used' row, so neither touches the
+    customer file. On start the log is replayed; a later token for the same
+    customer replaces the earlier one. As in MemorySessionStore the heap may
+    hold stale entries, which sweep() skips.
+    """
+
+    def __init__(self, csv_file_path: str):
+        self.csv_file_path = csv_file_path
+        self.tokens: Dict[str, Tuple[float, str]] = {}
+        self.by_customer: Dict[str, str] = {}
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        # Called after each append to the log, so other worker processes can reload
+        self.on_write: Optional[Callable[[], None]] = None
+        self._load()
+        self.sweep()
+        logger.info(f"Loaded {len(self.tokens)} active reset tokens")
+
+    def _load(self):
+        """Replay the reset log"""
+        try:
+            with open(self.csv_file_path, 'r', encoding='utf-8') as file:
+                for row in csv.DictReader(file):
+                    try:
+                        expires = datetime.fromisoformat(row['reset_token_expiry']).timestamp()
+                    except (TypeError, ValueError):
+                        continue
+                    digest = _digest(row['reset_token'])
+                    if row.get('status', ACTIVE) == ACTIVE:
+                        self._add(row['customer_id'], digest, expires)
+                    else:
+                        self._remove(digest)
+        except FileNotFoundError:
+            logger.warning(f"Reset token file {self.csv_file_path} not found, starting empty")
+
+    def reload(self):
+        """Replay the log again, e.g. after another worker process appended to it"""
+        with self._lock:
+            self.tokens = {}
+            self.by_customer = {}
+            self.expiry_heap = []
+            self._load()
+        self.sweep()
+
+    def _add(self, customer_id: str, digest: str, expires: float):
+        self._remove(self.by_customer.get(customer_id))
+        self.tokens[digest] = (expires, customer_id)
+        self.by_customer[customer_id] = digest
+        heapq.heappush(self.expiry_heap, (expires, digest))
+
+    def _remove(self, digest: Optional[str]):
+        entry = self.tokens.pop(digest, None) if digest else None
+        if entry is not None and self.by_customer.get(entry[1]) == digest:
+            del self.by_customer[entry[1]]
+
+    def _append(self, customer_id: str, token: str, expires: float, status: str):
+        """Append one row to the reset log and flush it to disk"""
+        write_header = not os.path.exists(self.csv_file_path)
+        with open(self.csv_file_path, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=RESET_FIELDS)
+            if write_header:
+                writer.writeheader()
+            writer.writerow({
+                'customer_id': customer_id,
+                'reset_token': token,
+                'reset_token_expiry': datetime.fromtimestamp(expires).isoformat(),
+                'status': status
+            })
+            file.flush()
+            os.fsync(file.fileno())
+
+    def issue(self, customer_id: str, ttl: int = RESET_TOKEN_TTL) -> str:
+        """Create a reset token for a customer, replacing any earlier one"""
+        token = secrets.token_urlsafe(32)
+        expires = time.time() + ttl
+        with self._lock:
+            self._append(customer_id, token, expires, ACTIVE)
+            self._add(customer_id, _digest(token), expires)
+        if self.on_write is not None:
+            self.on_write()
+        return token
+
+    def validate(self, customer_id: str, token: str) -> bool:
+        """Whether token is a live reset token of this customer"""
+        entry = self.tokens.get(_digest(token))
+        return entry is not None and entry[1] == customer_id and entry[0] > time.time()
+
+    def consume(self, customer_id: str, token: str) -> bool:
+        """Use up a token; True only for the first caller with a live token"""
+        digest = _digest(token)
+        with self._lock:
+            entry = self.tokens.get(digest)
+            if entry is None or entry[1] != customer_id or entry[0] <= time.time():
+                return False
+            self._remove(digest)
+            self._append(customer_id, token, entry[0], USED)
+        if self.on_write is not None:
+            self.on_write()
+        return True
+
+    def sweep(self) -> int:
+        """Drop every expired token, returning how many were removed"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                expires, digest = heapq.heappop(self.expiry_heap)
+                entry = self.tokens.get(digest)
+                if entry is not None and entry[0] == expires:
+                    self._remove(digest)
+                    removed += 1
+            # Rebuild when replaced tokens have left the heap mostly stale
+            if len(self.expiry_heap) > 2 * len(self.tokens) + 64:
+                self.expiry_heap = [(expires, digest) for digest, (expires, _) in self.tokens.items()]
+                heapq.heapify(self.expiry_heap)
+        return removed
+
+    def stats(self) -> Dict:
+        """Active token count and expiry heap size"""
+        with self._lock:
+            return {
+                "active_tokens": len(self.tokens),
+                "expiry_heap_size": len(self.expiry_heap)
+            }
@@ -0,0 +1,194 @@
+import sys
+import json
+import time
+import heapq
+import sqlite3
+import secrets
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE_BACKENDS = ('memory', 'sqlite')
+
+DEFAULT_SWEEP_INTERVAL = 60  # seconds
+
+
+def new_session_id() -> str:
+    """Generate an unguessable session id"""
+    return secrets.token_urlsafe(32)
+
+
+class MemorySessionStore:
+    """In-process session store: a dict for O(1) lookups plus a min-heap of expiry times.
+
+    The heap may hold stale entries for sessions that were deleted; the sweeper
+    skips them by checking the expiry still stored for that id.
+    """
+
+    backend = 'memory'
+
+    def __init__(self):
+        self.sessions: Dict[str, Tuple[float, Dict]] = {}
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def create(self, data: Dict, ttl: int) -> str:
+        """Store a new session and return its id"""
+        session_id = new_session_id()
+        expires = time.time() + ttl
+        with self._lock:
+            self.sessions[session_id] = (expires, data)
+            heapq.heappush(self.expiry_heap, (expires, session_id))
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Get a live session's data"""
+        entry = self.sessions.get(session_id)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def delete(self, session_id: str):
+        """End a session"""
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def sweep(self) -> int:
+        """Drop every expired session, returning how many were removed"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                expires, session_id = heapq.heappop(self.expiry_heap)
+                entry = self.sessions.get(session_id)
+                if entry is not None and entry[0] == expires:
+                    del self.sessions[session_id]
+                    removed += 1
+            # Rebuild when deletions have left the heap mostly stale
+            if len(self.expiry_heap) > 2 * len(self.sessions) + 64:
+                self.expiry_heap = [(expires, sid) for sid, (expires, _) in self.sessions.items()]
+                heapq.heapify(self.expiry_heap)
+        return removed
+
+    def stats(self) -> Dict:
+        """Active session count and approximate memory held"""
+        with self._lock:
+            memory = sys.getsizeof(self.sessions) + sys.getsizeof(self.expiry_heap)
+            for session_id, (_, data) in self.sessions.items():
+                memory += sys.getsizeof(session_id) + sys.getsizeof(data)
+                memory += sum(sys.getsizeof(value) for value in data.values())
+            return {
+                "backend": self.backend,
+                "active_sessions": len(self.sessions),
+                "expiry_heap_size": len(self.expiry_heap),
+                "memory_bytes": memory
+            }
+
+
+class SQLiteSessionStore:
+    """Session store in a SQLite file, shared by every worker process on the host"""
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=5)
+            self._local.connection = connection
+        return connection
+
+    def create(self, data: Dict, ttl: int) -> str:
+        """Store a new session and return its id"""
+        session_id = new_session_id()
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO sessions (session_id, data, expires) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data, separators=(',', ':')), time.time() + ttl)
+            )
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Get a live session's data"""
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND expires > ?", (session_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, session_id: str):
+        """End a session"""
+        with self._connection() as connection:
+            connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def sweep(self) -> int:
+        """Drop every expired session, returning how many were removed"""
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),)).rowcount
+
+    def stats(self) -> Dict:
+        """Active session count and database size"""
+        connection = self._connection()
+        active = connection.execute("SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)).fetchone()[0]
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "backend": self.backend,
+            "active_sessions": active,
+            "memory_bytes": page_count * page_size
+        }
+
+
+class SessionSweeper:
+    """Daemon thread that expires sessions (or any store with a sweep() method) in the background"""
+
+    def __init__(self, store, interval: float = DEFAULT_SWEEP_INTERVAL, label: str = 'sessions'):
+        self.store = store
+        self.interval = interval
+        self.label = label
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the thread; called again in each forked worker, since threads don't survive fork"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'{self.label}-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and wait for a sweep in progress to finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                removed = self.store.sweep()
+                if removed:
+                    logger.info(f"Expired {removed} {self.label}")
+            except Exception as e:
+                logger.error(f"Sweep of {self.label} failed: {e}")
+
+
+def create_session_store(backend: str = 'memory', sqlite_path: Optional[str] = None):
+    """Build the configured session store backend"""
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'sqlite':
+        if not sqlite_path:
+            raise ValueError("The sqlite session store needs a sqlite_path")
+        return SQLiteSessionStore(sqlite_path)
+    raise ValueError(f"Unknown session store backend: {backend}. Use one of: {', '.join(SESSION_STORE_BACKENDS)}")
@@ -0,0 +1,252 @@
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+
+from utils.file_watcher import ChangeWatcher, DEFAULT_WATCH_INTERVAL
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Fingerprinted URLs name one exact content, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Everything else may be stored but is revalidated on each use; unchanged files answer 304
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+PRIVATE_REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+# Content types worth compressing; images and fonts already are
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Below this size the encoding overhead outweighs the saving
+MIN_COMPRESS_SIZE = 512
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Preferred first when the client accepts several
+ENCODINGS = ('br', 'gzip')
+
+# Uncompressed bodies at least this large are sent from the file when the server has a
+# wsgi.file_wrapper (sendfile); smaller ones are cheaper to write from memory than to open
+SENDFILE_MIN_SIZE = 16 * 1024
+
+# Hex digits of the content hash used in fingerprinted file names and ETags
+FINGERPRINT_LENGTH = 10
+ETAG_LENGTH = 20
+
+# name.<fingerprint>.ext
+FINGERPRINTED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % FINGERPRINT_LENGTH)
+
+
+def fingerprinted_name(name: str, fingerprint: str) -> str:
+    """css/style.css -> css/style.<fingerprint>.css"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{fingerprint}{ext}"
+
+
+def stat_signature(stat: os.stat_result) -> Tuple[int, int, int]:
+    """(inode, size, mtime_ns); any rewrite of the file changes it"""
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class StaticAsset:
+    """One file's bytes, its precompressed variants and a validator for each"""
+
+    def __init__(self, name: str, body: bytes, mimetype: str, path: Optional[str] = None,
+                 signature: Optional[Tuple[int, int, int]] = None):
+        self.name = name
+        self.mimetype = mimetype
+        # The file the identity body was read from, if it is byte-for-byte what is on disk
+        self.path = path
+        self.signature = signature
+        digest = hashlib.sha256(body).hexdigest()
+        self.fingerprint = digest[:FINGERPRINT_LENGTH]
+        self.bodies: Dict[str, bytes] = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            variants = {'gzip': gzip.compress(body, GZIP_LEVEL, mtime=0)}
+            if brotli is not None:
+                variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+            self.bodies.update((encoding, data) for encoding, data in variants.items() if len(data) < len(body))
+        # Each encoding is a different representation, so each gets its own strong ETag
+        self.etags = {encoding: digest[:ETAG_LENGTH] if encoding == 'identity' else f"{digest[:ETAG_LENGTH]}-{encoding}"
+                      for encoding in self.bodies}
+
+    @property
+    def url(self) -> str:
+        return '/' + fingerprinted_name(self.name, self.fingerprint)
+
+    def open_unchanged(self):
+        """The source file opened for sending, or None if it changed since it was loaded"""
+        if self.path is None:
+            return None
+        try:
+            file = open(self.path, 'rb')
+        except OSError:
+            return None
+        if stat_signature(os.fstat(file.fileno())) != self.signature:
+            file.close()
+            return None
+        return file
+
+
+class StaticAssets:
+    """Frontend files loaded once, precompressed and served with content-hash validators.
+
+    HTML pages are served under their own names and revalidated on every load, so a
+    repeat visit costs one 304. Other files are also reachable under a fingerprinted
+    name (css/style.<hash>.css) that is cached as immutable; references to them
+    inside the HTML are rewritten to those names when the assets are loaded.
+
+    Requests never touch the disk except to sendfile a large body. refresh()
+    stats the files and reloads the whole set when any of them was added,
+    removed or rewritten; the new set is published with one assignment.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.assets: Dict[str, StaticAsset] = {}
+        self._signatures: Dict[str, Tuple[int, int, int]] = {}
+        self.load()
+
+    def scan(self) -> Dict[str, Tuple[int, int, int]]:
+        """Relative name -> signature of every file under the root"""
+        signatures = {}
+        for directory, subdirectories, files in os.walk(self.root):
+            subdirectories[:] = [d for d in subdirectories if not d.startswith('.')]
+            for filename in files:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    signature = stat_signature(os.stat(path))
+                except FileNotFoundError:
+                    continue
+                signatures[os.path.relpath(path, self.root).replace(os.sep, '/')] = signature
+        return signatures
+
+    def refresh(self) -> bool:
+        """Reload if any file changed since the last load; True if it did"""
+        signatures = self.scan()
+        if signatures == self._signatures:
+            return False
+        self.load(signatures)
+        return True
+
+    def load(self, signatures: Optional[Dict[str, Tuple[int, int, int]]] = None):
+        """Read, fingerprint and compress every file under the root"""
+        if signatures is None:
+            signatures = self.scan()
+
+        assets = {}
+        # Pages last, so every file they reference already has its fingerprint
+        for name in sorted(signatures, key=lambda n: n.endswith('.html')):
+            path = os.path.join(self.root, name)
+            try:
+                with open(path, 'rb') as file:
+                    signature = stat_signature(os.fstat(file.fileno()))
+                    body = file.read()
+            except FileNotFoundError:
+                continue
+            # Record what was read, not what was scanned; a write after this is caught by the next refresh
+            signatures[name] = signature
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            source = path
+            if name.endswith('.html'):
+                rewritten = self._rewrite_references(body, assets)
+                source = path if rewritten == body else None
+                body = rewritten
+            assets[name] = StaticAsset(name, body, mimetype, source, signature)
+        self.assets = assets
+        self._signatures = {name: signatures[name] for name in assets}
+
+        raw = sum(len(a.bodies['identity']) for a in assets.values())
+        smallest = sum(min(len(body) for body in a.bodies.values()) for a in assets.values())
+        logger.info(f"Loaded {len(assets)} static assets: {raw} bytes, {smallest} bytes compressed"
+                    f"{'' if brotli is not None else ' (gzip only, brotli not installed)'}")
+
+    @staticmethod
+    def _rewrite_references(body: bytes, assets: Dict[str, StaticAsset]) -> bytes:
+        """Point quoted references to other assets ("images/logo.png", '/css/style.css') at their fingerprinted URLs.
+
+        Links between pages are left alone: pages are only served under their own routes.
+        """
+        text = body.decode('utf-8')
+        for name, asset in assets.items():
+            if name.endswith('.html'):
+                continue
+            for quote in ('"', "'"):
+                for prefix in ('', '/'):
+                    text = text.replace(f"{quote}{prefix}{name}{quote}", f"{quote}{asset.url}{quote}")
+        return text.encode('utf-8')
+
+    def url_for(self, name: str) -> str:
+        """The fingerprinted URL of an asset"""
+        return self.assets[name].url
+
+    def resolve(self, name: str) -> Tuple[StaticAsset, bool]:
+        """Find an asset by plain or fingerprinted name; the flag says whether the name was fingerprinted"""
+        asset = self.assets.get(name)
+        if asset is not None:
+            return asset, False
+        match = FINGERPRINTED_NAME.match(name)
+        if match:
+            asset = self.assets.get(match.group('stem') + match.group('ext'))
+            if asset is not None and asset.fingerprint == match.group('fingerprint'):
+                return asset, True
+        raise FileNotFoundError(name)
+
+    def response(self, name: str, private: bool = False, mimetype: Optional[str] = None) -> Response:
+        """Serve an asset, answering 304 when the client's copy is current.
+
+        Large uncompressed bodies go out through the server's wsgi.file_wrapper when
+        it has one, so a server with sendfile copies them straight from the page cache.
+        Raises FileNotFoundError for unknown names, including outdated fingerprints.
+        """
+        asset, immutable = self.resolve(name)
+        encoding = next((e for e in ENCODINGS if e in asset.bodies and request.accept_encodings[e]), 'identity')
+        etag = asset.etags[encoding]
+
+        if immutable:
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = PRIVATE_REVALIDATE_CACHE_CONTROL if private else REVALIDATE_CACHE_CONTROL
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            body = asset.bodies[encoding]
+            file = None
+            if (encoding == 'identity' and len(body) >= SENDFILE_MIN_SIZE
+                    and 'wsgi.file_wrapper' in request.environ):
+                file = asset.open_unchanged()
+            if file is not None:
+                response = Response(wrap_file(request.environ, file), mimetype=mimetype or asset.mimetype,
+                                    direct_passthrough=True)
+                response.content_length = len(body)
+            else:
+                response = Response(body, mimetype=mimetype or asset.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        if len(asset.bodies) > 1:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+def init_static_assets(app, frontend_path: str, interval: float = DEFAULT_WATCH_INTERVAL) -> StaticAssets:
+    """Load the frontend into memory and reload it in the background when a file changes"""
+    assets = StaticAssets(frontend_path)
+    watcher = ChangeWatcher(assets.refresh, interval, label='static')
+    watcher.start()
+    app.extensions['static_assets'] = assets
+    app.extensions['static_watcher'] = watcher
+    return assets
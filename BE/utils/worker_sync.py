@@ -0,0 +1,70 @@
+import logging
+import threading
+import multiprocessing
+from typing import Callable, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Datasets each worker keeps in memory and reloads when another worker writes them
+SHARED_DATASETS = ('customers', 'reset_tokens')
+
+
+class WriteCoordinator:
+    """Write generations shared by pre-forked worker processes.
+
+    The master creates one counter per dataset in shared memory before forking.
+    A worker that persists a write bumps the counter; every worker compares the
+    counters with the generations it has loaded at the start of each request
+    and reloads whatever another worker has changed since.
+    """
+
+    def __init__(self, datasets: Iterable[str] = SHARED_DATASETS):
+        self._generations = {name: multiprocessing.Value('Q', 0) for name in datasets}
+        self._seen: Dict[str, int] = {name: 0 for name in self._generations}
+        self._reloaders: Dict[str, Callable[[], None]] = {}
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+
+    def register(self, name: str, reload: Callable[[], None]):
+        """Set how this process reloads a dataset"""
+        self._reloaders[name] = reload
+
+    def notify(self, name: str):
+        """Record that this process wrote a dataset"""
+        generation = self._generations[name]
+        with generation.get_lock():
+            # If another worker wrote first, stay behind so check() still reloads its change
+            current = self._seen[name] == generation.value
+            generation.value += 1
+            if current:
+                self._seen[name] = generation.value
+
+    def check(self):
+        """Reload every dataset another worker has written since this process last loaded it"""
+        stale = [name for name, generation in self._generations.items() if generation.value != self._seen[name]]
+        if not stale or not self._reload_lock.acquire(blocking=False):
+            # Nothing to do, or another request thread is already reloading
+            return
+        try:
+            for name in stale:
+                # Read the generation first so a write during the reload triggers another one
+                generation = self._generations[name].value
+                reload = self._reloaders.get(name)
+                if reload is not None:
+                    reload()
+                    self.reloads += 1
+                    logger.info(f"Reloaded {name} after a write in another worker")
+                self._seen[name] = generation
+        finally:
+            self._reload_lock.release()
+
+
+def init_worker_sync(app, coordinator: WriteCoordinator, banking_assistant):
+    """Hook the in-memory stores up to the coordinator and check it before each request"""
+    reset_tokens = app.extensions['reset_tokens']
+    coordinator.register('customers', banking_assistant.refresh)
+    coordinator.register('reset_tokens', reset_tokens.reload)
+    banking_assistant.on_write = lambda: coordinator.notify('customers')
+    reset_tokens.on_write = lambda: coordinator.notify('reset_tokens')
+    app.extensions['write_coordinator'] = coordinator
+    app.before_request(coordinator.check)